@@ -3,8 +3,10 @@ Piper Morgan 1.0 - Main Application
 Bootstrap version to prove the architecture
 """
 import asyncio
+import json
 import uvicorn
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from contextlib import asynccontextmanager
 from pydantic import BaseModel
 from typing import Optional, Dict, Any
@@ -13,15 +15,19 @@ from dotenv import load_dotenv
 import os
 from fastapi import File, UploadFile, Form
 import tempfile
+from datetime import datetime, timedelta, timezone
 import shutil
-from services.knowledge_graph import get_document_service
+from services.knowledge_graph import get_document_service, get_ingester, SearchMode, SearchFilters, KNOWLEDGE_DOMAINS
 
 # Load environment variables FIRST
 load_dotenv()
 
 from services.domain.models import Product, Feature, Intent, IntentCategory
 from services.intent_service import classifier
-from services.orchestration import engine, WorkflowType, WorkflowStatus
+from services.orchestration import engine, WorkflowType, WorkflowStatus, WorkflowWorker, get_workflow_queue
+from services.orchestration.config import QUEUE_BACKEND, EMBEDDED_WORKER, EVENT_RELAY
+from shared.events.relay import RedisEventRelay
+from services.database import RepositoryFactory, db
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -52,9 +58,37 @@ async def lifespan(app: FastAPI):
     logger.info("✅ LLM clients initialized")
     logger.info("✅ Intent classifier ready")
     logger.info("✅ Orchestration engine ready")
+    
+    # Create the schema, or bring one from an earlier version up to date
+    try:
+        await db.migrate()
+        logger.info("✅ Database schema up to date")
+    except Exception as e:
+        logger.error(f"Database migration failed: {e}")
+    
+    # Workflows run in worker processes (python -m services.orchestration.worker);
+    # the in-memory queue can only be served from inside this process
+    worker, worker_task = None, None
+    if EMBEDDED_WORKER or QUEUE_BACKEND == "memory":
+        worker = WorkflowWorker(engine, get_workflow_queue())
+        worker_task = asyncio.create_task(worker.run())
+        logger.info("✅ Embedded workflow worker started")
+    
+    # Progress events from worker processes reach event streams through Redis
+    relay = None
+    if EVENT_RELAY == "redis":
+        relay = RedisEventRelay.from_env(engine.events)
+        relay.start(publish=worker is not None)
+        logger.info("✅ Workflow event relay started")
     yield
     # Shutdown
     logger.info("Shutting down...")
+    if worker:
+        worker.stop()
+        await worker_task
+    await engine.writes.stop()
+    if relay:
+        await relay.stop()
 
 # Create FastAPI app
 app = FastAPI(
@@ -88,7 +122,7 @@ async def health():
     }
 
 @app.post("/api/v1/intent", response_model=IntentResponse)
-async def process_intent(request: IntentRequest, background_tasks: BackgroundTasks):
+async def process_intent(request: IntentRequest):
     """Process a natural language message with real AI and optionally create workflow"""
     try:
         # Use real intent classifier
@@ -99,9 +133,9 @@ async def process_intent(request: IntentRequest, background_tasks: BackgroundTas
         workflow_id = None
         
         if workflow:
-            # Execute workflow in background
+            # Queue the workflow for a worker to execute
             workflow_id = workflow.id
-            background_tasks.add_task(engine.execute_workflow, workflow_id)
+            await get_workflow_queue().enqueue(workflow_id)
             response_text = f"I understand you want to {intent.action}. I've started a workflow to handle this."
         else:
             # No workflow needed, just respond
@@ -136,7 +170,7 @@ async def process_intent(request: IntentRequest, background_tasks: BackgroundTas
 @app.get("/api/v1/workflows/{workflow_id}", response_model=WorkflowResponse)
 async def get_workflow(workflow_id: str):
     """Get workflow status and details"""
-    workflow = engine.workflows.get(workflow_id)
+    workflow = await engine.get_workflow(workflow_id)
     if not workflow:
         raise HTTPException(status_code=404, detail="Workflow not found")
     
@@ -150,6 +184,8 @@ async def get_workflow(workflow_id: str):
         message = f"Workflow in progress... ({completed_tasks}/{len(workflow.tasks)} tasks completed)"
     elif workflow.status == WorkflowStatus.FAILED:
         message = f"Workflow failed: {workflow.error}"
+    elif workflow.status == WorkflowStatus.CANCELLED:
+        message = "Workflow was cancelled"
     else:
         message = "Workflow is pending"
     
@@ -161,18 +197,177 @@ async def get_workflow(workflow_id: str):
         message=message
     )
 
+# Seconds between keepalive comments on idle event streams
+SSE_KEEPALIVE_SECONDS = 15
+
+def _is_final_event(event: Dict[str, Any]) -> bool:
+    if event["type"] in ("workflow.completed", "workflow.failed"):
+        return True
+    return event["type"] == "workflow.status_changed" and event["data"].get("status") == WorkflowStatus.CANCELLED.value
+
+def _format_sse(event: Dict[str, Any]) -> str:
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event['data'], default=str)}\n\n"
+
+async def _workflow_event_stream(workflow_id: str, resume_from: Optional[int], request: Request):
+    bus = engine.events
+    async with bus.listen() as subscription:
+        replay = bus.events_after(resume_from) if resume_from is not None else None
+        if replay is None:
+            # New client, or its last event is no longer buffered: start from a snapshot
+            last_sent = bus.last_id
+            workflow = await engine.get_workflow(workflow_id)
+            yield _format_sse({"id": last_sent, "type": "workflow.snapshot", "data": workflow.to_dict()})
+            if workflow.status in (WorkflowStatus.COMPLETED, WorkflowStatus.FAILED, WorkflowStatus.CANCELLED):
+                return
+        else:
+            last_sent = resume_from
+            for event in replay:
+                last_sent = event["id"]
+                if event["data"].get("workflow_id") == workflow_id:
+                    yield _format_sse(event)
+                    if _is_final_event(event):
+                        return
+        
+        while not (subscription.overflowed and subscription.queue.empty()):
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), SSE_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    return
+                yield ": keepalive\n\n"
+                continue
+            
+            if event["id"] <= last_sent or event["data"].get("workflow_id") != workflow_id:
+                continue
+            last_sent = event["id"]
+            yield _format_sse(event)
+            if _is_final_event(event):
+                return
+
+@app.get("/api/v1/workflows/{workflow_id}/events")
+async def stream_workflow_events(workflow_id: str, request: Request, last_event_id: Optional[str] = None):
+    """
+    Stream a workflow's progress as server-sent events
+    
+    Args:
+        last_event_id: Resume after this event id (the Last-Event-ID header takes precedence)
+    """
+    resume_from = request.headers.get("last-event-id") or last_event_id
+    try:
+        resume_from = int(resume_from) if resume_from else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Last-Event-ID must be an event id")
+    
+    if not await engine.get_workflow(workflow_id):
+        raise HTTPException(status_code=404, detail="Workflow not found")
+    
+    return StreamingResponse(
+        _workflow_event_stream(workflow_id, resume_from, request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/api/v1/workflows/{workflow_id}/cancel")
+async def cancel_workflow(workflow_id: str):
+    """Cancel a pending or running workflow"""
+    try:
+        status = await engine.cancel_workflow(workflow_id)
+    except Exception as e:
+        logger.error(f"Workflow cancellation failed: {e}")
+        raise HTTPException(status_code=500, detail="Failed to cancel workflow")
+    
+    if status is None:
+        raise HTTPException(status_code=404, detail="Workflow not found")
+    if status != WorkflowStatus.CANCELLED:
+        raise HTTPException(status_code=409, detail=f"Workflow already {status.value}")
+    return {"workflow_id": workflow_id, "status": status.value}
+
+def _parse_utc_timestamp(value: str) -> datetime:
+    """ISO-8601 timestamp as naive UTC, matching the stored columns"""
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
 @app.get("/api/v1/workflows")
-async def list_workflows():
-    """List all workflows"""
-    workflows = []
-    for wf_id, workflow in engine.workflows.items():
-        workflows.append({
-            "id": wf_id,
-            "type": workflow.type.value,
-            "status": workflow.status.value,
-            "created_at": workflow.created_at.isoformat()
-        })
-    return {"workflows": workflows}
+async def list_workflows(
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    type: Optional[str] = None,
+    intent_id: Optional[str] = None,
+    created_after: Optional[str] = None,
+    created_before: Optional[str] = None
+):
+    """
+    List workflows, newest first, one page at a time
+    
+    Args:
+        limit: Page size (1-200)
+        cursor: next_cursor from the previous page
+        status: Only workflows in this status
+        type: Only workflows of this type
+        intent_id: Only workflows started by this intent
+        created_after: ISO-8601 lower bound (inclusive) on creation time
+        created_before: ISO-8601 upper bound (exclusive) on creation time
+    """
+    if not 1 <= limit <= 200:
+        raise HTTPException(status_code=400, detail="limit must be between 1 and 200")
+    try:
+        workflow_status = WorkflowStatus(status) if status else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid status. Must be one of: {[s.value for s in WorkflowStatus]}")
+    try:
+        workflow_type = WorkflowType(type) if type else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid type. Must be one of: {[t.value for t in WorkflowType]}")
+    try:
+        after = _parse_utc_timestamp(created_after) if created_after else None
+        before = _parse_utc_timestamp(created_before) if created_before else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="created_after and created_before must be ISO-8601 timestamps")
+    
+    repos = await RepositoryFactory.get_repositories()
+    try:
+        return await repos["workflows"].list_page(
+            limit=limit,
+            cursor=cursor,
+            status=workflow_status,
+            workflow_type=workflow_type,
+            intent_id=intent_id,
+            created_after=after,
+            created_before=before
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        await repos["session"].close()
+
+@app.get("/api/v1/workflow-metrics")
+async def workflow_metrics(hours: float = 24):
+    """
+    Latency percentiles per workflow type and task type
+    
+    Args:
+        hours: Window of finished workflows and tasks to aggregate (at most 720)
+    """
+    if not 0 < hours <= 720:
+        raise HTTPException(status_code=400, detail="hours must be between 0 and 720")
+    since = datetime.utcnow() - timedelta(hours=hours)
+    
+    repos = await RepositoryFactory.get_repositories()
+    try:
+        return {
+            "since": since.isoformat(),
+            "workflow_types": await repos["workflows"].latency_summary(since),
+            "task_types": await repos["tasks"].latency_summary(since),
+            "write_behind": engine.writes.stats()  # This process's buffer
+        }
+    except Exception as e:
+        logger.error(f"Workflow metrics failed: {e}")
+        raise HTTPException(status_code=500, detail="Failed to aggregate workflow metrics")
+    finally:
+        await repos["session"].close()
 
 @app.get("/api/v1/products")
 async def list_products():
@@ -198,9 +393,8 @@ async def upload_document(
     """Upload a document to the knowledge base"""
     
     # Validate knowledge domain
-    valid_domains = ["pm_fundamentals", "business_context", "product_context", "task_context"]
-    if knowledge_domain not in valid_domains:
-        raise HTTPException(status_code=400, detail=f"Invalid knowledge domain. Must be one of: {valid_domains}")
+    if knowledge_domain not in KNOWLEDGE_DOMAINS:
+        raise HTTPException(status_code=400, detail=f"Invalid knowledge domain. Must be one of: {KNOWLEDGE_DOMAINS}")
     
     # Prepare metadata
     metadata = {
@@ -221,7 +415,8 @@ async def upload_document(
                 "document_id": result.get("details", {}).get("document_id"),
                 "title": metadata["title"],
                 "knowledge_domain": knowledge_domain,
-                "chunks": result.get("details", {}).get("chunks_created", 0)
+                "chunks": result.get("details", {}).get("chunks_created", 0),
+                "duplicates_skipped": result.get("details", {}).get("deduplication", {}).get("duplicates_skipped", 0)
             })
         
         return result
@@ -233,25 +428,106 @@ async def upload_document(
         raise HTTPException(status_code=500, detail="Failed to process document")
 
 @app.get("/api/v1/knowledge/search")
-async def search_knowledge(query: str, limit: int = 5):
+async def search_knowledge(
+    query: str,
+    limit: int = 5,
+    mode: Optional[str] = None,
+    knowledge_domain: Optional[str] = None,
+    document_type: Optional[str] = None,
+    concept: Optional[str] = None,
+    feature_area: Optional[str] = None,
+    project_area: Optional[str] = None,
+    max_hierarchy_level: Optional[int] = None,
+    ingested_after: Optional[str] = None,
+    ingested_before: Optional[str] = None,
+    expand: Optional[bool] = None,
+    search_ef: Optional[int] = None
+):
     """
     Search the knowledge base
     
     Args:
         query: Search query
         limit: Maximum number of results
+        mode: Retrieval mode - "vector", "lexical" or "hybrid"
+        knowledge_domain: Only search one knowledge domain
+        document_type: Only search one document type (bug_report, requirements, ...)
+        concept: Only search documents tagged with this concept
+        feature_area: Only search documents tagged with this feature area
+        project_area: Only search one project area
+        max_hierarchy_level: Only include hierarchy levels up to this value (1-4)
+        ingested_after: ISO-8601 lower bound on ingestion time
+        ingested_before: ISO-8601 upper bound on ingestion time
+        expand: Boost results linked in the knowledge graph to the query's concepts
+        search_ef: Widen the HNSW search for this query (higher recall, higher latency)
     """
+    valid_modes = [search_mode.value for search_mode in SearchMode]
+    if mode and mode not in valid_modes:
+        raise HTTPException(status_code=400, detail=f"Invalid search mode. Must be one of: {valid_modes}")
+    if knowledge_domain and knowledge_domain not in KNOWLEDGE_DOMAINS:
+        raise HTTPException(status_code=400, detail=f"Invalid knowledge domain. Must be one of: {KNOWLEDGE_DOMAINS}")
+    if search_ef is not None and not 1 <= search_ef <= 1000:
+        raise HTTPException(status_code=400, detail="search_ef must be between 1 and 1000")
+    
+    filters = SearchFilters(
+        knowledge_domain=knowledge_domain,
+        document_type=document_type,
+        concept=concept,
+        feature_area=feature_area,
+        ingested_after=ingested_after,
+        ingested_before=ingested_before
+    )
+    
     try:
-        results = await get_ingester().search(query, n_results=limit)
+        results, timings = await get_ingester().search_with_timings(
+            query,
+            project_filter=project_area,
+            hierarchy_preference=max_hierarchy_level,
+            n_results=limit,
+            mode=mode,
+            filters=filters,
+            expand_query=expand,
+            search_ef=search_ef
+        )
         return {
             "query": query,
             "results": results,
-            "count": len(results)
+            "count": len(results),
+            "timings": timings
         }
     except Exception as e:
         logger.error(f"Knowledge search failed: {e}")
         raise HTTPException(status_code=500, detail="Search failed")
 
+@app.delete("/api/v1/knowledge/documents/{document_id}")
+async def delete_document(document_id: str):
+    """Remove a document and its chunks from the knowledge base"""
+    # Deleting touches SQLite, the vector store and the index files; keep it off the event loop
+    chunks_removed = await asyncio.to_thread(get_ingester().delete_document, document_id)
+    if chunks_removed is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    
+    return {
+        "status": "deleted",
+        "document_id": document_id,
+        "chunks_removed": chunks_removed
+    }
+
+@app.get("/api/v1/knowledge/documents/{document_id}/related")
+async def related_documents(document_id: str, limit: int = 5):
+    """Documents sharing concepts, keywords or feature areas with a document"""
+    related = await asyncio.to_thread(get_ingester().related_documents, document_id, n_results=limit)
+    return {
+        "document_id": document_id,
+        "related": related,
+        "count": len(related)
+    }
+
+@app.get("/api/v1/knowledge/stats")
+async def knowledge_stats():
+    """Knowledge base size and search cache hit rate"""
+    return get_ingester().get_stats()
+
 if __name__ == "__main__":
     uvicorn.run(
         "main:app",
@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+"""
+Piper Morgan 1.0 - Knowledge Retrieval Benchmark
+Builds a labeled PM document corpus (synthetic, or recorded with --corpus),
+indexes it with a deterministic local embedding stand-in, and reports
+recall@k, MRR, p50/p95 latency and memory for each retrieval configuration
+of DocumentIngester.search_with_context and for
+SimpleKnowledgeHierarchy.search_relevant.
+
+Recorded corpora are JSON files of the form
+    {"documents": [{"id", "title", "text", "knowledge_domain"}],
+     "queries": [{"query", "relevant": [document ids]}]}
+"""
+
+import argparse
+import asyncio
+import hashlib
+import itertools
+import json
+import logging
+import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Dict, List, Optional, Sequence
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import structlog
+from chromadb import EmbeddingFunction
+
+from services.knowledge import SimpleKnowledgeHierarchy
+from services.knowledge_graph import DocumentIngester, SearchFilters
+from services.knowledge_graph.search_cache import SearchResultCache
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[-_][a-z0-9]+)*")
+
+class HashingEmbeddingFunction(EmbeddingFunction):
+    """
+    Deterministic local stand-in for the OpenAI embeddings: signed feature
+    hashing of words and word bigrams, L2-normalized. Texts sharing vocabulary
+    land close together, which is enough to compare index configurations
+    without network calls or cost.
+    """
+
+    def __init__(self, dimension: int = 256):
+        self.dimension = dimension
+
+    def _features(self, text: str) -> List[str]:
+        tokens = TOKEN_PATTERN.findall(text.lower())
+        return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+    def __call__(self, input: Sequence[str]) -> List[List[float]]:
+        vectors = np.zeros((len(input), self.dimension), dtype=np.float32)
+        for row, text in enumerate(input):
+            for feature in self._features(text):
+                digest = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+                vectors[row, digest % self.dimension] += 1.0 if (digest >> 63) & 1 else -1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return (vectors / norms).tolist()
+
+# Synthetic corpus vocabulary: each topic is a feature area with its own terms
+TOPICS = {
+    "authentication": ["login", "password", "oauth", "token", "session", "sso", "2fa", "signin", "credentials", "lockout"],
+    "payments": ["checkout", "invoice", "billing", "refund", "subscription", "card", "pricing", "tax", "receipt", "chargeback"],
+    "search": ["search", "ranking", "filter", "query", "relevance", "autocomplete", "facet", "index", "typo", "results"],
+    "notifications": ["email", "push", "alert", "digest", "unsubscribe", "sms", "reminder", "badge", "inbox", "template"],
+    "onboarding": ["signup", "tutorial", "activation", "welcome", "checklist", "invite", "trial", "setup", "walkthrough", "profile"],
+    "performance": ["latency", "timeout", "cache", "throughput", "memory", "load", "p95", "slow", "cpu", "queue"],
+    "mobile": ["ios", "android", "tablet", "offline", "crash", "gesture", "deeplink", "release", "store", "battery"],
+    "analytics": ["dashboard", "metrics", "funnel", "retention", "cohort", "tracking", "report", "kpi", "events", "conversion"]
+}
+DOCUMENT_KINDS = {
+    "bug report": ("task_context", "Users report that {a} fails when {b} is {c}. Error {code} appears after the {d} step."),
+    "user story": ("product_context", "As a customer I want {a} to support {b} so that {c} works with {d}. Ticket {code}."),
+    "retrospective": ("business_context", "The team reviewed the {a} rollout. {b} and {c} went well; {d} slipped. Follow-up {code}."),
+    "best practice": ("pm_fundamentals", "Guidance for prioritizing {a} work: weigh {b} against {c} and validate {d} early. Reference {code}.")
+}
+FILLER = ("the", "team", "customers", "release", "sprint", "stakeholders", "feedback", "priority",
+          "roadmap", "scope", "estimate", "design", "review", "follow", "plan", "impact")
+
+def synthetic_corpus(documents: int, words_per_document: int, seed: int) -> Dict:
+    """Documents built from topic vocabulary plus a unique anchor sentence each, with known-item queries"""
+    rng = random.Random(seed)
+    topics = list(TOPICS)
+    kinds = list(DOCUMENT_KINDS)
+    corpus = {"documents": [], "queries": []}
+
+    for index in range(documents):
+        topic = topics[index % len(topics)]
+        kind = kinds[(index // len(topics)) % len(kinds)]
+        domain, template = DOCUMENT_KINDS[kind]
+        vocabulary = TOPICS[topic]
+        a, b, c, d = rng.sample(vocabulary, 4)
+        code = f"PM-{1000 + index}"
+        anchor = template.format(a=a, b=b, c=c, d=d, code=code)
+
+        body = []
+        while len(body) < words_per_document:
+            sentence = rng.sample(vocabulary, 3) + rng.sample(FILLER, 4)
+            rng.shuffle(sentence)
+            body.extend(sentence + ["."])
+        position = rng.randrange(len(body))
+        text = " ".join(body[:position] + anchor.split() + body[position:])
+
+        document_id = f"doc-{index:04d}"
+        corpus["documents"].append({
+            "id": document_id,
+            "title": f"{topic.title()} {kind} {index}",
+            "text": text,
+            "knowledge_domain": domain
+        })
+        # One query by exact identifier, one paraphrasing the anchor without it
+        corpus["queries"].append({"query": f"{code} {a}", "relevant": [document_id], "knowledge_domain": domain})
+        corpus["queries"].append({"query": f"{kind} {a} {b} {c} {d}", "relevant": [document_id], "knowledge_domain": domain})
+
+    return corpus
+
+def load_corpus(path: str) -> Dict:
+    with open(path) as f:
+        corpus = json.load(f)
+    domains = {document["id"]: document.get("knowledge_domain") for document in corpus["documents"]}
+    for query in corpus["queries"]:
+        query.setdefault("knowledge_domain", domains.get(query["relevant"][0]) if query["relevant"] else None)
+    return corpus
+
+def score_rankings(rankings: List[List[str]], queries: List[Dict], k: int) -> Dict[str, float]:
+    """Mean recall@k and MRR of ranked document ids against labeled queries"""
+    recalls, reciprocal_ranks = [], []
+    for ranked, query in zip(rankings, queries):
+        relevant = set(query["relevant"])
+        if not relevant:
+            continue
+        recalls.append(len(relevant & set(ranked[:k])) / len(relevant))
+        rank = next((position for position, document_id in enumerate(ranked, 1) if document_id in relevant), None)
+        reciprocal_ranks.append(1 / rank if rank else 0.0)
+    return {
+        f"recall@{k}": round(float(np.mean(recalls)), 4) if recalls else 0.0,
+        "mrr": round(float(np.mean(reciprocal_ranks)), 4) if reciprocal_ranks else 0.0
+    }
+
+def latency_summary(latencies: List[float]) -> Dict[str, float]:
+    return {
+        "p50_ms": round(float(np.percentile(latencies, 50)), 3) if latencies else 0.0,
+        "p95_ms": round(float(np.percentile(latencies, 95)), 3) if latencies else 0.0
+    }
+
+def directory_mb(path: str) -> float:
+    total = sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(path) for name in names
+    )
+    return round(total / 1e6, 2)
+
+def unique_documents(results: List[Dict], ids_by_document: Dict[str, str]) -> List[str]:
+    """Corpus ids of the documents behind ranked chunks, first occurrence only"""
+    ranked = []
+    for result in results:
+        corpus_id = ids_by_document.get(result["metadata"].get("document_id"))
+        if corpus_id and corpus_id not in ranked:
+            ranked.append(corpus_id)
+    return ranked
+
+async def build_ingester(corpus: Dict, chunk_size: int, embedding_function: EmbeddingFunction):
+    """Index the corpus in a fresh knowledge base; returns the ingester, its directory and id map"""
+    path = tempfile.mkdtemp(prefix="knowledge-benchmark-")
+    ingester = DocumentIngester(chroma_path=path, embedding_function=embedding_function, chunk_size_words=chunk_size)
+    ingester.relationship_analysis = "local"
+    ingester.search_cache = SearchResultCache(max_entries=0)  # Measure searches, not cache hits
+
+    ids_by_document = {}
+    start = time.perf_counter()
+    for document in corpus["documents"]:
+        result = await ingester.ingest_text(
+            document["text"],
+            {"title": document["title"], "knowledge_domain": document.get("knowledge_domain")},
+            source=document["id"]
+        )
+        ids_by_document[result["document_id"]] = document["id"]
+    ingest_seconds = time.perf_counter() - start
+    return ingester, path, ids_by_document, ingest_seconds
+
+async def run_search(ingester: DocumentIngester, queries: List[Dict], k: int,
+                     mode: str, use_filters: bool) -> List[List[Dict]]:
+    results = []
+    for query in queries:
+        filters = SearchFilters(knowledge_domain=query.get("knowledge_domain")) if use_filters else None
+        results.append(await ingester.search_with_context(query["query"], n_results=k, mode=mode, filters=filters))
+    return results
+
+async def benchmark_ingester(corpus: Dict, args, embedding_function: EmbeddingFunction) -> List[Dict]:
+    rows = []
+    queries = corpus["queries"]
+    filter_options = [False, True] if args.filters else [False]
+
+    for chunk_size in args.chunk_sizes:
+        ingester, path, ids_by_document, ingest_seconds = await build_ingester(corpus, chunk_size, embedding_function)
+        stats = ingester.get_stats()
+        print(f"📚 chunk size {chunk_size}: {stats['chunks']} chunks from {stats['documents']} documents "
+              f"indexed in {ingest_seconds:.1f}s ({directory_mb(path)} MB on disk)")
+
+        for mode, overfetch, use_filters in itertools.product(args.modes, args.overfetch, filter_options):
+            ingester.overfetch_factor = overfetch
+            await run_search(ingester, queries[:args.warmup], args.k, mode, use_filters)
+
+            latencies, rankings = [], []
+            for query in queries:
+                filters = SearchFilters(knowledge_domain=query.get("knowledge_domain")) if use_filters else None
+                start = time.perf_counter()
+                results = await ingester.search_with_context(query["query"], n_results=args.k, mode=mode, filters=filters)
+                latencies.append((time.perf_counter() - start) * 1000)
+                rankings.append(unique_documents(results, ids_by_document))
+
+            # Allocation peak measured in a separate pass so tracing does not skew latency
+            tracemalloc.start()
+            await run_search(ingester, queries[:args.memory_queries], args.k, mode, use_filters)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            rows.append({
+                "engine": "DocumentIngester",
+                "mode": mode,
+                "chunk_size": chunk_size,
+                "overfetch": overfetch,
+                "filters": "domain" if use_filters else "none",
+                **score_rankings(rankings, queries, args.k),
+                **latency_summary(latencies),
+                "query_peak_kb": round(peak / 1024, 1),
+                "index_mb": directory_mb(path)
+            })
+
+        ingester.metadata_index.close()
+        shutil.rmtree(path, ignore_errors=True)
+    return rows
+
+def benchmark_hierarchy(corpus: Dict, args) -> Dict:
+    tracemalloc.start()
+    hierarchy = SimpleKnowledgeHierarchy()
+    ids_by_document = {
+        hierarchy.add_document(document["text"], document["title"]): document["id"]
+        for document in corpus["documents"]
+    }
+    _, build_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies, rankings = [], []
+    for query in corpus["queries"]:
+        start = time.perf_counter()
+        documents = hierarchy.search_relevant(query["query"], max_results=args.k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        rankings.append([ids_by_document[document.doc_id] for document in documents])
+
+    return {
+        "engine": "SimpleKnowledgeHierarchy",
+        "mode": "keyword",
+        "chunk_size": None,
+        "overfetch": None,
+        "filters": "none",
+        **score_rankings(rankings, corpus["queries"], args.k),
+        **latency_summary(latencies),
+        "query_peak_kb": None,
+        "index_mb": round(build_peak / 1e6, 2)
+    }
+
+def print_table(rows: List[Dict], k: int):
+    columns = ["engine", "mode", "chunk_size", "overfetch", "filters", f"recall@{k}", "mrr", "p50_ms", "p95_ms",
+               "query_peak_kb", "index_mb"]
+    widths = {column: max(len(column), *(len(str(row.get(column))) for row in rows)) for column in columns}
+    print("  ".join(column.ljust(widths[column]) for column in columns))
+    for row in rows:
+        print("  ".join(str(row.get(column)).ljust(widths[column]) for column in columns))
+
+async def main(args):
+    corpus = load_corpus(args.corpus) if args.corpus else synthetic_corpus(args.documents, args.words, args.seed)
+    print(f"🧪 {len(corpus['documents'])} documents, {len(corpus['queries'])} labeled queries")
+
+    embedding_function = HashingEmbeddingFunction(dimension=args.dimension)
+    rows = await benchmark_ingester(corpus, args, embedding_function)
+    rows.append(benchmark_hierarchy(corpus, args))
+
+    print_table(rows, args.k)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"config": vars(args), "results": rows}, f, indent=2)
+        print(f"✅ Results written to {args.output}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", help="Recorded corpus JSON (defaults to a synthetic corpus)")
+    parser.add_argument("--documents", type=int, default=200, help="Synthetic documents")
+    parser.add_argument("--words", type=int, default=600, help="Words per synthetic document")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--k", type=int, default=5, help="Results per query (n_results)")
+    parser.add_argument("--modes", nargs="+", default=["vector", "lexical", "hybrid"])
+    parser.add_argument("--overfetch", nargs="+", type=int, default=[1, 2, 4])
+    parser.add_argument("--chunk-sizes", nargs="+", type=int, default=[250, 1000])
+    parser.add_argument("--filters", action="store_true", help="Also run every configuration with a knowledge_domain filter")
+    parser.add_argument("--dimension", type=int, default=256, help="Embedding stand-in dimension")
+    parser.add_argument("--warmup", type=int, default=10, help="Untimed queries per configuration")
+    parser.add_argument("--memory-queries", type=int, default=50, help="Queries traced for the allocation peak")
+    parser.add_argument("--output", help="Write results as JSON")
+    args = parser.parse_args()
+
+    if any(mode not in ("vector", "lexical", "hybrid") for mode in args.modes):
+        parser.error("modes must be vector, lexical or hybrid")
+
+    # Per-search info logs would dominate the output
+    structlog.configure(wrapper_class=structlog.make_filtering_bound_logger(logging.WARNING))
+    logging.getLogger("chromadb").setLevel(logging.ERROR)
+
+    asyncio.run(main(args))
@@ -2,10 +2,19 @@
 """
 Piper Morgan 1.0 - Database Initialization via Docker
 Creates all required tables for domain models and event sourcing
+
+The domain schema is generated from the SQLAlchemy models, so it matches what
+the API and workers expect (and migrate older databases to).
 """
 
 import subprocess
 import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.database import Base
+from services.database.migrations import schema_ddl
 
 def run_sql(sql_command):
     """Run SQL command via docker-compose exec"""
@@ -25,17 +34,12 @@ def init_database():
     """Initialize database with clean schema"""
     print("🗄️  Dropping existing tables...")
     
-    drop_commands = [
-        "DROP TABLE IF EXISTS workflow_tasks CASCADE",
-        "DROP TABLE IF EXISTS events CASCADE", 
-        "DROP TABLE IF EXISTS workflows CASCADE",
-        "DROP TABLE IF EXISTS intents CASCADE",
-        "DROP TABLE IF EXISTS features CASCADE",
-        "DROP TABLE IF EXISTS products CASCADE",
-        "DROP TABLE IF EXISTS stakeholders CASCADE",
-        "DROP TABLE IF EXISTS work_items CASCADE",
-        "DROP TYPE IF EXISTS workflowtype CASCADE",
-        "DROP TYPE IF EXISTS workflowstatus CASCADE"
+    # workflow_tasks is the table tasks lived in before the schema followed the models
+    drop_commands = ["DROP TABLE IF EXISTS workflow_tasks CASCADE", "DROP TABLE IF EXISTS events CASCADE"]
+    drop_commands += [f"DROP TABLE IF EXISTS {table.name} CASCADE" for table in reversed(Base.metadata.sorted_tables)]
+    drop_commands += [
+        f"DROP TYPE IF EXISTS {enum_name} CASCADE"
+        for enum_name in ["intentcategory", "workflowtype", "workflowstatus", "tasktype", "taskstatus"]
     ]
     
     for cmd in drop_commands:
@@ -43,45 +47,12 @@ def init_database():
     
     print("🗄️  Creating fresh schema...")
     
-    # Create tables
-    tables = [
-        """CREATE TABLE intents (
-            id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
-            category VARCHAR(50) NOT NULL,
-            action VARCHAR(255) NOT NULL,
-            context JSONB DEFAULT '{}',
-            confidence FLOAT DEFAULT 0.0,
-            knowledge_context TEXT[],
-            created_at TIMESTAMP DEFAULT NOW()
-        )""",
-        
-        """CREATE TABLE workflows (
-            id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
-            type VARCHAR(50) NOT NULL,
-            status VARCHAR(50) DEFAULT 'pending',
-            context JSONB DEFAULT '{}',
-            result JSONB,
-            error TEXT,
-            intent_id UUID REFERENCES intents(id),
-            created_at TIMESTAMP DEFAULT NOW(),
-            updated_at TIMESTAMP DEFAULT NOW(),
-            completed_at TIMESTAMP
-        )""",
-        
-        """CREATE TABLE workflow_tasks (
-            id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
-            workflow_id UUID REFERENCES workflows(id) ON DELETE CASCADE,
-            type VARCHAR(50) NOT NULL,
-            status VARCHAR(50) DEFAULT 'pending',
-            data JSONB DEFAULT '{}',
-            result JSONB,
-            error TEXT,
-            created_at TIMESTAMP DEFAULT NOW(),
-            updated_at TIMESTAMP DEFAULT NOW(),
-            completed_at TIMESTAMP
-        )""",
-        
-        """CREATE TABLE events (
+    # Enum types, tables (workflows, tasks, workflow_jobs, ...) and their indexes
+    for statement in schema_ddl():
+        if not run_sql(statement):
+            return False
+    
+    events_table = """CREATE TABLE events (
             id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
             type VARCHAR(100) NOT NULL,
             data JSONB NOT NULL,
@@ -90,17 +61,12 @@ def init_database():
             version INTEGER DEFAULT 1,
             created_at TIMESTAMP DEFAULT NOW()
         )"""
-    ]
-    
-    for table_sql in tables:
-        if not run_sql(table_sql):
-            return False
+    if not run_sql(events_table):
+        return False
     
     print("🗄️  Creating indexes...")
     
     indexes = [
-        "CREATE INDEX idx_workflows_status ON workflows(status)",
-        "CREATE INDEX idx_workflows_type ON workflows(type)", 
         "CREATE INDEX idx_events_type ON events(type)",
         "CREATE INDEX idx_events_aggregate_id ON events(aggregate_id)"
     ]
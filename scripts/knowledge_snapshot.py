@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Piper Morgan 1.0 - Knowledge Base Snapshot Script
+Exports the knowledge base (chunk text, metadata and embeddings) to a columnar
+snapshot directory, or bulk-loads a snapshot into an empty node without
+re-embedding anything.
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.knowledge_graph import DocumentIngester
+
+def export_snapshot(chroma_path: str, snapshot_path: str):
+    ingester = DocumentIngester(chroma_path=chroma_path)
+    manifest = ingester.export_snapshot(snapshot_path)
+
+    print(f"📦 Exported {manifest['chunks']} chunks from {manifest['documents']} documents to {snapshot_path}")
+    for shard in manifest["shards"]:
+        print(f"   {shard['name']}: {shard['end'] - shard['start']} chunks")
+    print(f"✅ Done in {manifest['duration_seconds']:.1f}s")
+
+def import_snapshot(chroma_path: str, snapshot_path: str):
+    ingester = DocumentIngester(chroma_path=chroma_path)
+    try:
+        summary = ingester.import_snapshot(snapshot_path)
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+    print(f"📥 Imported {summary['chunks']} chunks from {summary['documents']} documents")
+    for name, count in summary["shards"].items():
+        print(f"   {name}: {count} chunks")
+    print(f"✅ Done in {summary['duration_seconds']:.1f}s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("command", choices=["export", "import"])
+    parser.add_argument("snapshot_path")
+    parser.add_argument("--chroma-path", default="./data/chromadb")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        export_snapshot(args.chroma_path, args.snapshot_path)
+    else:
+        import_snapshot(args.chroma_path, args.snapshot_path)
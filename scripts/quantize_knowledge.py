@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Piper Morgan 1.0 - Knowledge Base Quantization Script
+Copies the Chroma knowledge shards into quantized in-process indexes (reusing
+the stored embeddings) and reports their recall against exact search over the
+Chroma float vectors. Run the app with KNOWLEDGE_VECTOR_BACKEND=quantized
+afterwards.
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import chromadb
+import numpy as np
+
+from services.knowledge_graph.config import QUANTIZED_RESCORE, QUANTIZED_RESCORE_FACTOR
+from services.knowledge_graph.quantized_index import QuantizedVectorIndex, exact_distances
+from services.knowledge_graph.sharding import is_shard
+
+BATCH_SIZE = 1000
+
+def exact_neighbors(collection, space: str, query_ids, k: int):
+    """Ids of each sampled chunk's k + 1 nearest chunks (itself included), streamed from Chroma"""
+    stored = collection.get(ids=list(query_ids), include=["embeddings"])
+    by_id = dict(zip(stored["ids"], stored["embeddings"]))
+    queries = np.asarray([by_id[chunk_id] for chunk_id in query_ids], dtype=np.float32)
+
+    best_ids = [[] for _ in query_ids]
+    best_distances = [np.zeros(0, dtype=np.float32) for _ in query_ids]
+    for offset in range(0, collection.count(), BATCH_SIZE):
+        batch = collection.get(include=["embeddings"], limit=BATCH_SIZE, offset=offset)
+        distances = exact_distances(space, np.asarray(batch["embeddings"], dtype=np.float32), queries)
+        for q in range(len(query_ids)):
+            ids = best_ids[q] + list(batch["ids"])
+            merged = np.concatenate([best_distances[q], distances[:, q]])
+            order = np.argsort(merged, kind="stable")[:k + 1]
+            best_ids[q] = [ids[i] for i in order]
+            best_distances[q] = merged[order]
+    return queries, best_ids
+
+def quantize(chroma_path: str, k: int, sample_size: int, rescore: bool):
+    client = chromadb.PersistentClient(path=chroma_path)
+    quantized_path = os.path.join(chroma_path, "quantized")
+
+    for collection in client.list_collections():
+        if not is_shard(collection.name):
+            continue
+
+        index = QuantizedVectorIndex(
+            os.path.join(quantized_path, collection.name),
+            collection.name,
+            metadata=collection.metadata,
+            space=(collection.metadata or {}).get("hnsw:space", "l2"),
+            rescore=rescore,
+            rescore_factor=QUANTIZED_RESCORE_FACTOR
+        )
+
+        total = collection.count()
+        print(f"📦 {collection.name}: copying {total} chunks")
+        for offset in range(0, total, BATCH_SIZE):
+            batch = collection.get(
+                include=["documents", "metadatas", "embeddings"],
+                limit=BATCH_SIZE,
+                offset=offset
+            )
+            index.add(
+                ids=batch["ids"],
+                documents=batch["documents"],
+                metadatas=batch["metadatas"],
+                embeddings=batch["embeddings"]
+            )
+
+        if index.count():
+            ids = index.get(include=())["ids"]
+            rng = np.random.default_rng(0)
+            query_ids = [ids[i] for i in sorted(rng.choice(len(ids), size=min(sample_size, len(ids)), replace=False))]
+            queries, neighbors = exact_neighbors(collection, index.space, query_ids, k)
+            report = index.recall_report(queries, k=k, exact_ids=neighbors, query_ids=query_ids)
+
+            recall = f"{report['recall_quantized']} int8 scan"
+            if report["recall_rescored"] is not None:
+                recall += f", {report['recall_rescored']} re-scored"
+            sizes = report["bytes_per_vector"]
+            print(
+                f"   recall@{k}: {recall} "
+                f"({sizes['int8_codes'] + sizes['float32_rescore']} bytes stored per vector, "
+                f"{report['bytes_on_disk']} in total)"
+            )
+
+    print("✅ Done - set KNOWLEDGE_VECTOR_BACKEND=quantized to search the quantized shards")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chroma-path", default="./data/chromadb")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--sample-size", type=int, default=100)
+    parser.add_argument("--rescore", action="store_true", default=QUANTIZED_RESCORE,
+                        help="Also keep float32 vectors to re-score candidates (five times the storage)")
+    args = parser.parse_args()
+    quantize(args.chroma_path, args.k, args.sample_size, args.rescore)
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Piper Morgan 1.0 - Knowledge Index Rebuild Script
+Migrates the Chroma knowledge shards to the HNSW parameters configured with
+KNOWLEDGE_HNSW_SPACE, KNOWLEDGE_HNSW_M, KNOWLEDGE_HNSW_CONSTRUCTION_EF and
+KNOWLEDGE_HNSW_SEARCH_EF, copying the stored embeddings instead of
+re-embedding. Stop the API first; shards are swapped in place.
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.knowledge_graph import DocumentIngester
+from services.knowledge_graph.sharding import hnsw_metadata
+
+def rebuild(chroma_path: str, force: bool, batch_size: int):
+    ingester = DocumentIngester(chroma_path=chroma_path)
+    print(f"🔧 Target parameters: {hnsw_metadata()}")
+
+    try:
+        rebuilt = ingester.rebuild_vector_index(force=force, batch_size=batch_size)
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+    for name, summary in rebuilt.items():
+        print(f"📦 {name}: {summary['chunks']} chunks (was {summary['previous'] or 'Chroma defaults'})")
+    if not rebuilt:
+        print("✅ All shards already use the configured parameters")
+    else:
+        print(f"✅ Rebuilt {len(rebuilt)} shards")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chroma-path", default="./data/chromadb")
+    parser.add_argument("--force", action="store_true", help="Rebuild shards that already match the configuration")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+    rebuild(args.chroma_path, args.force, args.batch_size)
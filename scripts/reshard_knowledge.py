@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+"""
+Piper Morgan 1.0 - Knowledge Base Resharding Script
+Moves chunks from the legacy pm_knowledge collection into per-domain shards
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.knowledge_graph import get_ingester
+
+def reshard():
+    ingester = get_ingester()
+    
+    print("📚 Shards before:")
+    for name, count in ingester.get_stats()["shards"].items():
+        print(f"   {name}: {count} chunks")
+    
+    moved = ingester.reshard_legacy_collection()
+    print(f"🔀 Moved {moved} chunks out of the legacy collection")
+    
+    print("📚 Shards after:")
+    for name, count in ingester.get_stats()["shards"].items():
+        print(f"   {name}: {count} chunks")
+
+if __name__ == "__main__":
+    reshard()
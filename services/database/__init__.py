@@ -3,13 +3,14 @@ Database Service
 Handles data persistence and retrieval
 """
 from .connection import db, Base
-from .models import Product, Feature, WorkItem, Intent, Workflow, Task, Stakeholder
+from .models import Product, Feature, WorkItem, Intent, Workflow, Task, Stakeholder, WorkflowJob
 from .repositories import (
     ProductRepository,
     FeatureRepository, 
     WorkItemRepository,
     WorkflowRepository,
     TaskRepository,
+    WorkflowJobRepository,
     RepositoryFactory
 )
 
@@ -26,6 +27,7 @@ __all__ = [
     "Workflow",
     "Task",
     "Stakeholder",
+    "WorkflowJob",
     
     # Repositories
     "ProductRepository",
@@ -33,5 +35,6 @@ __all__ = [
     "WorkItemRepository",
     "WorkflowRepository",
     "TaskRepository",
+    "WorkflowJobRepository",
     "RepositoryFactory"
 ]
\ No newline at end of file
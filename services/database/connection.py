@@ -3,11 +3,15 @@ Database Connection Management
 Handles PostgreSQL connections using asyncpg and SQLAlchemy
 """
 import os
+import time
 from typing import Optional
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import declarative_base
 import structlog
 
+from shared.timings import record_duration
+
 logger = structlog.get_logger()
 
 # Base class for all models
@@ -37,6 +41,12 @@ class DatabaseConnection:
             max_overflow=0
         )
         
+        # Statement time counts towards the current timing collector (shared.timings);
+        # SQLAlchemy runs these hooks in the caller's context
+        event.listen(self.engine.sync_engine, "before_cursor_execute", _start_statement_timer)
+        event.listen(self.engine.sync_engine, "after_cursor_execute", _stop_statement_timer)
+        event.listen(self.engine.sync_engine, "handle_error", _stop_failed_statement_timer)
+        
         # Create session factory
         self.async_session = async_sessionmaker(
             self.engine,
@@ -67,6 +77,24 @@ class DatabaseConnection:
         
         logger.info("Database tables created")
     
+    async def migrate(self):
+        """Bring an existing database up to the current models (creating it if empty)"""
+        from .migrations import migrate_enum_types, migrate_schema
+        
+        if not self._initialized:
+            await self.initialize()
+        
+        # New enum labels are committed on their own; older Postgres refuses them in a transaction
+        async with self.engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            enum_changes = await conn.run_sync(migrate_enum_types)
+        async with self.engine.begin() as conn:
+            schema_changes = await conn.run_sync(migrate_schema)
+        
+        changes = enum_changes + schema_changes
+        if changes:
+            logger.info("Database migrated", changes=changes)
+    
     async def get_session(self) -> AsyncSession:
         """Get a new database session"""
         if not self._initialized:
@@ -81,5 +109,22 @@ class DatabaseConnection:
             self._initialized = False
             logger.info("Database connection closed")
 
+# Start times are keyed by execution context. conn.info outlives the checkout,
+# so a statement that raises must remove its entry in handle_error.
+def _start_statement_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("statement_started", {})[context] = time.perf_counter()
+
+def _stop_statement_timer(conn, cursor, statement, parameters, context, executemany):
+    _record_statement(conn, context)
+
+def _stop_failed_statement_timer(exception_context):
+    if exception_context.connection is not None:
+        _record_statement(exception_context.connection, exception_context.execution_context)
+
+def _record_statement(conn, context):
+    started = conn.info.get("statement_started", {}).pop(context, None)
+    if started is not None:
+        record_duration("db", (time.perf_counter() - started) * 1000)
+
 # Global database connection
 db = DatabaseConnection()
\ No newline at end of file
@@ -0,0 +1,93 @@
+"""
+Schema Migrations
+Brings a database created by an earlier version up to the current models.
+Every step checks before it changes anything, so it runs on every startup.
+"""
+from typing import List
+
+import structlog
+from sqlalchemy import Enum, create_mock_engine, inspect, text
+from sqlalchemy.engine import Connection
+
+from .connection import Base
+from . import models  # noqa: F401 - registers the tables on Base.metadata
+
+logger = structlog.get_logger()
+
+# Any constant works; it only has to be the same in every process
+MIGRATION_LOCK_ID = 7_140_001
+
+def migrate_schema(conn: Connection) -> List[str]:
+    """
+    Create missing tables, columns and indexes; returns what was added
+
+    New tables (e.g. workflow_jobs) get their indexes with them. Columns
+    added to existing tables must be nullable or have a server default.
+    """
+    if conn.dialect.name == "postgresql":
+        # API and workers start together; one migrates, the others then find nothing to do
+        conn.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": MIGRATION_LOCK_ID})
+
+    inspector = inspect(conn)
+    existing_tables = set(inspector.get_table_names())
+    changes = []
+
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        columns = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in columns:
+                continue
+            column_type = column.type.compile(dialect=conn.dialect)
+            conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+            changes.append(f"{table.name}.{column.name}")
+
+        indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in indexes:
+                index.create(conn)
+                changes.append(index.name)
+
+    missing = [table for table in Base.metadata.sorted_tables if table.name not in existing_tables]
+    if missing:
+        Base.metadata.create_all(conn, tables=missing)
+        changes.extend(table.name for table in missing)
+    return changes
+
+def migrate_enum_types(conn: Connection) -> List[str]:
+    """
+    Add enum members introduced since the Postgres enum types were created
+    (e.g. TaskStatus.CANCELLED); returns the labels added
+    """
+    if conn.dialect.name != "postgresql":
+        return []
+
+    changes = []
+    seen = set()
+    for table in Base.metadata.sorted_tables:
+        for column in table.columns:
+            if not isinstance(column.type, Enum) or column.type.name in seen:
+                continue
+            seen.add(column.type.name)
+            labels = set(conn.execute(
+                text("SELECT e.enumlabel FROM pg_enum e JOIN pg_type t ON t.oid = e.enumtypid WHERE t.typname = :name"),
+                {"name": column.type.name}
+            ).scalars())
+            if not labels:
+                continue  # Type not created yet; create_all creates it complete
+            for label in column.type.enums:
+                if label not in labels:
+                    conn.execute(text(f"ALTER TYPE {column.type.name} ADD VALUE IF NOT EXISTS '{label}'"))
+                    changes.append(f"{column.type.name}.{label}")
+    return changes
+
+def schema_ddl(dialect: str = "postgresql") -> List[str]:
+    """CREATE statements for the whole schema, for running through a SQL shell"""
+    statements = []
+    engine = create_mock_engine(
+        f"{dialect}://",
+        lambda sql, *args, **kwargs: statements.append(str(sql.compile(dialect=engine.dialect)).strip())
+    )
+    Base.metadata.create_all(engine, checkfirst=False)
+    return statements
@@ -2,7 +2,7 @@
 Database Models
 SQLAlchemy models for persistent storage
 """
-from sqlalchemy import Column, String, Text, DateTime, Float, JSON, Enum, ForeignKey, Boolean, Integer
+from sqlalchemy import Column, String, Text, DateTime, Float, JSON, Enum, ForeignKey, Boolean, Integer, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import enum
@@ -92,6 +92,7 @@ class Workflow(Base):
     output_data = Column(JSON)
     context = Column(JSON)
     error = Column(Text)
+    intent_id = Column(String)
     
     created_at = Column(DateTime, default=datetime.utcnow)
     started_at = Column(DateTime)
@@ -99,7 +100,15 @@ class Workflow(Base):
     
     # Relationships
     intent = relationship("Intent", back_populates="workflow", uselist=False)
-    tasks = relationship("Task", back_populates="workflow")
+    tasks = relationship("Task", back_populates="workflow", order_by="Task.position")
+    
+    __table_args__ = (
+        # Listing pages newest first, optionally narrowed by status, type or intent
+        Index("ix_workflows_created_at_id", "created_at", "id"),
+        Index("ix_workflows_status_created_at_id", "status", "created_at", "id"),
+        Index("ix_workflows_type_created_at_id", "type", "created_at", "id"),
+        Index("ix_workflows_intent_id", "intent_id"),
+    )
 
 class Task(Base):
     """Individual task in a workflow"""
@@ -107,8 +116,11 @@ class Task(Base):
     
     id = Column(String, primary_key=True)
     workflow_id = Column(String, ForeignKey("workflows.id"))
+    name = Column(String)
+    position = Column(Integer, default=0)  # Order within the workflow
     type = Column(Enum(TaskType))
     status = Column(Enum(TaskStatus))
+    depends_on = Column(JSON)  # Ids of tasks that must complete first
     input_data = Column(JSON)
     output_data = Column(JSON)
     error = Column(Text)
@@ -116,8 +128,43 @@ class Task(Base):
     started_at = Column(DateTime)
     completed_at = Column(DateTime)
     
+    # Execution timings. Nullable so migrations.migrate_schema can add them to
+    # existing tables; tasks that ran before then have none.
+    duration_ms = Column(Float)  # Handler wall time
+    queue_wait_ms = Column(Float)  # Ready (dependencies met) until started
+    timings = Column(JSON)  # Sub-timings and call counts: llm_ms, db_ms, github_ms, ...
+    input_tokens = Column(Integer)
+    output_tokens = Column(Integer)
+    
     # Relationships
     workflow = relationship("Workflow", back_populates="tasks")
+    
+    __table_args__ = (
+        # Latency aggregation per task type over a time window
+        Index("ix_tasks_type_completed_at", "type", "completed_at"),
+    )
+
+class WorkflowJob(Base):
+    """Queued workflow execution, leased by one worker at a time"""
+    __tablename__ = "workflow_jobs"
+    
+    id = Column(String, primary_key=True)
+    workflow_id = Column(String, ForeignKey("workflows.id"), unique=True, nullable=False)
+    status = Column(String, default="queued", nullable=False)  # queued, leased, done, failed
+    attempts = Column(Integer, default=0, nullable=False)
+    available_at = Column(DateTime, default=datetime.utcnow, nullable=False)  # Not leased before this (retry backoff)
+    lease_owner = Column(String)
+    lease_expires_at = Column(DateTime)
+    last_error = Column(Text)
+    
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        # Lease scans: queued jobs by availability, leased jobs by expiry
+        Index("ix_workflow_jobs_status_available_at", "status", "available_at"),
+        Index("ix_workflow_jobs_status_lease_expires_at", "status", "lease_expires_at"),
+    )
 
 class Stakeholder(Base):
     """People involved with products"""
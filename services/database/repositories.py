@@ -3,17 +3,25 @@ Database Repositories
 Handles CRUD operations for domain entities
 """
 from typing import List, Optional, Dict, Any
-from sqlalchemy import select, update
+from sqlalchemy import select, insert, update, func, or_, and_, exists
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+import base64
 import uuid
-from datetime import datetime
+from datetime import datetime, timedelta
 import structlog
 
-from .models import Product, Feature, WorkItem, Intent, Workflow, Task
+from services.domain import models as domain
+from services.shared_types import TaskStatus, WorkflowStatus
+from .models import Product, Feature, WorkItem, Intent, Workflow, Task, WorkflowJob
 from .connection import db
 
 logger = structlog.get_logger()
 
+UNFINISHED_WORKFLOW_STATUSES = (WorkflowStatus.PENDING, WorkflowStatus.RUNNING)
+ACTIVE_JOB_STATUSES = ("queued", "leased")
+
 class BaseRepository:
     """Base repository with common CRUD operations"""
     model = None
@@ -32,6 +40,16 @@ class BaseRepository:
         await self.session.refresh(entity)
         return entity
     
+    async def add(self, **kwargs) -> Any:
+        """Insert a new entity in the current transaction, leaving the commit to the caller"""
+        if 'id' not in kwargs:
+            kwargs['id'] = str(uuid.uuid4())
+        
+        entity = self.model(**kwargs)
+        self.session.add(entity)
+        await self.session.flush()
+        return entity
+    
     async def get(self, id: str) -> Optional[Any]:
         """Get entity by ID"""
         result = await self.session.execute(
@@ -46,6 +64,16 @@ class BaseRepository:
         )
         return result.scalars().all()
     
+    async def update_many(self, updates: Dict[str, Dict[str, Any]]):
+        """
+        Apply column updates keyed by id as batched UPDATEs by primary key, one
+        per distinct set of columns. The caller commits.
+        """
+        if updates:
+            await self.session.execute(
+                update(self.model), [{"id": id, **values} for id, values in updates.items()]
+            )
+    
     async def update(self, id: str, **kwargs) -> Optional[Any]:
         """Update an entity"""
         entity = await self.get(id)
@@ -90,44 +118,398 @@ class WorkItemRepository(BaseRepository):
 class WorkflowRepository(BaseRepository):
     model = Workflow
     
-    async def create_from_domain(self, domain_workflow) -> Workflow:
-        """Create DB workflow from domain workflow"""
-        return await self.create(
+    async def create_with_tasks(self, domain_workflow):
+        """
+        Insert a domain workflow and all of its tasks: one statement for the
+        workflow, one batched statement for the tasks. The caller commits.
+        """
+        await self.session.execute(insert(Workflow).values(
             id=domain_workflow.id,
             type=domain_workflow.type,
             status=domain_workflow.status,
-            input_data=domain_workflow.input_data,
-            output_data=domain_workflow.output_data,
+            input_data=dict(domain_workflow.context),  # The intent context the workflow started from
             context=domain_workflow.context,
+            intent_id=domain_workflow.intent_id,
             created_at=domain_workflow.created_at
+        ))
+        if domain_workflow.tasks:
+            await self.session.execute(insert(Task), [
+                {
+                    "id": task.id,
+                    "workflow_id": domain_workflow.id,
+                    "name": task.name,
+                    "position": position,
+                    "type": task.type,
+                    "status": task.status,
+                    "depends_on": list(task.depends_on)
+                }
+                for position, task in enumerate(domain_workflow.tasks)
+            ])
+    
+    async def get_with_tasks(self, workflow_id: str) -> Optional[Workflow]:
+        """Get a workflow with its tasks loaded"""
+        result = await self.session.execute(
+            select(Workflow).options(selectinload(Workflow.tasks)).where(Workflow.id == workflow_id)
+        )
+        return result.scalar_one_or_none()
+    
+    async def get_domain(self, workflow_id: str) -> Optional[domain.Workflow]:
+        """Load a workflow and its tasks as domain objects"""
+        db_workflow = await self.get_with_tasks(workflow_id)
+        return to_domain_workflow(db_workflow) if db_workflow else None
+    
+    async def list_page(self, limit: int = 50, cursor: Optional[str] = None, status=None,
+                        workflow_type=None, intent_id: Optional[str] = None,
+                        created_after: Optional[datetime] = None,
+                        created_before: Optional[datetime] = None) -> Dict[str, Any]:
+        """
+        One page of workflows, newest first, using keyset pagination
+        
+        Pages are bounded by (created_at, id) of the last row seen, so every page
+        is an index range scan however deep the caller pages. Only the summary
+        columns are read; JSON payloads stay in the table.
+        """
+        query = select(
+            Workflow.id, Workflow.type, Workflow.status, Workflow.intent_id,
+            Workflow.created_at, Workflow.completed_at
         )
+        if status is not None:
+            query = query.where(Workflow.status == status)
+        if workflow_type is not None:
+            query = query.where(Workflow.type == workflow_type)
+        if intent_id is not None:
+            query = query.where(Workflow.intent_id == intent_id)
+        if created_after is not None:
+            query = query.where(Workflow.created_at >= created_after)
+        if created_before is not None:
+            query = query.where(Workflow.created_at < created_before)
+        if cursor:
+            last_created_at, last_id = decode_workflow_cursor(cursor)
+            query = query.where(or_(
+                Workflow.created_at < last_created_at,
+                and_(Workflow.created_at == last_created_at, Workflow.id < last_id)
+            ))
+        
+        # One extra row tells us whether another page exists
+        query = query.order_by(Workflow.created_at.desc(), Workflow.id.desc()).limit(limit + 1)
+        rows = (await self.session.execute(query)).all()
+        
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_workflow_cursor(rows[-1].created_at, rows[-1].id)
+        
+        return {
+            "workflows": [
+                {
+                    "id": row.id,
+                    "type": row.type.value if row.type else None,
+                    "status": row.status.value if row.status else None,
+                    "intent_id": row.intent_id,
+                    "created_at": row.created_at.isoformat() if row.created_at else None,
+                    "completed_at": row.completed_at.isoformat() if row.completed_at else None
+                }
+                for row in rows
+            ],
+            "next_cursor": next_cursor
+        }
+    
+    async def get_status(self, workflow_id: str):
+        """Current status of a workflow, or None if it does not exist"""
+        result = await self.session.execute(select(Workflow.status).where(Workflow.id == workflow_id))
+        return result.scalar_one_or_none()
+    
+    async def request_cancel(self, workflow_id: str) -> bool:
+        """Mark a pending or running workflow cancelled; False if it is missing or already finished"""
+        result = await self.session.execute(
+            update(Workflow)
+            .where(
+                Workflow.id == workflow_id,
+                Workflow.status.in_(UNFINISHED_WORKFLOW_STATUSES)
+            )
+            .values(status=WorkflowStatus.CANCELLED, completed_at=datetime.utcnow())
+        )
+        return result.rowcount > 0
     
-    async def update_status(self, workflow_id: str, status, output_data=None, error=None):
-        """Update workflow status"""
+    async def list_interrupted_ids(self, created_before: datetime, without_active_job: bool = True,
+                                   limit: int = 100) -> List[str]:
+        """
+        Pending or running workflows nothing is working on: no queued or leased
+        job (or any, if without_active_job is False), created before the cutoff
+        """
+        query = select(Workflow.id).where(
+            Workflow.status.in_(UNFINISHED_WORKFLOW_STATUSES),
+            Workflow.created_at < created_before
+        )
+        if without_active_job:
+            query = query.where(~exists().where(
+                WorkflowJob.workflow_id == Workflow.id,
+                WorkflowJob.status.in_(ACTIVE_JOB_STATUSES)
+            ))
+        result = await self.session.execute(query.order_by(Workflow.created_at).limit(limit))
+        return list(result.scalars().all())
+    
+    async def update_status(self, workflow_id: str, status, output_data=None, error=None) -> bool:
+        """Update workflow status in the current transaction; the caller commits"""
         updates = {"status": status}
         if output_data:
             updates["output_data"] = output_data
         if error:
             updates["error"] = error
-        if status.value == "completed":
+        if status.value in ("completed", "failed", "cancelled"):
             updates["completed_at"] = datetime.utcnow()
         elif status.value == "running":
             updates["started_at"] = datetime.utcnow()
         
-        return await self.update(workflow_id, **updates)
+        result = await self.session.execute(
+            update(Workflow).where(Workflow.id == workflow_id).values(**updates)
+        )
+        return result.rowcount > 0
+
+    async def latency_summary(self, since: datetime) -> List[Dict[str, Any]]:
+        """p50/p95 execution time and queue wait per workflow type, for workflows finished since `since`"""
+        duration_ms = func.extract("epoch", Workflow.completed_at - Workflow.started_at) * 1000
+        queue_wait_ms = func.extract("epoch", Workflow.started_at - Workflow.created_at) * 1000
+        result = await self.session.execute(
+            select(
+                Workflow.type,
+                func.count(Workflow.id).label("count"),
+                func.count(Workflow.id).filter(Workflow.status == WorkflowStatus.FAILED).label("failed"),
+                func.percentile_cont(0.5).within_group(duration_ms).label("duration_p50_ms"),
+                func.percentile_cont(0.95).within_group(duration_ms).label("duration_p95_ms"),
+                func.percentile_cont(0.5).within_group(queue_wait_ms).label("queue_wait_p50_ms"),
+                func.percentile_cont(0.95).within_group(queue_wait_ms).label("queue_wait_p95_ms")
+            )
+            .where(Workflow.completed_at >= since, Workflow.started_at.isnot(None))
+            .group_by(Workflow.type)
+            .order_by(Workflow.type)
+        )
+        return [_latency_row(row, "type") for row in result.all()]
 
 class TaskRepository(BaseRepository):
     model = Task
     
-    async def create_from_domain(self, workflow_id: str, domain_task) -> Task:
-        """Create DB task from domain task"""
-        return await self.create(
-            id=domain_task.id,
-            workflow_id=workflow_id,
-            type=domain_task.type,
-            status=domain_task.status,
-            input_data=domain_task.input_data
+    async def latency_summary(self, since: datetime) -> List[Dict[str, Any]]:
+        """
+        p50/p95 handler time and queue wait per task type, for tasks finished
+        since `since`, with the average time spent in LLM, database and GitHub
+        calls and total token usage
+        """
+        def sub_timing(key: str):
+            return func.avg(func.coalesce(Task.timings[key].as_float(), 0.0))
+        
+        result = await self.session.execute(
+            select(
+                Task.type,
+                func.count(Task.id).label("count"),
+                func.count(Task.id).filter(Task.status == TaskStatus.FAILED).label("failed"),
+                func.percentile_cont(0.5).within_group(Task.duration_ms).label("duration_p50_ms"),
+                func.percentile_cont(0.95).within_group(Task.duration_ms).label("duration_p95_ms"),
+                func.percentile_cont(0.5).within_group(Task.queue_wait_ms).label("queue_wait_p50_ms"),
+                func.percentile_cont(0.95).within_group(Task.queue_wait_ms).label("queue_wait_p95_ms"),
+                sub_timing("llm_ms").label("llm_avg_ms"),
+                sub_timing("db_ms").label("db_avg_ms"),
+                sub_timing("github_ms").label("github_avg_ms"),
+                func.sum(Task.input_tokens).label("input_tokens"),
+                func.sum(Task.output_tokens).label("output_tokens")
+            )
+            .where(Task.completed_at >= since, Task.duration_ms.isnot(None))
+            .group_by(Task.type)
+            .order_by(Task.type)
         )
+        return [_latency_row(row, "type") for row in result.all()]
+
+class WorkflowJobRepository(BaseRepository):
+    """
+    Durable workflow queue. Workers lease jobs with SELECT ... FOR UPDATE SKIP
+    LOCKED, so any number of them can poll the same table without blocking each
+    other or taking the same job.
+    """
+    model = WorkflowJob
+    
+    async def enqueue(self, workflow_id: str) -> WorkflowJob:
+        """Queue a workflow for execution (a no-op if it is already queued)"""
+        result = await self.session.execute(
+            select(WorkflowJob).where(WorkflowJob.workflow_id == workflow_id)
+        )
+        existing = result.scalar_one_or_none()
+        if existing:
+            return existing
+        return await self.create(workflow_id=workflow_id, status="queued", attempts=0, available_at=datetime.utcnow())
+    
+    async def lease(self, worker_id: str, lease_seconds: int, max_attempts: int) -> Optional[WorkflowJob]:
+        """
+        Lease the next available job: a queued one past its backoff, or a leased
+        one whose worker stopped heartbeating
+        """
+        while True:
+            now = datetime.utcnow()
+            result = await self.session.execute(
+                select(WorkflowJob)
+                .where(or_(
+                    and_(WorkflowJob.status == "queued", WorkflowJob.available_at <= now),
+                    and_(WorkflowJob.status == "leased", WorkflowJob.lease_expires_at < now)
+                ))
+                .order_by(WorkflowJob.available_at)
+                .limit(1)
+                .with_for_update(skip_locked=True)
+            )
+            job = result.scalar_one_or_none()
+            if job is None:
+                await self.session.commit()
+                return None
+            
+            if job.attempts >= max_attempts:
+                # Its last worker died mid-execution too many times
+                job.status = "failed"
+                job.lease_owner = None
+                job.last_error = job.last_error or "Worker lease expired"
+                await self._fail_workflow(job.workflow_id, job.last_error)
+                await self.session.commit()
+                continue
+            
+            job.status = "leased"
+            job.lease_owner = worker_id
+            job.lease_expires_at = now + timedelta(seconds=lease_seconds)
+            job.attempts += 1
+            await self.session.commit()
+            return job
+    
+    async def heartbeat(self, job_id: str, worker_id: str, lease_seconds: int) -> bool:
+        """Extend a lease; False if the worker no longer holds it"""
+        result = await self.session.execute(
+            update(WorkflowJob)
+            .where(WorkflowJob.id == job_id, WorkflowJob.lease_owner == worker_id, WorkflowJob.status == "leased")
+            .values(lease_expires_at=datetime.utcnow() + timedelta(seconds=lease_seconds))
+        )
+        await self.session.commit()
+        return result.rowcount == 1
+    
+    async def complete(self, job_id: str, worker_id: str) -> bool:
+        result = await self.session.execute(
+            update(WorkflowJob)
+            .where(WorkflowJob.id == job_id, WorkflowJob.lease_owner == worker_id)
+            .values(status="done", lease_owner=None, lease_expires_at=None)
+        )
+        await self.session.commit()
+        return result.rowcount == 1
+    
+    async def fail(self, job_id: str, worker_id: str, error: str,
+                   max_attempts: int, retry_delay_seconds: float) -> Optional[str]:
+        """Requeue a job with exponential backoff, or mark it failed after max_attempts; returns the new status"""
+        job = await self.get(job_id)
+        if not job or job.lease_owner != worker_id:
+            return None
+        
+        job.last_error = error
+        job.lease_owner = None
+        job.lease_expires_at = None
+        if job.attempts >= max_attempts:
+            job.status = "failed"
+            await self._fail_workflow(job.workflow_id, error)
+        else:
+            job.status = "queued"
+            job.available_at = datetime.utcnow() + timedelta(seconds=retry_delay_seconds * 2 ** (job.attempts - 1))
+        await self.session.commit()
+        return job.status
+    
+    async def requeue_interrupted(self, created_before: datetime, limit: int = 100) -> List[str]:
+        """
+        Queue a fresh job for every pending or running workflow without a
+        queued or leased one, e.g. after a crash between persisting a workflow
+        and enqueueing it. Safe to run from several workers at once.
+        """
+        workflow_ids = await WorkflowRepository(self.session).list_interrupted_ids(created_before, limit=limit)
+        if workflow_ids:
+            now = datetime.utcnow()
+            statement = pg_insert(WorkflowJob).values([
+                {"id": str(uuid.uuid4()), "workflow_id": workflow_id, "status": "queued",
+                 "attempts": 0, "available_at": now}
+                for workflow_id in workflow_ids
+            ])
+            await self.session.execute(statement.on_conflict_do_update(
+                index_elements=[WorkflowJob.workflow_id],
+                # Attempts carry over, so a workflow that keeps coming back still fails in the end
+                set_={"status": "queued", "available_at": now, "lease_owner": None, "lease_expires_at": None},
+                where=WorkflowJob.status.notin_(ACTIVE_JOB_STATUSES)
+            ))
+        await self.session.commit()
+        return workflow_ids
+    
+    async def _fail_workflow(self, workflow_id: str, error: str):
+        """A job given up on also fails its workflow, which would otherwise stay running forever"""
+        await self.session.execute(
+            update(Workflow)
+            .where(Workflow.id == workflow_id, Workflow.status.in_(UNFINISHED_WORKFLOW_STATUSES))
+            .values(status=WorkflowStatus.FAILED, error=f"Execution abandoned: {error}", completed_at=datetime.utcnow())
+        )
+    
+    async def counts(self) -> Dict[str, int]:
+        """Jobs per status"""
+        result = await self.session.execute(
+            select(WorkflowJob.status, func.count()).group_by(WorkflowJob.status)
+        )
+        return {status: count for status, count in result.all()}
+
+def _latency_row(row, key: str) -> Dict[str, Any]:
+    """Aggregation row as a dict: enum keys by value, milliseconds rounded"""
+    summary = {}
+    for name, value in row._mapping.items():
+        if name == key:
+            value = value.value if value is not None else None
+        elif value is not None and not isinstance(value, int):
+            value = round(float(value), 1)  # Floats and Decimals from percentile_cont/extract
+        summary[name] = value
+    return summary
+
+def encode_workflow_cursor(created_at: datetime, workflow_id: str) -> str:
+    """Opaque listing cursor for the row a page ended on"""
+    return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{workflow_id}".encode()).decode()
+
+def decode_workflow_cursor(cursor: str):
+    """Inverse of encode_workflow_cursor; raises ValueError for malformed cursors"""
+    try:
+        created_at, workflow_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+        return datetime.fromisoformat(created_at), workflow_id
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def to_domain_workflow(db_workflow: Workflow) -> domain.Workflow:
+    """Hydrate a domain workflow (tasks loaded) from its database rows"""
+    tasks = [
+        domain.Task(
+            id=db_task.id,
+            name=db_task.name or (db_task.type.value.replace("_", " ").title() if db_task.type else ""),
+            type=db_task.type,
+            status=db_task.status,
+            result=db_task.output_data,
+            error=db_task.error,
+            depends_on=list(db_task.depends_on or []),
+            started_at=db_task.started_at,
+            completed_at=db_task.completed_at,
+            duration_ms=db_task.duration_ms,
+            queue_wait_ms=db_task.queue_wait_ms,
+            timings=dict(db_task.timings or {})
+        )
+        for db_task in db_workflow.tasks
+    ]
+    
+    # Completed outputs are merged in workflow order, as the engine merges them
+    context = dict(db_workflow.context or {})
+    for task in tasks:
+        if task.status == TaskStatus.COMPLETED and task.result:
+            context.update(task.result)
+    
+    return domain.Workflow(
+        id=db_workflow.id,
+        type=db_workflow.type,
+        status=db_workflow.status,
+        tasks=tasks,
+        context=context,
+        error=db_workflow.error,
+        intent_id=db_workflow.intent_id,
+        created_at=db_workflow.created_at or datetime.now()
+    )
 
 # Repository factory
 class RepositoryFactory:
@@ -143,5 +525,6 @@ class RepositoryFactory:
             "work_items": WorkItemRepository(session),
             "workflows": WorkflowRepository(session),
             "tasks": TaskRepository(session),
+            "workflow_jobs": WorkflowJobRepository(session),
             "session": session
         }
\ No newline at end of file
@@ -4,7 +4,7 @@ The heart of the system - these models drive everything else.
 """
 # 2025-06-14: Fixed Task type field and status enum to match database model and shared_types
 from dataclasses import dataclass, field
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Set
 from datetime import datetime
 from enum import Enum
 from uuid import uuid4
@@ -87,7 +87,13 @@ class Task:
     status: TaskStatus = TaskStatus.PENDING
     result: Optional[Dict[str, Any]] = None
     error: Optional[str] = None
+    depends_on: List[str] = field(default_factory=list)  # Ids of tasks that must complete first
     created_at: datetime = field(default_factory=datetime.now)
+    started_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
+    duration_ms: Optional[float] = None
+    queue_wait_ms: Optional[float] = None
+    timings: Dict[str, Any] = field(default_factory=dict)  # llm_ms, db_ms, github_ms, tokens, ...
     
     def to_dict(self) -> Dict[str, Any]:
         return {
@@ -97,7 +103,13 @@ class Task:
             "status": self.status.value,
             "result": self.result,
             "error": self.error,
-            "created_at": self.created_at.isoformat()
+            "depends_on": self.depends_on,
+            "created_at": self.created_at.isoformat(),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "completed_at": self.completed_at.isoformat() if self.completed_at else None,
+            "duration_ms": self.duration_ms,
+            "queue_wait_ms": self.queue_wait_ms,
+            "timings": self.timings
         }
 
 @dataclass
@@ -129,6 +141,14 @@ class Workflow:
                 return task
         return None
 
+    def get_ready_tasks(self, dependencies: Dict[str, Set[str]]) -> List[Task]:
+        """Pending tasks whose dependencies have all completed, in workflow order"""
+        done = {task.id for task in self.tasks if task.status in [TaskStatus.COMPLETED, TaskStatus.SKIPPED]}
+        return [
+            task for task in self.tasks
+            if task.status == TaskStatus.PENDING and dependencies.get(task.id, set()) <= done
+        ]
+
     def mark_task_completed(self, task_id: str, result: Dict[str, Any]):
         """Mark a task as completed with result"""
         for task in self.tasks:
@@ -187,7 +207,13 @@ class Workflow:
                 status=TaskStatus(task_data.get("status", "pending")),
                 result=task_data.get("result"),
                 error=task_data.get("error"),
-                created_at=datetime.fromisoformat(task_data.get("created_at", datetime.now().isoformat()))
+                depends_on=list(task_data.get("depends_on") or []),
+                created_at=datetime.fromisoformat(task_data.get("created_at", datetime.now().isoformat())),
+                started_at=datetime.fromisoformat(task_data["started_at"]) if task_data.get("started_at") else None,
+                completed_at=datetime.fromisoformat(task_data["completed_at"]) if task_data.get("completed_at") else None,
+                duration_ms=task_data.get("duration_ms"),
+                queue_wait_ms=task_data.get("queue_wait_ms"),
+                timings=dict(task_data.get("timings") or {})
             )
             workflow.tasks.append(task)
         
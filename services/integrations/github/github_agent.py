@@ -2,6 +2,7 @@
 GitHub Agent - Extended for PM-008: Issue Analysis
 Adds issue fetching and URL parsing capabilities
 """
+import asyncio
 import os
 import re
 from typing import Optional, Dict, Any, List, Tuple
@@ -9,6 +10,9 @@ from github import Github
 from github.Issue import Issue as GitHubIssue
 from github.Repository import Repository
 
+from shared.deadlines import DeadlineExceeded, with_deadline
+from shared.timings import timed
+
 class GitHubAgent:
     """GitHub API operations for issue management and analysis"""
     
@@ -56,6 +60,9 @@ class GitHubAgent:
             
         Returns:
             Dictionary with issue data or error information
+            
+        Raises:
+            DeadlineExceeded: The enclosing deadline ran out
         """
         try:
             # Parse URL
@@ -69,6 +76,8 @@ class GitHubAgent:
             owner, repo, issue_number = parsed
             return await self.get_issue(f"{owner}/{repo}", issue_number)
             
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             return {
                 'success': False,
@@ -85,7 +94,16 @@ class GitHubAgent:
             
         Returns:
             Dictionary with issue data or error information
+            
+        Raises:
+            DeadlineExceeded: The enclosing deadline ran out
         """
+        # PyGithub blocks; run it off the event loop so a deadline can abandon it
+        with timed("github"):
+            return await with_deadline(asyncio.to_thread(self._fetch_issue, repo_name, issue_number))
+    
+    def _fetch_issue(self, repo_name: str, issue_number: int) -> Dict[str, Any]:
+        """Blocking issue fetch for get_issue"""
         try:
             # Get repository
             repo = self.client.get_repo(repo_name)
@@ -2,6 +2,7 @@
 GitHub Issue Analyzer - PM-008 Implementation
 Analyzes existing GitHub issues and provides improvement suggestions
 """
+import asyncio
 import os
 from typing import Dict, Any, List, Optional
 from dataclasses import dataclass
@@ -12,6 +13,7 @@ from services.integrations.github.github_agent import GitHubAgent
 from services.integrations.github.issue_generator import IssueContentGenerator
 from services.knowledge_graph.ingestion import get_ingester
 from services.llm.clients import llm_client
+from shared.deadlines import DeadlineExceeded, check_deadline, with_deadline
 
 @dataclass
 class IssueAnalysis:
@@ -40,6 +42,9 @@ class GitHubIssueAnalyzer:
             
         Returns:
             Analysis results with summary, comment, and rewrite suggestions
+            
+        Raises:
+            DeadlineExceeded: The enclosing deadline ran out (other failures are returned)
         """
         try:
             # Step 1: Fetch the issue
@@ -66,12 +71,90 @@ class GitHubIssueAnalyzer:
                 'analysis': analysis
             }
             
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             return {
                 'success': False,
                 'error': f"Analysis failed: {str(e)}"
             }
     
+    async def analyze_issues_by_url(self, urls: List[str]) -> List[Dict[str, Any]]:
+        """
+        Analyze several GitHub issues, sharing one batched knowledge search
+        
+        Args:
+            urls: GitHub issue URLs
+            
+        Returns:
+            Analysis results per URL, in the same order as urls
+        """
+        fetched = await asyncio.gather(
+            *(self.github.get_issue_by_url(url) for url in urls),
+            return_exceptions=True
+        )
+        check_deadline()
+        
+        results: List[Optional[Dict[str, Any]]] = [None] * len(urls)
+        issues = []  # (position, issue data) of successfully fetched issues
+        for position, issue_result in enumerate(fetched):
+            if isinstance(issue_result, Exception):
+                results[position] = {
+                    'success': False,
+                    'error': f"Analysis failed: {str(issue_result)}"
+                }
+            elif not issue_result['success']:
+                results[position] = {
+                    'success': False,
+                    'error': f"Failed to fetch issue: {issue_result['error']}"
+                }
+            else:
+                issues.append((position, issue_result['issue']))
+        
+        try:
+            knowledge_results = await with_deadline(self.knowledge.search_many(
+                [self._knowledge_query(issue_data) for _, issue_data in issues],
+                project_filter=None,
+                hierarchy_preference=3,
+                n_results=5
+            ))
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            for position, _ in issues:
+                results[position] = {
+                    'success': False,
+                    'error': f"Analysis failed: {str(e)}"
+                }
+            return results
+        
+        async def analyze(position: int, issue_data: Dict[str, Any], knowledge: List[Dict]):
+            try:
+                analysis = await self._analyze_issue(issue_data, knowledge)
+                results[position] = {
+                    'success': True,
+                    'url': urls[position],
+                    'issue': {
+                        'title': issue_data['title'],
+                        'number': issue_data['number'],
+                        'repository': issue_data['repository']['full_name']
+                    },
+                    'analysis': analysis
+                }
+            except DeadlineExceeded:
+                raise
+            except Exception as e:
+                results[position] = {
+                    'success': False,
+                    'error': f"Analysis failed: {str(e)}"
+                }
+        
+        await asyncio.gather(*(
+            analyze(position, issue_data, knowledge)
+            for (position, issue_data), knowledge in zip(issues, knowledge_results)
+        ))
+        return results
+    
     async def analyze_issue_by_number(self, repo_name: str, issue_number: int) -> Dict[str, Any]:
         """
         Analyze a GitHub issue by repository and number
@@ -108,30 +191,41 @@ class GitHubIssueAnalyzer:
                 'analysis': analysis
             }
             
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             return {
                 'success': False,
                 'error': f"Analysis failed: {str(e)}"
             }
     
-    async def _analyze_issue(self, issue_data: Dict[str, Any]) -> IssueAnalysis:
+    def _knowledge_query(self, issue_data: Dict[str, Any]) -> str:
+        """Knowledge base query for an issue"""
+        return f"{issue_data['title']} {(issue_data['body'] or '')[:200]}"
+    
+    async def _analyze_issue(self, issue_data: Dict[str, Any],
+                             knowledge_results: Optional[List[Dict]] = None) -> IssueAnalysis:
         """
         Core analysis logic for a GitHub issue
         
         Args:
             issue_data: Complete issue data from GitHub API
+            knowledge_results: Prefetched knowledge search results (batch analysis)
             
         Returns:
             IssueAnalysis with all improvement suggestions
+            
+        Each step is bounded by the enclosing deadline (shared.deadlines), so a
+        workflow out of time stops here instead of starting further calls.
         """
         # Step 1: Search knowledge base for relevant PM context
-        search_query = f"{issue_data['title']} {issue_data['body'][:200]}"
-        knowledge_results = await self.knowledge.search_with_context(
-            query=search_query,
-            project_filter=None,  # Could use repo name if we map it
-            hierarchy_preference=3,  # Include project and implementation level
-            n_results=5
-        )
+        if knowledge_results is None:
+            knowledge_results = await with_deadline(self.knowledge.search_with_context(
+                query=self._knowledge_query(issue_data),
+                project_filter=None,  # Could use repo name if we map it
+                hierarchy_preference=3,  # Include project and implementation level
+                n_results=5
+            ))
         
         # Step 2: Generate "ideal" issue for comparison
         ideal_issue = await self._generate_ideal_issue(issue_data)
@@ -180,6 +274,8 @@ class GitHubIssueAnalyzer:
                 'labels': ideal_content.labels
             }
             
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             # Fallback to basic structure if generation fails
             return {
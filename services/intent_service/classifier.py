@@ -1,6 +1,7 @@
 # services/intent_service/classifier.py
 from datetime import datetime
 from typing import Dict, List, Optional, Tuple
+import asyncio
 import json
 from services.domain.models import Intent, IntentCategory
 from services.llm.clients import llm_client
@@ -21,7 +22,8 @@ class IntentClassifier:
             "task_context"         # Current task specifics
         ]
     
-    async def classify(self, message: str, context: Optional[Dict] = None) -> Intent:
+    async def classify(self, message: str, context: Optional[Dict] = None,
+                       knowledge_results: Optional[List[Dict]] = None) -> Intent:
         # Capture input context for learning
         classification_context = {
             "message": message,
@@ -32,7 +34,7 @@ class IntentClassifier:
         
         try:
             # Perform classification with confidence scoring
-            intent, reasoning = await self._classify_with_reasoning(message, context)
+            intent, reasoning = await self._classify_with_reasoning(message, context, knowledge_results)
             
             # Identify learning opportunities
             intent.learning_signals = self._identify_learning_signals(
@@ -62,20 +64,40 @@ class IntentClassifier:
         
         return intent
     
+    async def classify_many(self, messages: List[str], context: Optional[Dict] = None) -> List[Intent]:
+        """Classify a batch of messages, fetching their knowledge context in one search"""
+        try:
+            knowledge_results = await get_ingester().search_many(
+                messages,
+                hierarchy_preference=3,
+                n_results=3
+            )
+        except Exception as e:
+            logger.warning(f"Batch knowledge search failed: {e}")
+            knowledge_results = [[] for _ in messages]
+        
+        return await asyncio.gather(*(
+            self.classify(message, context, results)
+            for message, results in zip(messages, knowledge_results)
+        ))
+    
 # Then update the _classify_with_reasoning method:
     async def _classify_with_reasoning(
-        self, message: str, context: Dict
+        self, message: str, context: Dict,
+        knowledge_results: Optional[List[Dict]] = None
     ) -> Tuple[Intent, Dict]:
         """Classification that returns both result and reasoning trace"""
         
-        # Search knowledge base for relevant context
+        # Search knowledge base for relevant context (unless prefetched by classify_many)
         knowledge_context = ""
         try:
-            search_results = await get_ingester().search_with_context(
-                message, 
-                hierarchy_preference=3,  # Focus on specific knowledge
-                n_results=3
-            )
+            search_results = knowledge_results
+            if search_results is None:
+                search_results = await get_ingester().search_with_context(
+                    message, 
+                    hierarchy_preference=3,  # Focus on specific knowledge
+                    n_results=3
+                )
             if search_results:
                 knowledge_context = "\n\nRelevant PM knowledge:\n"
                 for i, result in enumerate(search_results, 1):
@@ -3,11 +3,18 @@ Simple Knowledge Hierarchy v1
 Basic document classification and relevance scoring
 PM-007 MVP Implementation
 """
-from typing import Dict, Any, List, Set
-from dataclasses import dataclass
+from typing import Dict, Any, List, Optional, Set
+from collections import Counter
+from dataclasses import dataclass, field
 from enum import Enum
+import heapq
+import itertools
+import math
 import re
 
+# Words indexed for search; queries are tokenized the same way
+TERM_PATTERN = re.compile(r'\b[a-zA-Z]{3,}\b')
+
 class DocumentType(Enum):
     ARCHITECTURE = 'architecture'
     BUG_REPORT = 'bug_report'
@@ -23,12 +30,25 @@ class SimpleDocument:
     doc_type: DocumentType
     keywords: Set[str]
     project_tags: Set[str]
+    title_lower: str = field(init=False, repr=False)
+    
+    def __post_init__(self):
+        self.title_lower = self.title.lower()
 
 class SimpleKnowledgeHierarchy:
     """Basic document classification and retrieval"""
     
     def __init__(self):
         self.documents = {}  # doc_id -> SimpleDocument
+        
+        # Ids are never reused, so a removed document's id stays unambiguous
+        self._id_counter = itertools.count()
+        
+        # Inverted indexes: content term -> {doc_id: term frequency}, keyword -> doc_ids
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._keyword_postings: Dict[str, Set[str]] = {}
+        self._title_terms: Dict[str, Set[str]] = {}  # title term -> doc_ids
+        self._doc_terms: Dict[str, Counter] = {}  # doc_id -> its content term counts
     
     def classify_document(self, content: str, title: str = '') -> DocumentType:
         """Simple document classification"""
@@ -64,42 +84,109 @@ class SimpleKnowledgeHierarchy:
     
     def add_document(self, content: str, title: str = '', project_tags: Set[str] = None) -> str:
         """Add document to hierarchy"""
-        doc_id = f"doc_{len(self.documents)}"
+        doc_id = f"doc_{next(self._id_counter)}"
+        self._store(doc_id, content, title or f"Document {len(self.documents) + 1}", project_tags or set())
+        return doc_id
+    
+    def update_document(self, doc_id: str, content: Optional[str] = None, title: Optional[str] = None,
+                        project_tags: Optional[Set[str]] = None) -> bool:
+        """Replace a document's content, title or tags, keeping its id"""
+        document = self.documents.get(doc_id)
+        if document is None:
+            return False
         
-        doc_type = self.classify_document(content, title)
-        keywords = self.extract_keywords(content)
+        self._unindex(doc_id)
+        self._store(
+            doc_id,
+            document.content if content is None else content,
+            document.title if title is None else title,
+            document.project_tags if project_tags is None else project_tags
+        )
+        return True
+    
+    def remove_document(self, doc_id: str) -> bool:
+        """Remove a document from the hierarchy"""
+        if doc_id not in self.documents:
+            return False
         
+        self._unindex(doc_id)
+        del self.documents[doc_id]
+        return True
+    
+    def _store(self, doc_id: str, content: str, title: str, project_tags: Set[str]):
+        """Classify a document and add it to the indexes"""
         document = SimpleDocument(
             doc_id=doc_id,
-            title=title or f"Document {len(self.documents) + 1}",
+            title=title,
             content=content,
-            doc_type=doc_type,
-            keywords=keywords,
-            project_tags=project_tags or set()
+            doc_type=self.classify_document(content, title),
+            keywords=self.extract_keywords(content),
+            project_tags=project_tags
         )
-        
         self.documents[doc_id] = document
-        return doc_id
+        
+        terms = Counter(TERM_PATTERN.findall(content.lower()))
+        self._doc_terms[doc_id] = terms
+        for term, frequency in terms.items():
+            self._postings.setdefault(term, {})[doc_id] = frequency
+        for keyword in document.keywords:
+            self._keyword_postings.setdefault(keyword, set()).add(doc_id)
+        for term in set(TERM_PATTERN.findall(document.title_lower)):
+            self._title_terms.setdefault(term, set()).add(doc_id)
+    
+    def _unindex(self, doc_id: str):
+        """Drop a document's entries from the indexes"""
+        document = self.documents[doc_id]
+        for term in self._doc_terms.pop(doc_id):
+            self._discard(self._postings, term, doc_id)
+        for keyword in document.keywords:
+            self._discard(self._keyword_postings, keyword, doc_id)
+        for term in set(TERM_PATTERN.findall(document.title_lower)):
+            self._discard(self._title_terms, term, doc_id)
+    
+    @staticmethod
+    def _discard(index: Dict, term: str, doc_id: str):
+        postings = index.get(term)
+        if postings is None:
+            return
+        if isinstance(postings, dict):
+            postings.pop(doc_id, None)
+        else:
+            postings.discard(doc_id)
+        if not postings:
+            del index[term]
     
     def search_relevant(self, query: str, max_results: int = 3) -> List[SimpleDocument]:
-        """Find relevant documents for a query"""
-        query_words = set(re.findall(r'\b[a-zA-Z]{3,}\b', query.lower()))
+        """
+        Find relevant documents for a query
+        
+        Documents score TF-IDF for each query word in their content, plus 2 per
+        matching keyword and 3 per query word in their title. Only documents
+        sharing a word with the query are scored.
+        """
+        query_words = sorted(set(TERM_PATTERN.findall(query.lower())))
+        doc_count = len(self.documents)
+        
+        scores: Dict[str, float] = {}
+        for word in query_words:
+            postings = self._postings.get(word, {})
+            if postings:
+                idf = math.log(1 + doc_count / len(postings))
+                for doc_id, frequency in postings.items():
+                    scores[doc_id] = scores.get(doc_id, 0.0) + (1 + math.log(frequency)) * idf
+            for doc_id in self._keyword_postings.get(word, ()):
+                scores[doc_id] = scores.get(doc_id, 0.0) + 2
         
-        scored_docs = []
-        for doc in self.documents.values():
-            score = 0
-            
-            keyword_overlap = len(query_words & doc.keywords)
-            score += keyword_overlap * 2
-            
-            for word in query_words:
-                if word in doc.content.lower():
-                    score += 1
-                if word in doc.title.lower():
-                    score += 3
-            
-            if score > 0:
-                scored_docs.append((doc, score))
+        # Title words match as substrings (e.g. "bug" in "Bugs"), as before, but
+        # only candidate titles sharing a word with the query are checked
+        title_candidates = set(scores)
+        for word in query_words:
+            title_candidates.update(self._title_terms.get(word, ()))
+        for doc_id in title_candidates:
+            title_lower = self.documents[doc_id].title_lower
+            title_matches = sum(1 for word in query_words if word in title_lower)
+            if title_matches:
+                scores[doc_id] = scores.get(doc_id, 0.0) + 3 * title_matches
         
-        scored_docs.sort(key=lambda x: x[1], reverse=True)
-        return [doc for doc, score in scored_docs[:max_results]]
+        top = heapq.nlargest(max_results, scores.items(), key=lambda item: item[1])
+        return [self.documents[doc_id] for doc_id, score in top if score > 0]
@@ -1,2 +1,7 @@
 from .ingestion import get_ingester, DocumentIngester
-from .document_service import get_document_service, DocumentService
\ No newline at end of file
+from .document_service import get_document_service, DocumentService
+from .config import SearchMode, KNOWLEDGE_DOMAINS
+from .lexical_index import BM25Index
+from .metadata_index import MetadataIndex, SearchFilters
+from .quantized_index import QuantizedVectorIndex
+from .graph_index import KnowledgeGraphIndex
\ No newline at end of file
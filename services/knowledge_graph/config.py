@@ -0,0 +1,72 @@
+"""
+Knowledge Base Configuration
+Central place for retrieval settings
+"""
+import os
+from enum import Enum
+
+# Knowledge hierarchy, most general first
+KNOWLEDGE_DOMAINS = [
+    "pm_fundamentals",
+    "business_context",
+    "product_context",
+    "task_context"
+]
+
+class SearchMode(Enum):
+    VECTOR = "vector"    # Embedding similarity only
+    LEXICAL = "lexical"  # BM25 only
+    HYBRID = "hybrid"    # Both retrievers fused with reciprocal rank fusion
+
+DEFAULT_SEARCH_MODE = SearchMode(os.getenv("KNOWLEDGE_SEARCH_MODE", SearchMode.HYBRID.value))
+
+# Reciprocal rank fusion constant - larger values flatten the rank curve
+RRF_K = int(os.getenv("KNOWLEDGE_RRF_K", "60"))
+
+# Candidates fetched per retriever relative to the requested result count
+OVERFETCH_FACTOR = int(os.getenv("KNOWLEDGE_OVERFETCH_FACTOR", "2"))
+
+# Maximum cached search results (0 disables the cache)
+SEARCH_CACHE_SIZE = int(os.getenv("KNOWLEDGE_SEARCH_CACHE_SIZE", "1024"))
+
+# Split each knowledge domain's shard further by project_area
+SHARD_BY_PROJECT = os.getenv("KNOWLEDGE_SHARD_BY_PROJECT", "false").lower() == "true"
+
+# Chunks within this SimHash Hamming distance of a stored chunk are skipped
+# instead of embedded (-1 disables near-duplicate detection)
+DEDUP_MAX_DISTANCE = int(os.getenv("KNOWLEDGE_DEDUP_MAX_DISTANCE", "3"))
+
+# Uploads and deletes save the lexical index this many seconds later, on a
+# background thread, so a burst of changes is written once
+LEXICAL_SAVE_DELAY_SECONDS = float(os.getenv("KNOWLEDGE_LEXICAL_SAVE_DELAY_SECONDS", "2"))
+
+# Vector store behind each shard: "chroma", or "quantized" for the in-process
+# int8 index, searched by scanning every vector's codes
+VECTOR_BACKEND = os.getenv("KNOWLEDGE_VECTOR_BACKEND", "chroma")
+
+# Quantized backend: also keep float32 vectors to re-score the best candidates
+# exactly. Raises recall, but stores five times as much; applies to new shards
+QUANTIZED_RESCORE = os.getenv("KNOWLEDGE_QUANTIZED_RESCORE", "false").lower() == "true"
+
+# Quantized backend: candidates re-scored with float vectors per requested result
+QUANTIZED_RESCORE_FACTOR = int(os.getenv("KNOWLEDGE_QUANTIZED_RESCORE_FACTOR", "4"))
+
+# Relationship metadata for uploads: "local" extracts it from the whole document
+# without an LLM call, "background" does that and then enriches it with the LLM
+# analysis after the upload returns, "llm" waits for the LLM analysis
+RELATIONSHIP_ANALYSIS = os.getenv("KNOWLEDGE_RELATIONSHIP_ANALYSIS", "local")
+
+# Graph query expansion: boost candidates from documents linked to the concepts a
+# query names, and add neighboring concepts to the lexical query
+GRAPH_QUERY_EXPANSION = os.getenv("KNOWLEDGE_GRAPH_QUERY_EXPANSION", "false").lower() == "true"
+GRAPH_EXPANSION_TERMS = int(os.getenv("KNOWLEDGE_GRAPH_EXPANSION_TERMS", "5"))
+GRAPH_BOOST = float(os.getenv("KNOWLEDGE_GRAPH_BOOST", "0.5"))  # Max relative boost for graph-linked documents
+
+# HNSW graph parameters for newly created Chroma shards; existing shards keep the
+# parameters they were built with until scripts/rebuild_knowledge_index.py
+# migrates them. Larger M / construction ef build a denser graph (better
+# recall, more memory, slower inserts); search ef is the query beam width.
+HNSW_SPACE = os.getenv("KNOWLEDGE_HNSW_SPACE", "l2")  # "l2", "ip" or "cosine"
+HNSW_M = int(os.getenv("KNOWLEDGE_HNSW_M", "16"))
+HNSW_CONSTRUCTION_EF = int(os.getenv("KNOWLEDGE_HNSW_CONSTRUCTION_EF", "100"))
+HNSW_SEARCH_EF = int(os.getenv("KNOWLEDGE_HNSW_SEARCH_EF", "10"))
@@ -0,0 +1,66 @@
+"""
+Near-duplicate chunk detection
+SimHash fingerprints over word shingles, bucketed into LSH bands so an
+upload only compares each chunk against the few stored chunks that share a band
+"""
+import hashlib
+from collections import Counter
+from typing import List, Tuple
+
+import numpy as np
+
+from .text_normalization import tokenize
+
+FINGERPRINT_BITS = 64
+SHINGLE_SIZE = 3  # Words per shingle
+
+# 4 bands of 16 bits: by pigeonhole, fingerprints within Hamming distance 3
+# always share at least one band exactly
+LSH_BANDS = 4
+BAND_BITS = FINGERPRINT_BITS // LSH_BANDS
+_BAND_MASK = (1 << BAND_BITS) - 1
+
+_BIT_POSITIONS = np.arange(FINGERPRINT_BITS, dtype=np.uint64)
+
+def _shingle_hash(shingle: str) -> int:
+    return int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "little")
+
+def simhash(text: str) -> int:
+    """64-bit SimHash of a text's word shingles (0 for text without tokens)"""
+    tokens = tokenize(text)
+    if len(tokens) >= SHINGLE_SIZE:
+        shingles = [" ".join(tokens[i:i + SHINGLE_SIZE]) for i in range(len(tokens) - SHINGLE_SIZE + 1)]
+    else:
+        shingles = tokens
+    if not shingles:
+        return 0
+
+    counts = Counter(shingles)
+    hashes = np.array([_shingle_hash(shingle) for shingle in counts], dtype=np.uint64)
+    weights = np.array(list(counts.values()), dtype=np.int64)
+
+    # Each shingle votes +weight for its set bits and -weight for its clear bits
+    bits = ((hashes[:, None] >> _BIT_POSITIONS) & np.uint64(1)).astype(np.int64)
+    totals = weights @ (bits * 2 - 1)
+
+    fingerprint = 0
+    for position in np.flatnonzero(totals > 0):
+        fingerprint |= 1 << int(position)
+    return fingerprint
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+def band_keys(fingerprint: int) -> List[Tuple[int, int]]:
+    """(band, value) LSH bucket keys of a fingerprint"""
+    return [
+        (band, (fingerprint >> (band * BAND_BITS)) & _BAND_MASK)
+        for band in range(LSH_BANDS)
+    ]
+
+def to_signed(fingerprint: int) -> int:
+    """Map an unsigned 64-bit fingerprint onto SQLite's signed INTEGER range"""
+    return fingerprint - (1 << FINGERPRINT_BITS) if fingerprint >= 1 << (FINGERPRINT_BITS - 1) else fingerprint
+
+def to_unsigned(value: int) -> int:
+    return value + (1 << FINGERPRINT_BITS) if value < 0 else value
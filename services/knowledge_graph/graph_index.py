@@ -0,0 +1,343 @@
+"""
+Knowledge graph adjacency index
+Links documents to their concepts, keywords, feature areas and project area in
+compact CSR arrays, with recent changes held in a small delta until the next
+compaction, so neighborhood expansion and related-document queries never
+rescan document metadata
+"""
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from .text_normalization import normalize_phrase, tokenize
+
+DOCUMENT = "document"
+
+# Attribute node kinds, the metadata field each comes from and its edge weight
+ATTRIBUTE_FIELDS = {
+    "concept": ("main_concepts", 1.0),
+    "keyword": ("related_keywords", 0.6),
+    "feature_area": ("feature_areas", 0.8),
+    "project_area": ("project_area", 0.5)
+}
+
+# Pending edges allowed, relative to the compacted edge count, before merging
+COMPACTION_RATIO = 0.25
+MIN_COMPACTION_EDGES = 1024
+
+def node_key(kind: str, label: str) -> str:
+    return f"{kind}:{label}"
+
+def split_key(key: str) -> Tuple[str, str]:
+    kind, _, label = key.partition(":")
+    return kind, label
+
+@dataclass
+class GraphExpansion:
+    """Graph neighborhood of a query"""
+    seeds: List[str] = field(default_factory=list)                      # Attribute nodes named in the query
+    document_scores: Dict[str, float] = field(default_factory=dict)     # Documents linked to the seeds
+    terms: List[str] = field(default_factory=list)                      # Neighboring concepts/keywords, best first
+
+class KnowledgeGraphIndex:
+    """Bipartite document/attribute graph in CSR form with incremental updates"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self._node_ids: Dict[str, int] = {}
+        self._node_keys: List[Optional[str]] = []  # None for retired document nodes
+        self._alive = np.zeros(0, dtype=bool)
+        self._degree = np.zeros(0, dtype=np.float64)  # Summed edge weight per node
+
+        # Compacted adjacency: neighbors of node n are indices[indptr[n]:indptr[n + 1]]
+        self._indptr = np.zeros(1, dtype=np.int64)
+        self._indices = np.zeros(0, dtype=np.int32)
+        self._weights = np.zeros(0, dtype=np.float32)
+
+        # Edges added since the last compaction, both directions
+        self._pending: Dict[int, Dict[int, float]] = {}
+        self._pending_edges = 0
+
+        # Query token -> attribute nodes containing it, and each node's token count
+        self._token_nodes: Dict[str, Set[int]] = {}
+        self._node_token_counts: Dict[int, int] = {}
+
+    def __len__(self) -> int:
+        """Number of documents in the graph"""
+        with self._lock:
+            return sum(
+                1 for key, node in self._node_ids.items()
+                if key.startswith(f"{DOCUMENT}:") and self._alive[node]
+            )
+
+    @staticmethod
+    def _attributes(metadata: Dict) -> Dict[str, float]:
+        """Attribute node keys of document metadata with their edge weights"""
+        attributes: Dict[str, float] = {}
+        for kind, (metadata_field, weight) in ATTRIBUTE_FIELDS.items():
+            values = metadata.get(metadata_field) or []
+            if isinstance(values, str):
+                values = [values]
+            for value in values:
+                label = normalize_phrase(value)
+                if label:
+                    key = node_key(kind, label)
+                    attributes[key] = max(weight, attributes.get(key, 0.0))
+        return attributes
+
+    def _node(self, key: str) -> int:
+        node = self._node_ids.get(key)
+        if node is not None:
+            return node
+
+        node = len(self._node_keys)
+        self._node_ids[key] = node
+        self._node_keys.append(key)
+        if node >= len(self._alive):
+            capacity = max(16, 2 * len(self._alive))
+            self._alive = np.concatenate([self._alive, np.zeros(capacity - len(self._alive), dtype=bool)])
+            self._degree = np.concatenate([self._degree, np.zeros(capacity - len(self._degree))])
+        self._alive[node] = True
+
+        kind, label = split_key(key)
+        if kind != DOCUMENT:
+            tokens = set(tokenize(label))
+            self._node_token_counts[node] = len(tokens)
+            for token in tokens:
+                self._token_nodes.setdefault(token, set()).add(node)
+        return node
+
+    def build(self, documents: Iterable[Tuple[str, Dict]]):
+        """Replace the graph with the given (document id, metadata) pairs in one pass"""
+        with self._lock:
+            self._reset()
+            sources, targets, weights = [], [], []
+            for document_id, metadata in documents:
+                document = self._node(node_key(DOCUMENT, document_id))
+                for key, weight in self._attributes(metadata).items():
+                    sources.append(document)
+                    targets.append(self._node(key))
+                    weights.append(weight)
+
+            self._compact_unlocked(
+                np.array(sources + targets, dtype=np.int64),
+                np.array(targets + sources, dtype=np.int64),
+                np.array(weights + weights, dtype=np.float32)
+            )
+
+    def add_document(self, document_id: str, metadata: Dict):
+        """Link a document to its attributes, replacing any previous version"""
+        with self._lock:
+            self._remove_unlocked(document_id)
+            document = self._node(node_key(DOCUMENT, document_id))
+            for key, weight in self._attributes(metadata).items():
+                attribute = self._node(key)
+                self._pending.setdefault(document, {})[attribute] = weight
+                self._pending.setdefault(attribute, {})[document] = weight
+                self._degree[document] += weight
+                self._degree[attribute] += weight
+                self._pending_edges += 2
+
+            if self._pending_edges > max(MIN_COMPACTION_EDGES, COMPACTION_RATIO * len(self._indices)):
+                self._compact_unlocked()
+
+    def remove_document(self, document_id: str) -> bool:
+        with self._lock:
+            return self._remove_unlocked(document_id)
+
+    def _remove_unlocked(self, document_id: str) -> bool:
+        key = node_key(DOCUMENT, document_id)
+        document = self._node_ids.pop(key, None)
+        if document is None:
+            return False
+
+        # Retire the node; its compacted edges are skipped until compaction drops them
+        neighbors, weights = self._neighbors_unlocked(document)
+        np.subtract.at(self._degree, neighbors, weights)
+        for neighbor in self._pending.pop(document, {}):
+            del self._pending[neighbor][document]
+            self._pending_edges -= 2
+        self._degree[document] = 0
+        self._alive[document] = False
+        self._node_keys[document] = None
+        return True
+
+    def _compact_unlocked(self, sources: Optional[np.ndarray] = None,
+                          targets: Optional[np.ndarray] = None,
+                          weights: Optional[np.ndarray] = None):
+        """Merge pending edges into the CSR arrays, dropping edges of retired nodes"""
+        node_count = len(self._node_keys)
+        if sources is None:
+            base_sources = np.repeat(
+                np.arange(len(self._indptr) - 1, dtype=np.int64), np.diff(self._indptr)
+            )
+            pending_sources = [node for node, edges in self._pending.items() for _ in edges]
+            pending_targets = [target for edges in self._pending.values() for target in edges]
+            pending_weights = [weight for edges in self._pending.values() for weight in edges.values()]
+            sources = np.concatenate([base_sources, np.array(pending_sources, dtype=np.int64)])
+            targets = np.concatenate([self._indices.astype(np.int64), np.array(pending_targets, dtype=np.int64)])
+            weights = np.concatenate([self._weights, np.array(pending_weights, dtype=np.float32)])
+
+        keep = self._alive[sources] & self._alive[targets]
+        sources, targets, weights = sources[keep], targets[keep], weights[keep]
+
+        order = np.lexsort((targets, sources))
+        sources, targets, weights = sources[order], targets[order], weights[order]
+
+        self._indptr = np.zeros(node_count + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=node_count), out=self._indptr[1:])
+        self._indices = targets.astype(np.int32)
+        self._weights = weights.astype(np.float32)
+        self._pending = {}
+        self._pending_edges = 0
+
+        degree = np.bincount(sources, weights=weights, minlength=len(self._degree))
+        self._degree = degree.astype(np.float64)
+
+    def compact(self):
+        with self._lock:
+            self._compact_unlocked()
+
+    def _neighbors_unlocked(self, node: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Live neighbors of a node and the edge weights"""
+        if node < len(self._indptr) - 1:
+            start, end = self._indptr[node], self._indptr[node + 1]
+            neighbors = self._indices[start:end].astype(np.int64)
+            weights = self._weights[start:end].astype(np.float64)
+        else:
+            neighbors = np.zeros(0, dtype=np.int64)
+            weights = np.zeros(0, dtype=np.float64)
+
+        pending = self._pending.get(node)
+        if pending:
+            neighbors = np.concatenate([neighbors, np.fromiter(pending.keys(), dtype=np.int64, count=len(pending))])
+            weights = np.concatenate([weights, np.fromiter(pending.values(), dtype=np.float64, count=len(pending))])
+
+        live = self._alive[neighbors]
+        return neighbors[live], weights[live]
+
+    def _specificity(self, nodes: np.ndarray) -> np.ndarray:
+        """IDF-like weight: attributes shared by many documents say little"""
+        return 1.0 / np.log(2.0 + self._degree[nodes])
+
+    def neighbors(self, key: str, kind: Optional[str] = None, limit: Optional[int] = None) -> List[Tuple[str, float]]:
+        """
+        Nodes linked to a node, heaviest edge first
+
+        Args:
+            key: Node key such as "concept:token refresh" or "document:pdf_0eafadac"
+            kind: Only return neighbors of this kind
+            limit: Maximum neighbors to return
+        """
+        with self._lock:
+            node = self._node_ids.get(key)
+            if node is None:
+                return []
+            neighbors, weights = self._neighbors_unlocked(node)
+            ranked = [
+                (self._node_keys[neighbor], float(weight))
+                for neighbor, weight in zip(neighbors.tolist(), weights.tolist())
+                if kind is None or self._node_keys[neighbor].startswith(f"{kind}:")
+            ]
+        ranked.sort(key=lambda item: (-item[1], item[0]))
+        return ranked[:limit] if limit else ranked
+
+    def related_documents(self, document_id: str, n_results: int = 5) -> List[Tuple[str, float]]:
+        """
+        Documents sharing attributes with a document, weighted by how specific
+        each shared attribute is
+
+        Returns:
+            (document id, score) pairs, best first
+        """
+        with self._lock:
+            document = self._node_ids.get(node_key(DOCUMENT, document_id))
+            if document is None:
+                return []
+
+            attributes, attribute_weights = self._neighbors_unlocked(document)
+            scores: Dict[int, float] = {}
+            for attribute, weight, specificity in zip(
+                attributes.tolist(), attribute_weights.tolist(), self._specificity(attributes).tolist()
+            ):
+                others, other_weights = self._neighbors_unlocked(attribute)
+                for other, contribution in zip(others.tolist(), (other_weights * weight * specificity).tolist()):
+                    if other != document:
+                        scores[other] = scores.get(other, 0.0) + contribution
+
+            ranked = sorted(
+                ((split_key(self._node_keys[node])[1], score) for node, score in scores.items()),
+                key=lambda item: (-item[1], item[0])
+            )
+        return ranked[:n_results]
+
+    def _seed_nodes(self, query: str) -> List[int]:
+        """Attribute nodes whose every token appears in the query"""
+        query_tokens = set(tokenize(query))
+        hits: Dict[int, int] = {}
+        for token in query_tokens:
+            for node in self._token_nodes.get(token, ()):
+                hits[node] = hits.get(node, 0) + 1
+        return sorted(
+            node for node, count in hits.items()
+            if self._alive[node] and count == self._node_token_counts[node]
+        )
+
+    def expand(self, query: str, max_terms: int = 5) -> GraphExpansion:
+        """
+        Two-hop neighborhood of a query: the documents linked to attributes it
+        names, and the other concepts and keywords those documents carry
+        """
+        with self._lock:
+            seeds = self._seed_nodes(query)
+            if not seeds:
+                return GraphExpansion()
+
+            seed_array = np.array(seeds, dtype=np.int64)
+            document_scores: Dict[int, float] = {}
+            for seed, specificity in zip(seeds, self._specificity(seed_array).tolist()):
+                documents, weights = self._neighbors_unlocked(seed)
+                for document, weight in zip(documents.tolist(), weights.tolist()):
+                    document_scores[document] = document_scores.get(document, 0.0) + weight * specificity
+
+            seed_set = set(seeds)
+            term_scores: Dict[int, float] = {}
+            for document, document_score in document_scores.items():
+                attributes, weights = self._neighbors_unlocked(document)
+                contributions = weights * self._specificity(attributes) * document_score
+                for attribute, contribution in zip(attributes.tolist(), contributions.tolist()):
+                    if attribute not in seed_set:
+                        term_scores[attribute] = term_scores.get(attribute, 0.0) + contribution
+
+            terms = [
+                split_key(self._node_keys[node])[1]
+                for node, _ in sorted(term_scores.items(), key=lambda item: (-item[1], self._node_keys[item[0]]))
+                if split_key(self._node_keys[node])[0] in ("concept", "keyword")
+            ]
+            return GraphExpansion(
+                seeds=[self._node_keys[node] for node in seeds],
+                document_scores={
+                    split_key(self._node_keys[node])[1]: score for node, score in document_scores.items()
+                },
+                terms=terms[:max_terms]
+            )
+
+    def stats(self) -> Dict:
+        with self._lock:
+            kinds: Dict[str, int] = {}
+            for key, node in self._node_ids.items():
+                if self._alive[node]:
+                    kind = split_key(key)[0]
+                    kinds[kind] = kinds.get(kind, 0) + 1
+            sources = np.repeat(np.arange(len(self._indptr) - 1), np.diff(self._indptr))
+            live_edges = int(np.count_nonzero(self._alive[sources] & self._alive[self._indices]))
+            return {
+                "nodes": kinds,
+                "edges": (live_edges + self._pending_edges) // 2,
+                "pending_edges": self._pending_edges // 2
+            }
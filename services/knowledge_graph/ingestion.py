@@ -8,9 +8,16 @@ from dotenv import load_dotenv
 # Load environment variables
 load_dotenv()
 
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Set, Tuple
 from datetime import datetime
+import asyncio
+import copy
+import dataclasses
 import hashlib
+import heapq
+import itertools
+import shutil
+import time
 import chromadb
 from chromadb.utils import embedding_functions
 import PyPDF2
@@ -18,30 +25,537 @@ import structlog
 import json
 from pathlib import Path
 from services.llm.clients import llm_client
+from .config import (
+    SearchMode, DEFAULT_SEARCH_MODE, RRF_K, OVERFETCH_FACTOR, SEARCH_CACHE_SIZE, SHARD_BY_PROJECT,
+    DEDUP_MAX_DISTANCE, VECTOR_BACKEND, QUANTIZED_RESCORE, QUANTIZED_RESCORE_FACTOR, RELATIONSHIP_ANALYSIS,
+    GRAPH_QUERY_EXPANSION, GRAPH_EXPANSION_TERMS, GRAPH_BOOST, HNSW_SPACE, LEXICAL_SAVE_DELAY_SECONDS
+)
+from .dedup import simhash, hamming_distance, band_keys
+from .graph_index import KnowledgeGraphIndex, GraphExpansion, DOCUMENT, node_key
+from .lexical_index import BM25Index
+from .local_extraction import LocalRelationshipExtractor
+from .metadata_index import MetadataIndex, SearchFilters
+from .quantized_index import QuantizedVectorIndex
+from .relationship_scoring import build_term_sets, score_relationships
+from .search_cache import SearchResultCache, normalize_query
+from .sharding import (
+    LEGACY_COLLECTION, shard_name, shard_metadata, is_shard, hnsw_metadata, index_parameters
+)
+from .snapshot import SnapshotReader, SnapshotWriter
+from .text_normalization import TERM_SET_SEPARATOR
 
 logger = structlog.get_logger()
 
+# Relationship metadata stored as lists; Chroma only accepts scalar values,
+# so these are flattened on write and expanded again on read
+LIST_METADATA_FIELDS = (
+    "main_concepts",
+    "related_keywords",
+    "stakeholder_types",
+    "urgency_indicators",
+    "feature_areas"
+)
+
+# Fields produced by relationship analysis; background LLM enrichment replaces
+# these in the registry and leaves upload metadata alone
+RELATIONSHIP_FIELDS = LIST_METADATA_FIELDS + (
+    "document_type",
+    "project_area",
+    "hierarchy_level",
+    "complexity_level",
+    "relationship_analysis_version",
+    "analysis_timestamp"
+)
+
+# The only metadata stored per chunk; everything else lives in the document registry
+CHUNK_METADATA_FIELDS = ("document_id", "chunk_index", "word_start", "word_end")
+
+# Snapshots can only be loaded by nodes embedding queries with the same model
+EMBEDDING_MODEL = "text-embedding-ada-002"
+
+# Collections holding a shard's chunks while its HNSW graph is rebuilt; never
+# searched, and renamed over the shard once the copy is complete
+REBUILD_COLLECTION_PREFIX = "rebuild-"
+
+# PDF text is split into overlapping windows of words
+CHUNK_SIZE_WORDS = 1000
+CHUNK_OVERLAP_WORDS = 200
+
 class DocumentIngester:
     """Handles document upload and processing into vector database with relationship analysis"""
     
-    def __init__(self, chroma_path: str = "./data/chromadb"):
+    def __init__(self, chroma_path: str = "./data/chromadb",
+                 embedding_function: Optional[chromadb.EmbeddingFunction] = None,
+                 chunk_size_words: int = CHUNK_SIZE_WORDS,
+                 embedding_model: Optional[str] = None):
+        """
+        Args:
+            chroma_path: Directory holding the vector store and side indexes
+            embedding_function: Embeds chunks and queries (defaults to OpenAI embeddings)
+            chunk_size_words: Words per chunk for new uploads
+            embedding_model: Name of the model behind embedding_function, recorded
+                in snapshots; snapshots cannot be exported or imported without it
+        """
         self.chroma_path = chroma_path
         self.client = chromadb.PersistentClient(path=chroma_path)
         
-        # Use OpenAI embeddings
-        self.embedding_function = embedding_functions.OpenAIEmbeddingFunction(
+        # Use OpenAI embeddings unless another function (e.g. a local stand-in
+        # for benchmarks) is supplied
+        self.embedding_function = embedding_function or embedding_functions.OpenAIEmbeddingFunction(
             api_key=os.getenv("OPENAI_API_KEY"),
-            model_name="text-embedding-ada-002"
+            model_name=EMBEDDING_MODEL
         )
+        self.embedding_model = embedding_model if embedding_function else EMBEDDING_MODEL
+        
+        # Retrieval knobs, tunable per instance
+        self.chunk_size_words = chunk_size_words
+        self.chunk_overlap_words = min(CHUNK_OVERLAP_WORDS, chunk_size_words // 2)
+        self.overfetch_factor = OVERFETCH_FACTOR
+        
+        # Shards are Chroma collections, or quantized in-process indexes under
+        # chroma_path/quantized when KNOWLEDGE_VECTOR_BACKEND=quantized
+        self.vector_backend = VECTOR_BACKEND
+        self.quantized_path = os.path.join(chroma_path, "quantized")
+        
+        # Chunks are sharded into one collection per knowledge domain (optionally
+        # per project too); the original pm_knowledge collection is kept as the
+        # legacy shard for chunks ingested before sharding or without a domain
+        self.shards: Dict[str, chromadb.Collection] = {}
+        if self.vector_backend != "quantized":
+            self._finish_interrupted_rebuilds()
+        for name, existing_metadata in self._existing_shards():
+            self._get_shard(
+                name,
+                existing_metadata.get("knowledge_domain"),
+                existing_metadata.get("project_area"),
+                existing_metadata
+            )
+        self.collection = self._get_shard(LEGACY_COLLECTION)
+        
+        # Lexical index kept alongside the collection for exact-term matching
+        self.lexical_index = BM25Index(path=os.path.join(chroma_path, "lexical_index.json"))
+        
+        # Relational side index for facet filters Chroma cannot express
+        self.metadata_index = MetadataIndex(os.path.join(chroma_path, "metadata_index.sqlite3"))
+        
+        # Adjacency graph of documents and their concepts, keywords and areas,
+        # rebuilt from the document registry at startup
+        self.graph_index = KnowledgeGraphIndex()
+        
+        # Search results are cached per collection generation; every ingest or
+        # delete bumps the generation, which invalidates all earlier entries
+        self.generation = 0
+        self.search_cache = SearchResultCache(max_entries=SEARCH_CACHE_SIZE)
+        
+        # Relationship metadata is extracted locally from the whole document;
+        # the LLM analysis is only awaited in "llm" mode and runs after the
+        # upload returns in "background" mode
+        self.relationship_analysis = RELATIONSHIP_ANALYSIS
+        self.local_extractor = LocalRelationshipExtractor(idf=self.lexical_index.idf)
+        self._enrichment_tasks: Set[asyncio.Task] = set()
+        
+        chunk_count = self._chunk_count()
+        if chunk_count > 0:
+            # Also catches changes lost when the process stopped before a delayed save
+            if len(self.lexical_index) != chunk_count:
+                self._rebuild_lexical_index()
+            if self.metadata_index.chunk_count() == 0:
+                self._rebuild_metadata_index()
+            if self.metadata_index.fingerprint_count() == 0:
+                self._rebuild_fingerprints()
+            missing_registry = self.metadata_index.documents_missing_metadata()
+            if missing_registry:
+                self._backfill_document_registry(set(missing_registry))
+            self.graph_index.build(self.metadata_index.iter_documents())
+        
+        logger.info(f"Knowledge collection initialized with {chunk_count} documents in {len(self.shards)} shards")
+    
+    def _existing_shards(self) -> List[Tuple[str, Dict]]:
+        """(name, collection metadata) of the shards already stored for the active backend"""
+        if self.vector_backend == "quantized":
+            existing = QuantizedVectorIndex.list_indexes(self.quantized_path)
+        else:
+            existing = [(collection.name, collection.metadata) for collection in self.client.list_collections()]
+        return [(name, metadata or {}) for name, metadata in existing if is_shard(name)]
+    
+    def _get_shard(self, name: str, knowledge_domain: Optional[str] = None,
+                   project_area: Optional[str] = None,
+                   existing_metadata: Optional[Dict] = None) -> chromadb.Collection:
+        """
+        Open (creating if needed) a shard collection
+        
+        New collections get the configured HNSW parameters. Chroma overwrites
+        collection metadata on open, so existing ones (existing_metadata given)
+        keep recording the parameters their graph was actually built with.
+        """
+        shard = self.shards.get(name)
+        if shard is None:
+            if self.vector_backend == "quantized":
+                shard = QuantizedVectorIndex(
+                    os.path.join(self.quantized_path, name),
+                    name,
+                    embedding_function=self.embedding_function,
+                    metadata=shard_metadata(knowledge_domain, project_area),
+                    space=HNSW_SPACE,
+                    rescore=QUANTIZED_RESCORE,
+                    rescore_factor=QUANTIZED_RESCORE_FACTOR
+                )
+            else:
+                parameters = hnsw_metadata() if existing_metadata is None else index_parameters(existing_metadata)
+                shard = self.client.get_or_create_collection(
+                    name=name,
+                    embedding_function=self.embedding_function,
+                    metadata={**shard_metadata(knowledge_domain, project_area), **parameters}
+                )
+            self.shards[name] = shard
+        return shard
+    
+    def _shard_for_metadata(self, metadata: Dict) -> chromadb.Collection:
+        """Shard a document belongs in, based on its knowledge domain and project"""
+        knowledge_domain = metadata.get("knowledge_domain")
+        project_area = metadata.get("project_area") if SHARD_BY_PROJECT else None
+        return self._get_shard(shard_name(knowledge_domain, project_area), knowledge_domain, project_area)
+    
+    def _chunk_count(self) -> int:
+        return sum(shard.count() for shard in self.shards.values())
+    
+    def _rebuild_lexical_index(self):
+        """Backfill the lexical index from documents already in the shards"""
+        self.lexical_index.clear()
+        for shard in self.shards.values():
+            existing = shard.get(include=["documents"])
+            self.lexical_index.add_many(zip(existing["ids"], existing["documents"]))
+        self.lexical_index.save()
+        logger.info(f"Lexical index rebuilt with {len(self.lexical_index)} chunks")
+    
+    def _rebuild_metadata_index(self):
+        """Backfill the metadata side index, tagging legacy chunks with their document id"""
+        document_count = 0
+        for name, shard in self.shards.items():
+            existing = shard.get(include=["metadatas"])
+            
+            documents: Dict[str, Dict] = {}
+            chunk_ids: Dict[str, List[str]] = {}
+            untagged_ids, untagged_metadatas = [], []
+            
+            for chunk_id, metadata in zip(existing["ids"], existing["metadatas"]):
+                metadata = metadata or {}
+                document_id = metadata.get("document_id") or chunk_id.rsplit("_chunk_", 1)[0]
+                if "document_id" not in metadata:
+                    untagged_ids.append(chunk_id)
+                    untagged_metadatas.append({**metadata, "document_id": document_id})
+                
+                documents.setdefault(document_id, self._registry_metadata(self._expand_metadata(metadata)))
+                chunk_ids.setdefault(document_id, []).append(chunk_id)
+            
+            if untagged_ids:
+                shard.update(ids=untagged_ids, metadatas=untagged_metadatas)
+            
+            for document_id, metadata in documents.items():
+                self.metadata_index.add_document(document_id, metadata, chunk_ids[document_id], name)
+            document_count += len(documents)
+        logger.info(f"Metadata index rebuilt with {document_count} documents")
+    
+    def _rebuild_fingerprints(self):
+        """Backfill near-duplicate fingerprints for chunks ingested before deduplication"""
+        fingerprint_count = 0
+        for shard in self.shards.values():
+            existing = shard.get(include=["documents", "metadatas"])
+            
+            fingerprints: Dict[str, Dict[str, int]] = {}
+            for chunk_id, content, metadata in zip(existing["ids"], existing["documents"], existing["metadatas"]):
+                document_id = (metadata or {}).get("document_id") or chunk_id.rsplit("_chunk_", 1)[0]
+                fingerprints.setdefault(document_id, {})[chunk_id] = simhash(content)
+            
+            for document_id, document_fingerprints in fingerprints.items():
+                self.metadata_index.add_fingerprints(document_id, document_fingerprints)
+                fingerprint_count += len(document_fingerprints)
+        logger.info(f"Fingerprinted {fingerprint_count} existing chunks for deduplication")
+    
+    @staticmethod
+    def _registry_metadata(chunk_metadata: Dict) -> Dict:
+        """Document-level part of a legacy chunk's (expanded) metadata"""
+        document_metadata = {
+            key: value for key, value in chunk_metadata.items()
+            if key not in CHUNK_METADATA_FIELDS
+        }
+        document_metadata.update(build_term_sets(document_metadata))
+        return document_metadata
+    
+    def _backfill_document_registry(self, document_ids: Set[str]):
+        """Register document metadata from the chunks of documents indexed before the registry"""
+        for shard in self.shards.values():
+            existing = shard.get(include=["metadatas"])
+            for chunk_id, metadata in zip(existing["ids"], existing["metadatas"]):
+                metadata = self._expand_metadata(metadata)
+                document_id = metadata.get("document_id") or chunk_id.rsplit("_chunk_", 1)[0]
+                if document_id in document_ids:
+                    self.metadata_index.set_document_metadata(document_id, self._registry_metadata(metadata))
+                    document_ids.discard(document_id)
+        logger.info("Document registry backfilled from chunk metadata")
+    
+    def reshard_legacy_collection(self, batch_size: int = 500) -> int:
+        """
+        Move chunks from the legacy pm_knowledge collection into their domain shards
+        
+        Stored embeddings are copied as-is, so nothing is re-embedded. Chunks
+        of registered documents move with only their document id and position.
+        
+        Returns:
+            Number of chunks moved
+        """
+        legacy = self.shards[LEGACY_COLLECTION]
+        existing = legacy.get(include=["documents", "metadatas", "embeddings"])
+        
+        chunk_documents = [
+            (metadata or {}).get("document_id") or chunk_id.rsplit("_chunk_", 1)[0]
+            for chunk_id, metadata in zip(existing["ids"], existing["metadatas"])
+        ]
+        registered = self.metadata_index.get_documents(set(chunk_documents))
+        
+        moves: Dict[str, List[int]] = {}  # target shard -> positions in existing
+        chunk_metadatas = []
+        for position, metadata in enumerate(existing["metadatas"]):
+            metadata = metadata or {}
+            document = registered.get(chunk_documents[position])
+            target = self._shard_for_metadata({**metadata, **(document or {})})
+            if target.name != LEGACY_COLLECTION:
+                moves.setdefault(target.name, []).append(position)
+            if document:
+                metadata = {key: metadata[key] for key in CHUNK_METADATA_FIELDS if key in metadata}
+                metadata["document_id"] = chunk_documents[position]
+            chunk_metadatas.append(metadata)
+        
+        moved = 0
+        for name, positions in moves.items():
+            shard = self.shards[name]
+            for start in range(0, len(positions), batch_size):
+                batch = positions[start:start + batch_size]
+                ids = [existing["ids"][p] for p in batch]
+                shard.add(
+                    ids=ids,
+                    embeddings=[existing["embeddings"][p] for p in batch],
+                    documents=[existing["documents"][p] for p in batch],
+                    metadatas=[chunk_metadatas[p] for p in batch]
+                )
+                legacy.delete(ids=ids)
+                moved += len(ids)
+            
+            self.metadata_index.set_document_collection({chunk_documents[p] for p in positions}, name)
+        
+        if moved:
+            self.generation += 1
+        logger.info(f"Moved {moved} legacy chunks into {len(moves)} domain shards")
+        return moved
+    
+    def rebuild_vector_index(self, force: bool = False, batch_size: int = 1000) -> Dict[str, Dict]:
+        """
+        Migrate shards to the configured HNSW parameters
+        
+        Chroma fixes a collection's graph parameters when it is created, so each
+        shard built with other parameters is copied (stored embeddings included,
+        nothing is re-embedded) into a new collection that then replaces it.
+        
+        Args:
+            force: Also rebuild shards that already match the configuration
+            batch_size: Chunks copied per call
+            
+        Returns:
+            Per rebuilt shard: chunks copied and the parameters before and after
+        """
+        if self.vector_backend == "quantized":
+            raise ValueError("Quantized shards are searched exhaustively and have no HNSW graph to rebuild")
+        
+        parameters = hnsw_metadata()
+        rebuilt = {}
+        for name, shard in list(self.shards.items()):
+            previous = index_parameters(shard.metadata)
+            if previous == parameters and not force:
+                continue
+            
+            metadata = {key: value for key, value in (shard.metadata or {}).items() if key not in previous}
+            rebuild_name = self._rebuild_collection_name(name)
+            try:
+                self.client.delete_collection(rebuild_name)  # Left over from an interrupted copy
+            except ValueError:
+                pass
+            rebuild = self.client.create_collection(
+                name=rebuild_name,
+                embedding_function=self.embedding_function,
+                metadata={**metadata, **parameters, "rebuild_of": name}
+            )
+            
+            total = shard.count()
+            for offset in range(0, total, batch_size):
+                batch = shard.get(
+                    include=["documents", "metadatas", "embeddings"],
+                    limit=batch_size,
+                    offset=offset
+                )
+                rebuild.add(
+                    ids=batch["ids"],
+                    embeddings=batch["embeddings"],
+                    documents=batch["documents"],
+                    metadatas=batch["metadatas"]
+                )
+            if rebuild.count() != total:
+                self.client.delete_collection(rebuild_name)
+                raise ValueError(f"Shard {name} changed while it was being rebuilt")
+            
+            # Swap the copy in under the shard's name (Chroma refuses metadata
+            # updates that mention the space; the rebuild_of marker is dropped
+            # the next time the shard is opened)
+            self.client.delete_collection(name)
+            rebuild.modify(name=name)
+            self.shards[name] = self.client.get_collection(name=name, embedding_function=self.embedding_function)
+            rebuilt[name] = {"chunks": total, "previous": previous, "parameters": parameters}
+            logger.info(f"Rebuilt shard {name} ({total} chunks) with {parameters}")
+        
+        if rebuilt:
+            self.collection = self.shards[LEGACY_COLLECTION]
+            self.generation += 1
+        return rebuilt
+    
+    @staticmethod
+    def _rebuild_collection_name(name: str) -> str:
+        return f"{REBUILD_COLLECTION_PREFIX}{hashlib.md5(name.encode('utf-8')).hexdigest()[:12]}"
+    
+    def _finish_interrupted_rebuilds(self):
+        """Complete or discard HNSW rebuilds a previous process did not finish"""
+        collections = {collection.name: collection for collection in self.client.list_collections()}
+        for name, collection in collections.items():
+            if not name.startswith(REBUILD_COLLECTION_PREFIX):
+                continue
+            original = (collection.metadata or {}).get("rebuild_of")
+            if original and original not in collections:
+                # The shard is only dropped once its copy is complete
+                collection.modify(name=original)
+                logger.warning(f"Completed interrupted rebuild of shard {original}")
+            else:
+                self.client.delete_collection(name)
+                logger.warning(f"Discarded incomplete rebuild of shard {original}")
+    
+    def export_snapshot(self, path: str, batch_size: int = 1000) -> Dict:
+        """
+        Write the knowledge base (chunk text, positions and embeddings, plus the
+        document registry, fingerprints and lexical index) to a snapshot directory
+        
+        Returns:
+            The snapshot manifest
+        """
+        if not self.embedding_model:
+            raise ValueError("Unknown embedding model; pass embedding_model with a custom embedding_function")
+        
+        start_time = datetime.now()
+        fingerprints = self.metadata_index.fingerprints()
+        writer = SnapshotWriter(path, self._chunk_count())
         
-        # Create or get the PM knowledge collection
-        self.collection = self.client.get_or_create_collection(
-            name="pm_knowledge",
-            embedding_function=self.embedding_function,
-            metadata={"description": "Product Management knowledge base with relationships"}
+        for name, shard in sorted(self.shards.items()):
+            writer.start_shard(name, shard.metadata)
+            for offset in range(0, shard.count(), batch_size):
+                batch = shard.get(
+                    include=["documents", "metadatas", "embeddings"],
+                    limit=batch_size,
+                    offset=offset
+                )
+                writer.append(batch["ids"], batch["documents"], batch["metadatas"], batch["embeddings"], fingerprints)
+        
+        collections = self.metadata_index.document_collections()
+        self.lexical_index.save()
+        manifest = writer.finish(
+            [
+                (document_id, collections.get(document_id), metadata)
+                for document_id, metadata in self.metadata_index.iter_documents()
+            ],
+            self.metadata_index.duplicates(),
+            lexical_index_path=self.lexical_index.path,
+            embedding_model=self.embedding_model,
+            duration_seconds=(datetime.now() - start_time).total_seconds()
         )
+        logger.info(f"Exported {manifest['chunks']} chunks from {len(manifest['shards'])} shards to snapshot {path}")
+        return manifest
+    
+    def import_snapshot(self, path: str, batch_size: int = 1000) -> Dict:
+        """
+        Bulk-load a snapshot written by export_snapshot into an empty knowledge base
+        
+        Stored embeddings are loaded as-is, so nothing is re-embedded.
+        
+        Returns:
+            Summary of the import
+        """
+        start_time = datetime.now()
+        reader = SnapshotReader(path)
+        if self._chunk_count() or self.metadata_index.document_count():
+            raise ValueError("Snapshots can only be imported into an empty knowledge base")
+        if not self.embedding_model:
+            raise ValueError("Unknown embedding model; pass embedding_model with a custom embedding_function")
+        if reader.manifest.get("embedding_model") != self.embedding_model:
+            raise ValueError(
+                f"Snapshot was embedded with {reader.manifest.get('embedding_model')}, "
+                f"this node embeds queries with {self.embedding_model}"
+            )
+        
+        lexical_path = reader.lexical_index_path
+        chunk_ids: Dict[str, List[str]] = {}
+        fingerprints: Dict[str, Dict[str, int]] = {}
+        for snapshot_shard in reader.shards:
+            shard = self._get_shard(
+                snapshot_shard.name,
+                snapshot_shard.metadata.get("knowledge_domain"),
+                snapshot_shard.metadata.get("project_area")
+            )
+            for start in range(snapshot_shard.start, snapshot_shard.end, batch_size):
+                batch = reader.rows(start, min(start + batch_size, snapshot_shard.end))
+                shard.add(
+                    ids=batch["ids"],
+                    embeddings=batch["embeddings"].tolist(),
+                    documents=batch["documents"],
+                    metadatas=batch["metadatas"]
+                )
+                if not lexical_path:
+                    self.lexical_index.add_many(zip(batch["ids"], batch["documents"]))
+                
+                for chunk_id, metadata in zip(batch["ids"], batch["metadatas"]):
+                    chunk_ids.setdefault(metadata["document_id"], []).append(chunk_id)
+                    if chunk_id in batch["fingerprints"]:
+                        fingerprints.setdefault(metadata["document_id"], {})[chunk_id] = batch["fingerprints"][chunk_id]
+        
+        if lexical_path:
+            shutil.copyfile(lexical_path, self.lexical_index.path)
+            self.lexical_index.load()
+        else:
+            self.lexical_index.save()
+        
+        duplicates: Dict[str, List[Tuple]] = {}
+        for chunk_id, document_id, duplicate_of, distance, *chunk in reader.duplicates():
+            # Older snapshots carry no duplicate text
+            content, chunk_metadata = chunk or (None, None)
+            duplicates.setdefault(document_id, []).append((chunk_id, duplicate_of, distance, content, chunk_metadata))
+        
+        for document in reader.documents:
+            document_id = document["document_id"]
+            self.metadata_index.add_document(
+                document_id,
+                document["metadata"] or {},
+                chunk_ids.get(document_id, []),
+                document["collection_name"] or LEGACY_COLLECTION
+            )
+            self.metadata_index.add_fingerprints(
+                document_id, fingerprints.get(document_id, {}), duplicates.get(document_id, [])
+            )
         
-        logger.info(f"Knowledge collection initialized with {self.collection.count()} documents")
+        self.graph_index.build(self.metadata_index.iter_documents())
+        self.generation += 1
+        
+        summary = {
+            "chunks": reader.manifest["chunks"],
+            "documents": len(reader.documents),
+            "shards": {shard.name: shard.end - shard.start for shard in reader.shards},
+            "duration_seconds": (datetime.now() - start_time).total_seconds()
+        }
+        logger.info(f"Imported {summary['chunks']} chunks from snapshot {path} in {summary['duration_seconds']:.1f}s")
+        return summary
     
     async def _analyze_document_relationships(self, content: str, existing_metadata: Dict) -> Dict:
         """Use LLM to analyze document relationships and hierarchy"""
@@ -122,78 +636,119 @@ Be specific and concise. Extract real concepts from the content."""
             Summary of ingestion results
         """
         start_time = datetime.now()
-        metadata = metadata or {}
         
         # Extract text from PDF
         logger.info(f"Starting PDF ingestion with relationship analysis: {file_path}")
         chunks = self._extract_pdf_chunks(file_path)
         
-        # NEW: Analyze first chunk for document-level relationships
-
-        
-        enhanced_metadata = metadata
-
-        
-        if chunks:
-
-        
-            logger.info("Analyzing document relationships...")
-
-        
-            enhanced_metadata = await self._analyze_document_relationships(
-
-        
-                chunks[0], metadata
-
-        
-            )
-
-        
-        
-
-        
         # Generate document ID based on content hash
         doc_hash = hashlib.md5(open(file_path, 'rb').read()).hexdigest()[:8]
         base_id = f"pdf_{doc_hash}"
         
-        # NEW: Analyze first chunk for document-level relationships
+        return await self._ingest_chunks(base_id, chunks, file_path, metadata or {}, start_time)
+    
+    async def ingest_text(self, text: str, metadata: Optional[Dict] = None, source: str = "text") -> Dict:
+        """
+        Ingest plain text (notes, exported tickets, benchmark corpora) like a PDF upload
+        
+        Args:
+            text: Document text
+            metadata: Additional metadata (title, knowledge_domain, etc.)
+            source: Recorded as the document's source
+            
+        Returns:
+            Summary of ingestion results
+        """
+        start_time = datetime.now()
+        base_id = f"txt_{hashlib.md5(text.encode('utf-8')).hexdigest()[:8]}"
+        return await self._ingest_chunks(base_id, self._split_into_chunks(text), source, metadata or {}, start_time)
+    
+    async def _ingest_chunks(self, base_id: str, chunks: List[str], file_path: str,
+                             metadata: Dict, start_time: datetime) -> Dict:
+        """Analyze, deduplicate, embed and register one document's chunks"""
+        # Analyze document-level relationships
         enhanced_metadata = metadata
         if chunks:
             logger.info("Analyzing document relationships...")
-            enhanced_metadata = await self._analyze_document_relationships(
-                chunks[0], metadata
-            )
+            if self.relationship_analysis == "llm":
+                enhanced_metadata = await self._analyze_document_relationships(
+                    chunks[0], metadata
+                )
+            else:
+                enhanced_metadata = self.local_extractor.extract(
+                    self._document_text(chunks), metadata
+                )
+        
+        # Document-level metadata (with precomputed relationship term sets) is
+        # registered once in the side index; chunks only carry their position
+        ingested_at = datetime.now().isoformat()
+        document_metadata = {
+            **enhanced_metadata,
+            **build_term_sets(enhanced_metadata),
+            "source": file_path,
+            "total_chunks": len(chunks),
+            "ingested_at": ingested_at
+        }
+        shard = self._shard_for_metadata(enhanced_metadata)
+        
+        # Skip empty chunks, then near-duplicates of stored chunks or of earlier chunks in this upload
+        candidates = [(f"{base_id}_chunk_{i}", i, chunk) for i, chunk in enumerate(chunks) if chunk.strip()]
+        fingerprints, duplicates = self._find_near_duplicates(
+            base_id, [(chunk_id, chunk) for chunk_id, _, chunk in candidates]
+        )
         
         # Prepare documents for ChromaDB
         documents = []
         metadatas = []
         ids = []
+        skipped = {}
         
-        for i, chunk in enumerate(chunks):
-            # Skip empty chunks
-            if not chunk.strip():
-                continue
-                
+        for chunk_id, i, chunk in candidates:
+            word_start = i * (self.chunk_size_words - self.chunk_overlap_words)
             chunk_metadata = {
-                **enhanced_metadata,  # Use enhanced metadata
-                "source": file_path,
+                "document_id": base_id,
                 "chunk_index": i,
-                "total_chunks": len(chunks),
-                "ingested_at": datetime.now().isoformat(),
+                "word_start": word_start,
+                "word_end": word_start + len(chunk.split())
             }
+            if chunk_id not in fingerprints:
+                # Kept so the chunk can replace its canonical copy if that is deleted
+                skipped[chunk_id] = (chunk, chunk_metadata)
+                continue
             
             documents.append(chunk)
             metadatas.append(chunk_metadata)
-            ids.append(f"{base_id}_chunk_{i}")
+            ids.append(chunk_id)
         
         # Add to ChromaDB
-        if documents:
-            self.collection.add(
-                documents=documents,
-                metadatas=metadatas,
-                ids=ids
+        if documents or duplicates:
+            # Re-ingesting into a different domain moves the document between shards
+            previous_shard = self.metadata_index.document_collection(base_id)
+            if previous_shard and previous_shard != shard.name:
+                self.delete_document(base_id)
+            
+            if documents:
+                shard.add(
+                    documents=documents,
+                    metadatas=metadatas,
+                    ids=ids
+                )
+                self.lexical_index.add_many(zip(ids, documents))
+                self.lexical_index.save_later(LEXICAL_SAVE_DELAY_SECONDS)
+            self.metadata_index.add_document(base_id, document_metadata, ids, shard.name)
+            self.metadata_index.add_fingerprints(
+                base_id, fingerprints,
+                [(chunk_id, canonical_id, distance, *skipped[chunk_id]) for chunk_id, canonical_id, distance in duplicates]
+            )
+            self.graph_index.add_document(base_id, document_metadata)
+            self.generation += 1
+            logger.info(
+                f"Added {len(documents)} chunks with enhanced metadata to shard {shard.name}, "
+                f"skipped {len(duplicates)} near-duplicates"
             )
-            logger.info(f"Added {len(documents)} chunks with enhanced metadata to knowledge base")
+            
+            if self.relationship_analysis == "background":
+                self._schedule_enrichment(base_id, chunks[0], metadata)
         
         # Return summary
         duration = (datetime.now() - start_time).total_seconds()
@@ -202,20 +757,238 @@ Be specific and concise. Extract real concepts from the content."""
             "file": file_path,
             "chunks_created": len(documents),
             "document_id": base_id,
+            "collection": shard.name,
+            "deduplication": {
+                "chunks_fingerprinted": len(candidates),
+                "duplicates_skipped": len(duplicates),
+                "dedup_ratio": round(len(duplicates) / len(candidates), 4) if candidates else 0.0,
+                "duplicate_of": {chunk_id: canonical_id for chunk_id, canonical_id, _ in duplicates}
+            },
             "duration_seconds": duration,
             "metadata": enhanced_metadata,
             "relationship_analysis": {
                 "document_type": enhanced_metadata.get("document_type", "unknown"),
                 "hierarchy_level": enhanced_metadata.get("hierarchy_level", 2),
                 "main_concepts": enhanced_metadata.get("main_concepts", []),
-                "project_area": enhanced_metadata.get("project_area", "general")
+                "project_area": enhanced_metadata.get("project_area", "general"),
+                "version": enhanced_metadata.get("relationship_analysis_version"),
+                "llm_enrichment": "queued" if self.relationship_analysis == "background" and chunks else None
             }
         }
     
-    def _extract_pdf_chunks(self, file_path: str, chunk_size: int = 1000) -> List[str]:
-        """Extract text from PDF and split into chunks"""
-        chunks = []
+    def _document_text(self, chunks: List[str]) -> str:
+        """Rejoin overlapping chunks into the full document text"""
+        words = chunks[0].split()
+        for chunk in chunks[1:]:
+            words.extend(chunk.split()[self.chunk_overlap_words:])
+        return " ".join(words)
+    
+    def _schedule_enrichment(self, document_id: str, content: str, upload_metadata: Dict):
+        """Run the LLM relationship analysis for a document after its upload has returned"""
+        task = asyncio.create_task(self._enrich_document(document_id, content, upload_metadata))
+        self._enrichment_tasks.add(task)
+        task.add_done_callback(self._enrichment_tasks.discard)
+    
+    async def _enrich_document(self, document_id: str, content: str, upload_metadata: Dict) -> bool:
+        """
+        Replace a document's locally extracted relationship fields with the LLM analysis
+        
+        Only the registry entry changes, so no chunk is rewritten or re-embedded.
+        
+        Returns:
+            Whether the registry entry was updated
+        """
+        analysis = await self._analyze_document_relationships(content, upload_metadata)
+        if analysis.get("relationship_analysis_version") == "fallback":
+            return False
+        
+        current = self.metadata_index.get_documents([document_id]).get(document_id)
+        if current is None:
+            return False  # Deleted while the analysis ran
+        
+        enriched = {**current, **{field: analysis[field] for field in RELATIONSHIP_FIELDS if field in analysis}}
+        if SHARD_BY_PROJECT:
+            # The shard was chosen from the local project_area; keep the registry consistent with it
+            enriched["project_area"] = current.get("project_area")
+        enriched.update(build_term_sets(enriched))
+        
+        if not self.metadata_index.update_document_metadata(document_id, enriched):
+            return False
+        self.graph_index.add_document(document_id, enriched)
+        self.generation += 1
+        logger.info(f"Enriched relationship metadata for {document_id} with LLM analysis")
+        return True
+    
+    def _find_near_duplicates(self, document_id: str,
+                              chunks: List[Tuple[str, str]]) -> Tuple[Dict[str, int], List[Tuple[str, str, int]]]:
+        """
+        Fingerprint an upload's chunks and pick out near-duplicates
+        
+        A chunk is a near-duplicate when its SimHash is within DEDUP_MAX_DISTANCE
+        bits of a stored chunk from another document or of an earlier chunk in
+        the same upload. Only chunks sharing an LSH band are compared.
         
+        Args:
+            document_id: Document being ingested (its previous chunks are not matched)
+            chunks: (chunk id, text) pairs in upload order
+            
+        Returns:
+            Fingerprints of the chunks to store, and (chunk id, canonical chunk id,
+            distance) for each chunk to skip
+        """
+        fingerprints: Dict[str, int] = {}
+        duplicates: List[Tuple[str, str, int]] = []
+        upload_bands: Dict[Tuple[int, int], List[str]] = {}
+        
+        for chunk_id, chunk in chunks:
+            fingerprint = simhash(chunk)
+            keys = band_keys(fingerprint)
+            
+            match = None
+            if DEDUP_MAX_DISTANCE >= 0:
+                candidates = self.metadata_index.near_duplicate_candidates(fingerprint, document_id)
+                candidates += [
+                    (other_id, fingerprints[other_id])
+                    for key in keys for other_id in upload_bands.get(key, [])
+                ]
+                for candidate_id, candidate_fingerprint in candidates:
+                    distance = hamming_distance(fingerprint, candidate_fingerprint)
+                    if distance <= DEDUP_MAX_DISTANCE and (match is None or distance < match[1]):
+                        match = (candidate_id, distance)
+            
+            if match:
+                duplicates.append((chunk_id, *match))
+            else:
+                fingerprints[chunk_id] = fingerprint
+                for key in keys:
+                    upload_bands.setdefault(key, []).append(chunk_id)
+        
+        return fingerprints, duplicates
+    
+    def delete_document(self, document_id: str) -> Optional[int]:
+        """
+        Remove a document and all of its chunks from the knowledge base
+        
+        Returns:
+            Number of chunks removed (0 when every chunk was a skipped
+            near-duplicate), or None if the document is not registered
+        """
+        collection_name = self.metadata_index.document_collection(document_id)
+        if collection_name is None:
+            return None
+        
+        self._promote_duplicates(document_id)
+        chunk_ids = self.metadata_index.remove_document(document_id)
+        self.graph_index.remove_document(document_id)
+        if not chunk_ids:
+            return 0
+        
+        self._get_shard(collection_name).delete(ids=chunk_ids)
+        for chunk_id in chunk_ids:
+            self.lexical_index.remove(chunk_id)
+        self.lexical_index.save_later(LEXICAL_SAVE_DELAY_SECONDS)
+        self.generation += 1
+        
+        logger.info(f"Deleted document {document_id} ({len(chunk_ids)} chunks) from knowledge base")
+        return len(chunk_ids)
+    
+    def _promote_duplicates(self, document_id: str) -> int:
+        """
+        Store one skipped near-duplicate of each of a document's chunks in its
+        own document's shard before the document is removed, so the text stays
+        searchable; the chunk's other duplicates then refer to the promoted one
+        
+        Returns:
+            Number of chunks promoted
+        """
+        dependents = self.metadata_index.dependent_duplicates(document_id)
+        for canonical_id, duplicates in dependents.items():
+            chunk_id, owner_id, _, content, chunk_metadata = duplicates[0]
+            fingerprint = simhash(content)
+            
+            self._get_shard(self.metadata_index.document_collection(owner_id)).add(
+                documents=[content],
+                metadatas=[chunk_metadata],
+                ids=[chunk_id]
+            )
+            self.lexical_index.add_many([(chunk_id, content)])
+            self.metadata_index.promote_duplicate(
+                chunk_id, fingerprint,
+                [(other_id, hamming_distance(fingerprint, simhash(other_content)))
+                 for other_id, _, _, other_content, _ in duplicates[1:]]
+            )
+        
+        if dependents:
+            logger.info(f"Promoted {len(dependents)} near-duplicates of {document_id} to stored chunks")
+        return len(dependents)
+    
+    def get_stats(self) -> Dict:
+        """Knowledge base size and search cache metrics"""
+        shard_counts = {name: shard.count() for name, shard in self.shards.items()}
+        return {
+            "documents": self.metadata_index.document_count(),
+            "chunks": sum(shard_counts.values()),
+            "vector_backend": self.vector_backend,
+            "shards": shard_counts,
+            "index_parameters": {name: index_parameters(shard.metadata) for name, shard in self.shards.items()},
+            "duplicates_skipped": self.metadata_index.duplicate_count(),
+            "graph": self.graph_index.stats(),
+            "generation": self.generation,
+            "pending_enrichments": len(self._enrichment_tasks),
+            "search_cache": self.search_cache.stats()
+        }
+    
+    def related_documents(self, document_id: str, n_results: int = 5) -> List[Dict]:
+        """
+        Documents linked to a document through shared concepts, keywords,
+        feature areas or project area
+        
+        Returns:
+            Related documents best first, with the attributes they share
+        """
+        related = self.graph_index.related_documents(document_id, n_results)
+        documents = self.metadata_index.get_documents([other_id for other_id, _ in related])
+        attributes = {key for key, _ in self.graph_index.neighbors(node_key(DOCUMENT, document_id))}
+        
+        return [
+            {
+                "document_id": other_id,
+                "score": round(score, 4),
+                "title": documents.get(other_id, {}).get("title"),
+                "document_type": documents.get(other_id, {}).get("document_type"),
+                "shared": sorted(
+                    attributes & {key for key, _ in self.graph_index.neighbors(node_key(DOCUMENT, other_id))}
+                )
+            }
+            for other_id, score in related
+        ]
+    
+    def vector_recall_report(self, k: int = 10, sample_size: int = 100) -> List[Dict]:
+        """
+        Recall of each quantized shard against exact float search
+        
+        Only shards that keep float vectors for re-scoring can be measured
+        here; scripts/quantize_knowledge.py measures the others against the
+        Chroma vectors they were copied from. Empty for Chroma shards.
+        """
+        return [
+            shard.recall_report(k=k, sample_size=sample_size)
+            for shard in self.shards.values()
+            if isinstance(shard, QuantizedVectorIndex) and shard.rescore and shard.count()
+        ]
+    
+    @staticmethod
+    def _expand_metadata(metadata: Optional[Dict]) -> Dict:
+        """Restore list-valued relationship fields flattened into legacy chunk metadata"""
+        expanded = dict(metadata or {})
+        for field in LIST_METADATA_FIELDS:
+            value = expanded.get(field)
+            if isinstance(value, str):
+                expanded[field] = [item for item in value.split(TERM_SET_SEPARATOR) if item]
+        return expanded
+    
+    def _extract_pdf_chunks(self, file_path: str) -> List[str]:
+        """Extract text from PDF and split into chunks"""
         try:
             with open(file_path, 'rb') as file:
                 pdf_reader = PyPDF2.PdfReader(file)
@@ -227,98 +1000,436 @@ Be specific and concise. Extract real concepts from the content."""
                     text = page.extract_text()
                     full_text += text + "\n"
                 
-                # Split into chunks with overlap
-                words = full_text.split()
-                chunk_overlap = 200  # words
-                
-                for i in range(0, len(words), chunk_size - chunk_overlap):
-                    chunk = ' '.join(words[i:i + chunk_size])
-                    chunks.append(chunk)
-                
         except Exception as e:
             logger.error(f"Error extracting PDF text: {e}")
             raise
         
-        return chunks
+        return self._split_into_chunks(full_text)
+    
+    def _split_into_chunks(self, text: str) -> List[str]:
+        """Split text into windows of chunk_size_words words with overlap"""
+        words = text.split()
+        step = self.chunk_size_words - self.chunk_overlap_words
+        return [' '.join(words[i:i + self.chunk_size_words]) for i in range(0, len(words), step)]
     
     async def search_with_context(self, query: str, project_filter: str = None, 
-                                hierarchy_preference: int = None, n_results: int = 5) -> List[Dict]:
+                                hierarchy_preference: int = None, n_results: int = 5,
+                                mode: Optional[str] = None,
+                                filters: Optional[SearchFilters] = None,
+                                expand_query: Optional[bool] = None,
+                                search_ef: Optional[int] = None) -> List[Dict]:
         """Context-aware search using relationship metadata"""
+        results, _ = await self.search_with_timings(
+            query,
+            project_filter=project_filter,
+            hierarchy_preference=hierarchy_preference,
+            n_results=n_results,
+            mode=mode,
+            filters=filters,
+            expand_query=expand_query,
+            search_ef=search_ef
+        )
+        return results
+    
+    async def search_with_timings(self, query: str, project_filter: str = None,
+                                  hierarchy_preference: int = None, n_results: int = 5,
+                                  mode: Optional[str] = None,
+                                  filters: Optional[SearchFilters] = None,
+                                  expand_query: Optional[bool] = None,
+                                  search_ef: Optional[int] = None) -> Tuple[List[Dict], Dict]:
+        """
+        Context-aware search that also reports a per-query latency breakdown
+        
+        Args:
+            query: Search query
+            project_filter: Restrict to a project_area
+            hierarchy_preference: Only include hierarchy levels up to this value
+            n_results: Number of results to return
+            mode: "vector", "lexical" or "hybrid" (defaults to KNOWLEDGE_SEARCH_MODE)
+            filters: Facet filters resolved through the metadata side index
+            expand_query: Boost documents linked in the knowledge graph to the
+                          concepts the query names and add their neighboring
+                          concepts to the lexical query (defaults to
+                          KNOWLEDGE_GRAPH_QUERY_EXPANSION)
+            search_ef: Minimum HNSW beam width for this query; values above the
+                       shard's configured search ef trade latency for recall
+            
+        Returns:
+            Tuple of (ranked results, timings in milliseconds)
+        """
+        results, timings = await self._search_batch(
+            [query], project_filter, hierarchy_preference, n_results, mode, filters, expand_query, search_ef
+        )
+        return results[0], timings
+    
+    async def search_many(self, queries: List[str], project_filter: str = None,
+                          hierarchy_preference: int = None, n_results: int = 5,
+                          mode: Optional[str] = None,
+                          filters: Optional[SearchFilters] = None,
+                          expand_query: Optional[bool] = None,
+                          search_ef: Optional[int] = None) -> List[List[Dict]]:
+        """
+        Search several queries at once with shared filters
+        
+        All uncached queries are embedded in one batch and sent to Chroma as a
+        single multi-query call, so bulk triage and batch classification pay
+        for embedding and index traversal once.
         
-        # Build filter criteria
-        where_clause = {}
-        if project_filter:
-            where_clause["project_area"] = project_filter
-        if hierarchy_preference:
-            where_clause["hierarchy_level"] = {"$lte": hierarchy_preference}
-        
-        results = self.collection.query(
-            query_texts=[query],
-            n_results=n_results * 2,  # Get more, then filter
-            where=where_clause if where_clause else None
+        Returns:
+            Reranked results per query, in the same order as queries
+        """
+        results, _ = await self._search_batch(
+            queries, project_filter, hierarchy_preference, n_results, mode, filters, expand_query, search_ef
         )
+        return results
+    
+    async def _search_batch(self, queries: List[str], project_filter: Optional[str],
+                            hierarchy_preference: Optional[int], n_results: int,
+                            mode: Optional[str],
+                            filters: Optional[SearchFilters],
+                            expand_query: Optional[bool] = None,
+                            search_ef: Optional[int] = None) -> Tuple[List[List[Dict]], Dict]:
+        """Serve queries from the cache where possible and run the rest as one batch"""
+        search_mode = SearchMode(mode) if mode else DEFAULT_SEARCH_MODE
+        expand_query = GRAPH_QUERY_EXPANSION if expand_query is None else expand_query
+        if filters is not None and filters.is_empty():
+            filters = None
+        
+        search_start = time.perf_counter()
+        # Read the generation before searching so a concurrent ingest leaves new entries stale
+        generation = self.generation
+        
+        results: List[Optional[List[Dict]]] = [None] * len(queries)
+        pending: Dict[Tuple, List[int]] = {}  # cache key -> positions waiting on it
+        for position, query in enumerate(queries):
+            cache_key = (
+                normalize_query(query), project_filter, hierarchy_preference,
+                n_results, search_mode.value, filters, expand_query, search_ef
+            )
+            if cache_key in pending:
+                pending[cache_key].append(position)
+                continue
+            
+            cached = self.search_cache.get(cache_key, generation)
+            if cached is not None:
+                results[position] = cached
+            else:
+                pending[cache_key] = [position]
+        
+        timings = {"mode": search_mode.value}
+        if pending:
+            batch_queries = [queries[positions[0]] for positions in pending.values()]
+            batch_results = await self._execute_search(
+                batch_queries, search_mode, project_filter, hierarchy_preference,
+                n_results, filters, timings, expand_query, search_ef
+            )
+            for (cache_key, positions), query_results in zip(pending.items(), batch_results):
+                self.search_cache.put(cache_key, generation, query_results)
+                for position in positions:
+                    results[position] = query_results if position == positions[0] else copy.deepcopy(query_results)
+        
+        timings["cache_hits"] = len(queries) - sum(len(positions) for positions in pending.values())
+        timings["cache_misses"] = len(queries) - timings["cache_hits"]
+        timings["total_ms"] = self._elapsed_ms(search_start)
+        
+        logger.info("Knowledge search", queries=len(queries), query=queries[0][:80] if queries else "", **timings)
+        return results, timings
+    
+    async def _execute_search(self, queries: List[str], search_mode: SearchMode,
+                              project_filter: Optional[str], hierarchy_preference: Optional[int],
+                              n_results: int, filters: Optional[SearchFilters],
+                              timings: Dict, expand_query: bool = False,
+                              search_ef: Optional[int] = None) -> List[List[Dict]]:
+        """Run retrieval, fusion and reranking for a batch of queries"""
+        fetch_k = n_results * self.overfetch_factor  # Get more, then rerank
+        
+        # Project and hierarchy restrictions are document-level metadata, so they
+        # resolve through the registry together with the facet filters
+        document_filters = {"project_area": project_filter, "max_hierarchy_level": hierarchy_preference}
+        if any(document_filters.values()):
+            filters = dataclasses.replace(
+                filters or SearchFilters(),
+                **{key: value for key, value in document_filters.items() if value}
+            )
+        
+        # Resolve filters to candidate ids (and the shards holding them) before
+        # touching the ANN index
+        candidate_documents, candidate_chunks, candidate_shards = None, None, None
+        if filters:
+            candidate_documents, candidate_chunks, candidate_shards = await self._timed(
+                timings, "prefilter", asyncio.to_thread(self._resolve_filters, filters)
+            )
+            if candidate_chunks is not None and not candidate_chunks:
+                return [[] for _ in queries]
+        
+        shards = self._target_shards(project_filter, candidate_shards)
+        timings["shards"] = len(shards)
+        where_clause = self._build_where_clause(candidate_documents)
+        
+        # Graph neighborhoods only widen the lexical query; the embedded query is unchanged
+        expansions: List[Optional[GraphExpansion]] = [None] * len(queries)
+        lexical_queries = queries
+        if expand_query:
+            graph_start = time.perf_counter()
+            expansions = [self.graph_index.expand(query, GRAPH_EXPANSION_TERMS) for query in queries]
+            lexical_queries = [
+                " ".join([query, *expansion.terms]) for query, expansion in zip(queries, expansions)
+            ]
+            timings["graph_ms"] = self._elapsed_ms(graph_start)
+        
+        no_hits = [[] for _ in queries]
+        vector_hits, lexical_hits = no_hits, no_hits
+        if search_mode == SearchMode.VECTOR:
+            vector_hits = await self._timed(
+                timings, "vector", self._vector_search(queries, fetch_k, where_clause, shards, search_ef)
+            )
+        elif search_mode == SearchMode.LEXICAL:
+            lexical_hits = await self._timed(
+                timings, "lexical",
+                asyncio.to_thread(self._lexical_search, lexical_queries, fetch_k, where_clause, candidate_chunks)
+            )
+        else:
+            # Run both retrievers concurrently
+            vector_hits, lexical_hits = await asyncio.gather(
+                self._timed(timings, "vector", self._vector_search(queries, fetch_k, where_clause, shards, search_ef)),
+                self._timed(
+                    timings, "lexical",
+                    asyncio.to_thread(self._lexical_search, lexical_queries, fetch_k, where_clause, candidate_chunks)
+                )
+            )
+        
+        fusion_start = time.perf_counter()
+        self._attach_document_metadata(vector_hits + lexical_hits)
+        results = [
+            self._fuse_results(query, search_mode, query_vector_hits, query_lexical_hits, expansion)[:n_results]
+            for query, query_vector_hits, query_lexical_hits, expansion
+            in zip(queries, vector_hits, lexical_hits, expansions)
+        ]
+        timings["fusion_ms"] = self._elapsed_ms(fusion_start)
+        return results
+    
+    def _resolve_filters(self, filters: SearchFilters) -> Tuple[Optional[Set[str]], Optional[Set[str]], Optional[Set[str]]]:
+        """Candidate document ids, chunk ids and shard names for filters (all None if every document matches)"""
+        candidate_documents, candidate_chunks = self.metadata_index.resolve(filters)
+        if candidate_documents and len(candidate_documents) == self.metadata_index.document_count():
+            return None, None, None
+        candidate_shards = self.metadata_index.collections_for_documents(candidate_documents)
+        return candidate_documents, candidate_chunks, candidate_shards
+    
+    def _attach_document_metadata(self, hit_lists: List[List[Dict]]):
+        """Join retrieved chunks back to their registered document metadata"""
+        document_ids = {
+            hit["metadata"].get("document_id")
+            for hits in hit_lists for hit in hits
+        }
+        document_ids.discard(None)
+        documents = self.metadata_index.get_documents(document_ids)
+        
+        for hits in hit_lists:
+            for hit in hits:
+                document = documents.get(hit["metadata"].get("document_id"))
+                if document:
+                    hit["metadata"] = {**document, **hit["metadata"]}
+    
+    def _target_shards(self, project_filter: Optional[str] = None,
+                       candidate_shards: Optional[Set[str]] = None) -> List[chromadb.Collection]:
+        """Shards a query has to visit"""
+        if candidate_shards is not None:
+            return [self.shards[name] for name in sorted(candidate_shards) if name in self.shards]
+        
+        shards = list(self.shards.values())
+        if project_filter and SHARD_BY_PROJECT:
+            # Other projects' shards cannot match; unsplit shards still might
+            shards = [
+                shard for shard in shards
+                if (shard.metadata or {}).get("project_area") in (None, project_filter)
+            ]
+        return shards
+    
+    def _build_where_clause(self, candidate_documents: Optional[Set[str]] = None) -> Optional[Dict]:
+        """Build Chroma filter criteria (chunks only carry their document id)"""
+        if candidate_documents is None:
+            return None
+        return {"document_id": {"$in": sorted(candidate_documents)}}
+    
+    async def _timed(self, timings: Dict, name: str, awaitable):
+        """Await a retrieval step and record its latency"""
+        start = time.perf_counter()
+        result = await awaitable
+        timings[f"{name}_ms"] = self._elapsed_ms(start)
+        return result
+    
+    @staticmethod
+    def _elapsed_ms(start: float) -> float:
+        return round((time.perf_counter() - start) * 1000, 2)
+    
+    async def _vector_search(self, queries: List[str], fetch_k: int, where_clause: Optional[Dict],
+                             shards: List[chromadb.Collection],
+                             search_ef: Optional[int] = None) -> List[List[Dict]]:
+        """Embedding similarity candidates per query, best first, merged across shards"""
+        if not shards:
+            return [[] for _ in queries]
+        
+        # Embed the whole batch once and reuse it for every shard
+        query_embeddings = await asyncio.to_thread(self.embedding_function, queries)
+        per_shard = await asyncio.gather(*(
+            asyncio.to_thread(self._query_shard, shard, query_embeddings, fetch_k, where_clause, search_ef)
+            for shard in shards
+        ))
+        
+        # Distances share one embedding space, so shard results merge directly
+        return [
+            heapq.nsmallest(
+                fetch_k,
+                itertools.chain.from_iterable(shard_hits[q] for shard_hits in per_shard),
+                key=lambda hit: hit["distance"]
+            )
+            for q in range(len(queries))
+        ]
+    
+    def _query_shard(self, shard: chromadb.Collection, query_embeddings: List[List[float]],
+                     fetch_k: int, where_clause: Optional[Dict],
+                     search_ef: Optional[int] = None) -> List[List[Dict]]:
+        """Nearest neighbours of each query embedding within one shard"""
+        shard_size = shard.count()
+        if shard_size == 0:
+            return [[] for _ in query_embeddings]
+        
+        # Chroma fixes search ef per collection, but HNSW searches with a beam
+        # of max(ef, n_results): asking for search_ef neighbours and keeping the
+        # best fetch_k widens the search for this query only
+        results = shard.query(
+            query_embeddings=query_embeddings,
+            n_results=min(max(fetch_k, search_ef or 0), shard_size),
+            where=where_clause
+        )
+        
+        all_hits = []
+        for q in range(len(query_embeddings)):
+            hits = []
+            if results['documents'] and results['documents'][q]:
+                for i, doc in enumerate(results['documents'][q]):
+                    hits.append({
+                        "id": results['ids'][q][i],
+                        "content": doc,
+                        "metadata": self._expand_metadata(results['metadatas'][q][i] if results['metadatas'] else None),
+                        "distance": results['distances'][q][i] if results['distances'] else 0
+                    })
+            all_hits.append(hits[:fetch_k])
+        return all_hits
+    
+    def _lexical_search(self, queries: List[str], fetch_k: int, where_clause: Optional[Dict],
+                        candidate_chunks: Optional[Set[str]] = None) -> List[List[Dict]]:
+        """BM25 candidates per query, best first, hydrated with one call per shard"""
+        # Remaining filters are applied after scoring, so dig deeper when they are present
+        depth = fetch_k * 3 if where_clause else fetch_k
+        rankings = [
+            self.lexical_index.search(query, n_results=depth, candidate_ids=candidate_chunks)
+            for query in queries
+        ]
+        
+        wanted_ids = sorted({doc_id for ranked in rankings for doc_id, _ in ranked})
+        if not wanted_ids:
+            return [[] for _ in queries]
+        
+        # Hydrate from each shard holding a candidate
+        shard_ids: Dict[str, List[str]] = {}
+        chunk_shards = self.metadata_index.chunk_collections(wanted_ids)
+        for doc_id in wanted_ids:
+            shard_ids.setdefault(chunk_shards.get(doc_id, LEGACY_COLLECTION), []).append(doc_id)
+        
+        by_id = {}
+        for name, ids in shard_ids.items():
+            if name not in self.shards:
+                continue
+            stored = self.shards[name].get(
+                ids=ids,
+                where=where_clause,
+                include=["documents", "metadatas"]
+            )
+            for i, doc_id in enumerate(stored['ids']):
+                by_id[doc_id] = (stored['documents'][i], stored['metadatas'][i])
+        
+        all_hits = []
+        for ranked in rankings:
+            hits = []
+            for doc_id, score in ranked:
+                if doc_id in by_id:
+                    content, metadata = by_id[doc_id]
+                    hits.append({
+                        "id": doc_id,
+                        "content": content,
+                        "metadata": self._expand_metadata(metadata),
+                        "lexical_score": score
+                    })
+            all_hits.append(hits[:fetch_k])
+        return all_hits
+    
+    def _fuse_results(self, query: str, search_mode: SearchMode,
+                      vector_hits: List[Dict], lexical_hits: List[Dict],
+                      expansion: Optional[GraphExpansion] = None) -> List[Dict]:
+        """Merge retriever rankings and rerank by relationship strength and graph links"""
+        fused: Dict[str, Dict] = {}
+        
+        for rank, hit in enumerate(vector_hits, 1):
+            fused[hit["id"]] = {**hit, "vector_rank": rank}
+        
+        for rank, hit in enumerate(lexical_hits, 1):
+            entry = fused.setdefault(hit["id"], {**hit, "distance": None})
+            entry["lexical_rank"] = rank
+            entry["lexical_score"] = hit["lexical_score"]
+        
+        top_lexical = lexical_hits[0]["lexical_score"] if lexical_hits else 0
+        
+        # Score all candidates' relationship strength in one vectorized pass
+        entries = list(fused.values())
+        rel_scores = score_relationships(query, [entry["metadata"] for entry in entries])
+        
+        graph_scores = expansion.document_scores if expansion else {}
+        top_graph = max(graph_scores.values(), default=0)
         
-        # Score results by relevance + relationship strength
         scored_results = []
-        if results['documents'] and results['documents'][0]:
-            for i, doc in enumerate(results['documents'][0]):
-                metadata = results['metadatas'][0][i] if results['metadatas'] else {}
-                
-                # Calculate relationship score
-                rel_score = self._calculate_relationship_score(query, metadata)
-                
-                scored_results.append({
-                    "content": doc,
-                    "metadata": metadata,
-                    "distance": results['distances'][0][i] if results['distances'] else 0,
-                    "relationship_score": rel_score,
-                    "combined_score": (1 - results['distances'][0][i]) * rel_score,
-                    "id": results['ids'][0][i] if results['ids'] else ""
-                })
-        
-        # Sort by combined score and return top results
+        for entry, rel_score in zip(entries, rel_scores.tolist()):
+            if search_mode == SearchMode.VECTOR:
+                retrieval_score = 1 - entry["distance"]
+            elif search_mode == SearchMode.LEXICAL:
+                retrieval_score = entry["lexical_score"] / top_lexical if top_lexical else 0
+            else:
+                # Reciprocal rank fusion
+                retrieval_score = sum(
+                    1 / (RRF_K + entry[rank_key])
+                    for rank_key in ("vector_rank", "lexical_rank")
+                    if entry.get(rank_key)
+                )
+            
+            graph_score = graph_scores.get(entry["metadata"].get("document_id"), 0) / top_graph if top_graph else 0.0
+            scored_results.append({
+                "content": entry["content"],
+                "metadata": entry["metadata"],
+                "distance": entry.get("distance"),
+                "lexical_score": entry.get("lexical_score"),
+                "vector_rank": entry.get("vector_rank"),
+                "lexical_rank": entry.get("lexical_rank"),
+                "relationship_score": rel_score,
+                "graph_score": round(graph_score, 4),
+                "combined_score": retrieval_score * rel_score * (1 + GRAPH_BOOST * graph_score),
+                "id": entry["id"]
+            })
+        
+        # Sort by combined score and return best first
         scored_results.sort(key=lambda x: x['combined_score'], reverse=True)
-        return scored_results[:n_results]
+        return scored_results
     
     def _calculate_relationship_score(self, query: str, metadata: Dict) -> float:
-        """Calculate relationship relevance score"""
-        score = 1.0
-        
-        query_lower = query.lower()
-        
-        # Boost for concept matches
-        concepts = metadata.get("main_concepts", [])
-        for concept in concepts:
-            if concept.lower() in query_lower:
-                score += 0.3
-        
-        # Boost for keyword matches  
-        keywords = metadata.get("related_keywords", [])
-        for keyword in keywords:
-            if keyword.lower() in query_lower:
-                score += 0.2
-        
-        # Boost for feature area matches
-        feature_areas = metadata.get("feature_areas", [])
-        for area in feature_areas:
-            if area.lower() in query_lower:
-                score += 0.25
-                
-        # Hierarchy preference (more specific = higher score for specific queries)
-        hierarchy = metadata.get("hierarchy_level", 2)
-        if len(query.split()) > 5:  # Specific query
-            score += (4 - hierarchy) * 0.1
-        else:  # General query
-            score += (hierarchy - 1) * 0.1
-            
-        return min(score, 2.0)  # Cap at 2x
+        """Calculate relationship relevance score for a single candidate"""
+        return float(score_relationships(query, [metadata])[0])
     
-    async def search(self, query: str, n_results: int = 5) -> List[Dict]:
+    async def search(self, query: str, n_results: int = 5, mode: Optional[str] = None) -> List[Dict]:
         """
         Legacy search method - maintained for backward compatibility
         Now uses enhanced search with context
         """
-        return await self.search_with_context(query, n_results=n_results)
+        return await self.search_with_context(query, n_results=n_results, mode=mode)
 
 # Create singleton instance - but lazy initialize
 _ingester = None
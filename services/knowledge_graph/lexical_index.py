@@ -0,0 +1,214 @@
+"""
+Lexical (BM25) index for the knowledge base
+Maintained alongside the vector collection so exact-term queries
+(error codes, feature names, ticket ids) can be matched directly
+"""
+import atexit
+import json
+import math
+import os
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import structlog
+
+from .text_normalization import tokenize
+
+logger = structlog.get_logger()
+
+class BM25Index:
+    """In-process inverted index with Okapi BM25 scoring"""
+
+    def __init__(self, path: Optional[str] = None, k1: float = 1.5, b: float = 0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[str, int]] = {}  # term -> {doc_id: term frequency}
+        self.doc_terms: Dict[str, List[str]] = {}  # doc_id -> its terms, so removal only touches those postings
+        self.doc_lengths: Dict[str, int] = {}
+        self.total_length = 0
+        self._lock = threading.RLock()
+
+        # Delayed saves (save_later) batch the changes of many uploads into one write
+        self._dirty = False
+        self._save_timer: Optional[threading.Timer] = None
+
+        if path and os.path.exists(path):
+            self.load()
+        if path:
+            atexit.register(self.flush)
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self.doc_lengths
+
+    def add(self, doc_id: str, text: str):
+        """Index a document, replacing any previous version with the same id"""
+        terms = Counter(tokenize(text))
+
+        with self._lock:
+            if doc_id in self.doc_lengths:
+                self._remove_unlocked(doc_id)
+
+            for term, frequency in terms.items():
+                self.postings.setdefault(term, {})[doc_id] = frequency
+            self.doc_terms[doc_id] = list(terms)
+
+            length = sum(terms.values())
+            self.doc_lengths[doc_id] = length
+            self.total_length += length
+
+    def add_many(self, documents: Iterable[Tuple[str, str]]):
+        """Index (doc_id, text) pairs"""
+        for doc_id, text in documents:
+            self.add(doc_id, text)
+
+    def remove(self, doc_id: str) -> bool:
+        """Remove a document from the index"""
+        with self._lock:
+            if doc_id not in self.doc_lengths:
+                return False
+            self._remove_unlocked(doc_id)
+            return True
+
+    def clear(self):
+        """Remove every document"""
+        with self._lock:
+            self.postings = {}
+            self.doc_terms = {}
+            self.doc_lengths = {}
+            self.total_length = 0
+
+    def _remove_unlocked(self, doc_id: str):
+        for term in self.doc_terms.pop(doc_id):
+            postings = self.postings[term]
+            del postings[doc_id]
+            if not postings:
+                del self.postings[term]
+
+        self.total_length -= self.doc_lengths.pop(doc_id)
+
+    def search(self, query: str, n_results: int = 10,
+               candidate_ids: Optional[Set[str]] = None) -> List[Tuple[str, float]]:
+        """
+        Score documents against the query with BM25
+
+        Args:
+            query: Free-text query
+            n_results: Maximum number of (doc_id, score) pairs to return
+            candidate_ids: Optional set restricting which documents may match
+
+        Returns:
+            (doc_id, score) pairs, best first
+        """
+        query_terms = set(tokenize(query))
+
+        with self._lock:
+            doc_count = len(self.doc_lengths)
+            if not doc_count or not query_terms:
+                return []
+
+            avg_length = self.total_length / doc_count
+            scores: Dict[str, float] = {}
+
+            for term in query_terms:
+                postings = self.postings.get(term)
+                if not postings:
+                    continue
+
+                idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, frequency in postings.items():
+                    if candidate_ids is not None and doc_id not in candidate_ids:
+                        continue
+
+                    length_norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / avg_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + length_norm)
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return ranked[:n_results]
+
+    def idf(self, term: str) -> float:
+        """BM25 inverse document frequency of a token across indexed chunks"""
+        with self._lock:
+            doc_count = len(self.doc_lengths)
+            matches = len(self.postings.get(term, ()))
+        return math.log(1 + (doc_count - matches + 0.5) / (matches + 0.5))
+
+    def save(self):
+        """Persist the index next to the vector store"""
+        if not self.path:
+            return
+
+        with self._lock:
+            self._dirty = False
+            data = {
+                "k1": self.k1,
+                "b": self.b,
+                "postings": self.postings,
+                "doc_lengths": self.doc_lengths
+            }
+
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+
+    def save_later(self, delay: float):
+        """
+        Save on a background thread after delay seconds; changes made in the
+        meantime go into the same save
+        """
+        if not self.path:
+            return
+
+        with self._lock:
+            self._dirty = True
+            if self._save_timer is None:
+                self._save_timer = threading.Timer(delay, self._save_pending)
+                self._save_timer.daemon = True
+                self._save_timer.start()
+
+    def flush(self):
+        """Save now if a delayed save is pending"""
+        with self._lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+                self._save_timer = None
+            if self._dirty:
+                self.save()
+
+    def _save_pending(self):
+        with self._lock:
+            self._save_timer = None
+            if not self._dirty:
+                return
+        try:
+            self.save()
+        except OSError as e:
+            logger.warning(f"Could not save lexical index: {e}")
+
+    def load(self):
+        """Load a previously saved index"""
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not load lexical index, starting empty: {e}")
+            return
+
+        with self._lock:
+            self.k1 = data.get("k1", self.k1)
+            self.b = data.get("b", self.b)
+            self.postings = data.get("postings", {})
+            self.doc_lengths = data.get("doc_lengths", {})
+            self.total_length = sum(self.doc_lengths.values())
+
+            # Not saved; rebuilt from the postings
+            self.doc_terms = {doc_id: [] for doc_id in self.doc_lengths}
+            for term, postings in self.postings.items():
+                for doc_id in postings:
+                    self.doc_terms.setdefault(doc_id, []).append(term)
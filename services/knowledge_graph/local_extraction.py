@@ -0,0 +1,247 @@
+"""
+Local relationship extraction for uploaded documents
+Fills the same relationship metadata fields as the LLM analysis, but from the
+whole document in milliseconds: RAKE-style keyphrases weighted by corpus IDF,
+the knowledge hierarchy's document type rules and feature-area dictionaries
+"""
+import math
+import re
+from collections import Counter
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from services.knowledge.simple_hierarchy import DocumentType, SimpleKnowledgeHierarchy
+
+from .text_normalization import STOPWORDS, TOKEN_PATTERN
+
+LOCAL_ANALYSIS_VERSION = "local-1.0"
+
+# Words that break keyphrase candidates in addition to the retrieval stopwords
+PHRASE_STOPWORDS = STOPWORDS | frozenset({
+    "about", "after", "all", "also", "any", "because", "been", "before", "being",
+    "between", "both", "can", "cannot", "could", "did", "do", "does", "done", "each", "how",
+    "just", "may", "might", "more", "most", "must", "new", "no", "not", "now",
+    "only", "other", "our", "out", "over", "same", "should", "so", "some", "such",
+    "than", "them", "they", "those", "through", "up", "us", "use", "used", "very",
+    "we", "what", "when", "where", "which", "while", "who", "why", "would", "you",
+    "your"
+})
+
+# Phrase boundaries: sentence punctuation, brackets and line breaks
+_PHRASE_DELIMITERS = re.compile(r"[.!?,;:()\[\]{}\"\n\r\t]+")
+
+MAX_PHRASE_WORDS = 3
+MAX_FEATURE_AREAS = 4
+FEATURE_AREA_MIN_SHARE = 0.25  # Of the most mentioned area's hits
+
+# Feature area -> indicative terms (single tokens, as produced by tokenize)
+FEATURE_AREA_TERMS = {
+    "authentication": {"auth", "authentication", "login", "logout", "password", "oauth", "sso", "2fa", "mfa", "session", "signin", "signup"},
+    "ui": {"ui", "ux", "button", "screen", "layout", "modal", "dashboard", "design", "interface", "page", "frontend"},
+    "api": {"api", "endpoint", "endpoints", "rest", "graphql", "request", "response", "webhook", "sdk", "http"},
+    "performance": {"performance", "latency", "slow", "throughput", "timeout", "cache", "caching", "memory", "load", "scalability"},
+    "database": {"database", "db", "sql", "postgres", "query", "schema", "migration", "index", "table"},
+    "mobile": {"mobile", "ios", "android", "app", "tablet", "device", "push"},
+    "search": {"search", "ranking", "filter", "filters", "retrieval", "indexing"},
+    "notifications": {"notification", "notifications", "email", "alert", "alerts", "sms"},
+    "payments": {"payment", "payments", "billing", "invoice", "checkout", "subscription", "pricing"},
+    "security": {"security", "vulnerability", "encryption", "permission", "permissions", "privacy", "compliance"},
+    "integrations": {"integration", "integrations", "github", "slack", "jira", "sync", "import", "export"},
+    "analytics": {"analytics", "metrics", "tracking", "report", "reporting", "kpi", "funnel"},
+    "onboarding": {"onboarding", "signup", "tutorial", "activation", "welcome"}
+}
+
+STAKEHOLDER_TERMS = {
+    "developers": {"developer", "developers", "engineer", "engineers", "engineering", "code", "implementation"},
+    "users": {"user", "users", "customer", "customers", "persona", "personas"},
+    "product": {"product", "roadmap", "pm", "prioritization", "stakeholder", "stakeholders"},
+    "design": {"design", "designer", "designers", "ux", "wireframe", "mockup", "prototype"},
+    "qa": {"qa", "test", "testing", "tests", "regression", "quality"}
+}
+
+URGENCY_TERMS = {
+    "urgent": {"urgent", "asap", "immediately", "emergency"},
+    "critical": {"critical", "blocker", "blocking", "outage", "p0", "sev1"},
+    "nice-to-have": {"nice-to-have", "eventually", "someday", "backlog", "optional"}
+}
+
+# Document types the LLM prompt knows that the hierarchy's rules do not
+_EXTRA_TYPE_TERMS = (
+    ("retrospective", {"retrospective", "retro", "went well", "lessons learned"}),
+    ("requirements", {"requirements", "requirement", "acceptance criteria", "must support", "prd"}),
+    ("process", {"process", "workflow", "methodology", "framework", "best practice", "guideline"})
+)
+
+# Hierarchy level signals: 1 = general practice ... 4 = implementation detail
+_GENERAL_TERMS = {"methodology", "framework", "principles", "principle", "best", "practices", "strategy", "frameworks"}
+_IMPLEMENTATION_TERMS = {"function", "class", "endpoint", "stack", "traceback", "exception", "config", "deploy", "sql", "json", "code"}
+_CONTEXT_TERMS = {"company", "business", "market", "customers", "revenue", "goals", "okr", "okrs", "quarter", "team"}
+
+_hierarchy = SimpleKnowledgeHierarchy()
+
+def _words(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+def candidate_phrases(text: str) -> List[Tuple[str, ...]]:
+    """RAKE candidates: runs of content words split at stopwords and punctuation"""
+    phrases = []
+    for fragment in _PHRASE_DELIMITERS.split(text.lower()):
+        current: List[str] = []
+        for word in TOKEN_PATTERN.findall(fragment):
+            if word in PHRASE_STOPWORDS or len(word) < 3 or word.isdigit():
+                if current:
+                    phrases.append(tuple(current))
+                current = []
+            else:
+                current.append(word)
+                if len(current) == MAX_PHRASE_WORDS:
+                    phrases.append(tuple(current))
+                    current = []
+        if current:
+            phrases.append(tuple(current))
+    return phrases
+
+def _term_hits(counts: Counter, dictionary: Dict[str, set], text_lower: str = "") -> Dict[str, int]:
+    """Occurrences of each dictionary entry's terms (multi-word terms matched in the raw text)"""
+    hits = {}
+    for label, terms in dictionary.items():
+        total = 0
+        for term in terms:
+            total += text_lower.count(term) if " " in term else counts.get(term, 0)
+        if total:
+            hits[label] = total
+    return hits
+
+class LocalRelationshipExtractor:
+    """Keyphrase, document type and feature-area extraction without an LLM call"""
+
+    def __init__(self, idf: Optional[Callable[[str], float]] = None,
+                 max_concepts: int = 5, max_keywords: int = 10):
+        """
+        Args:
+            idf: Inverse document frequency of a token across the knowledge base;
+                 without it every word is weighted equally
+            max_concepts: main_concepts to keep
+            max_keywords: related_keywords to keep
+        """
+        self.idf = idf or (lambda term: 1.0)
+        self.max_concepts = max_concepts
+        self.max_keywords = max_keywords
+
+    def keyphrases(self, text: str) -> List[Tuple[str, float]]:
+        """(phrase, score) ranked best first: RAKE degree/frequency scores weighted by IDF"""
+        phrases = candidate_phrases(text)
+        if not phrases:
+            return []
+
+        frequency: Counter = Counter()
+        degree: Counter = Counter()
+        for phrase in phrases:
+            for word in phrase:
+                frequency[word] += 1
+                degree[word] += len(phrase)
+
+        word_scores = {
+            word: degree[word] / frequency[word] * self.idf(word)
+            for word in frequency
+        }
+        phrase_counts = Counter(phrases)
+        scored = {
+            " ".join(phrase): sum(word_scores[word] for word in phrase) * math.log1p(count)
+            for phrase, count in phrase_counts.items()
+        }
+        return sorted(scored.items(), key=lambda item: (-item[1], item[0]))
+
+    def keywords(self, counts: Counter) -> List[Tuple[str, float]]:
+        """(token, tf-idf) for content words, best first"""
+        scored = {
+            term: (1 + math.log(count)) * self.idf(term)
+            for term, count in counts.items()
+            if term not in PHRASE_STOPWORDS and len(term) > 3 and not term.isdigit()
+        }
+        return sorted(scored.items(), key=lambda item: (-item[1], item[0]))
+
+    def document_type(self, text: str, title: str = "") -> str:
+        doc_type = _hierarchy.classify_document(text, title)
+        if doc_type != DocumentType.UNKNOWN:
+            return doc_type.value
+
+        text_lower = f"{title}\n{text}".lower()
+        for name, terms in _EXTRA_TYPE_TERMS:
+            if any(term in text_lower for term in terms):
+                return name
+        return DocumentType.UNKNOWN.value
+
+    @staticmethod
+    def hierarchy_level(counts: Counter, document_type: str, feature_areas: Iterable[str]) -> int:
+        general = sum(counts.get(term, 0) for term in _GENERAL_TERMS)
+        implementation = sum(counts.get(term, 0) for term in _IMPLEMENTATION_TERMS)
+        context = sum(counts.get(term, 0) for term in _CONTEXT_TERMS)
+
+        if implementation > max(general, context) and implementation >= 3:
+            return 4
+        if document_type in ("bug_report", "user_story", "architecture") or feature_areas:
+            return 3
+        if general > context:
+            return 1
+        return 2
+
+    @staticmethod
+    def complexity_level(word_count: int, distinct_terms: int, feature_area_count: int) -> str:
+        if word_count > 5000 or feature_area_count >= 4 or distinct_terms > 1500:
+            return "high"
+        if word_count > 1000 or feature_area_count >= 2 or distinct_terms > 400:
+            return "medium"
+        return "low"
+
+    def extract(self, text: str, existing_metadata: Optional[Dict] = None) -> Dict:
+        """
+        Relationship metadata for a whole document
+
+        Args:
+            text: Full document text
+            existing_metadata: Upload metadata (title, knowledge_domain, ...);
+                               an explicit project_area is kept
+
+        Returns:
+            existing_metadata merged with the same relationship fields the LLM
+            analysis produces
+        """
+        existing_metadata = existing_metadata or {}
+        words = _words(text)
+        counts = Counter(words)
+        text_lower = text.lower()
+
+        concepts = [phrase for phrase, _ in self.keyphrases(text) if " " in phrase][:self.max_concepts]
+        concept_words = {word for phrase in concepts for word in phrase.split()}
+        keywords = [
+            term for term, _ in self.keywords(counts) if term not in concept_words
+        ][:self.max_keywords]
+
+        area_hits = _term_hits(counts, FEATURE_AREA_TERMS)
+        # Passing references (single mentions, or far fewer than the dominant
+        # area's) do not tag the document
+        ranked_areas = sorted(area_hits.items(), key=lambda item: (-item[1], item[0]))
+        top_hits = ranked_areas[0][1] if ranked_areas else 0
+        feature_areas = [
+            area for area, hits in ranked_areas[:MAX_FEATURE_AREAS]
+            if hits >= max(2, top_hits * FEATURE_AREA_MIN_SHARE)
+        ]
+        document_type = self.document_type(text, existing_metadata.get("title", ""))
+        stakeholders = sorted(_term_hits(counts, STAKEHOLDER_TERMS))
+        urgency = sorted(_term_hits(counts, URGENCY_TERMS, text_lower))
+
+        return {
+            **existing_metadata,
+            "main_concepts": concepts,
+            "document_type": document_type,
+            "project_area": existing_metadata.get("project_area") or (feature_areas[0] if feature_areas else "general"),
+            "hierarchy_level": self.hierarchy_level(counts, document_type, feature_areas),
+            "related_keywords": keywords,
+            "stakeholder_types": stakeholders,
+            "complexity_level": self.complexity_level(len(words), len(counts), len(feature_areas)),
+            "urgency_indicators": urgency,
+            "feature_areas": feature_areas,
+            "relationship_analysis_version": LOCAL_ANALYSIS_VERSION,
+            "analysis_timestamp": datetime.now().isoformat()
+        }
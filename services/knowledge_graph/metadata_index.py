@@ -0,0 +1,569 @@
+"""
+Metadata side index for the knowledge base
+Local SQLite index of document/chunk metadata that resolves facet filters
+(including list-valued fields Chroma cannot filter on) to candidate ids
+before the vector query runs
+"""
+import copy
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from .dedup import band_keys, to_signed, to_unsigned
+from .sharding import LEGACY_COLLECTION
+from .text_normalization import normalize_phrase
+
+# Stay under SQLite's bound-parameter limit when looking up id lists
+_LOOKUP_BATCH_SIZE = 500
+
+@dataclass(frozen=True)
+class SearchFilters:
+    """Facet filters resolved through the side index"""
+    knowledge_domain: Optional[str] = None
+    document_type: Optional[str] = None
+    concept: Optional[str] = None
+    feature_area: Optional[str] = None
+    ingested_after: Optional[str] = None   # ISO-8601, inclusive
+    ingested_before: Optional[str] = None  # ISO-8601, inclusive
+    project_area: Optional[str] = None
+    max_hierarchy_level: Optional[int] = None
+
+    def is_empty(self) -> bool:
+        return not any(value for value in self.__dict__.values())
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    document_id TEXT PRIMARY KEY,
+    knowledge_domain TEXT,
+    document_type TEXT,
+    project_area TEXT,
+    hierarchy_level INTEGER,
+    ingested_at TEXT,
+    collection_name TEXT,
+    metadata TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_documents_domain ON documents(knowledge_domain);
+CREATE INDEX IF NOT EXISTS idx_documents_type ON documents(document_type);
+CREATE INDEX IF NOT EXISTS idx_documents_project ON documents(project_area);
+CREATE INDEX IF NOT EXISTS idx_documents_ingested_at ON documents(ingested_at);
+
+CREATE TABLE IF NOT EXISTS chunks (
+    chunk_id TEXT PRIMARY KEY,
+    document_id TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_chunks_document ON chunks(document_id);
+
+CREATE TABLE IF NOT EXISTS document_concepts (
+    concept TEXT NOT NULL,
+    document_id TEXT NOT NULL,
+    PRIMARY KEY (concept, document_id)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS document_feature_areas (
+    feature_area TEXT NOT NULL,
+    document_id TEXT NOT NULL,
+    PRIMARY KEY (feature_area, document_id)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS chunk_fingerprints (
+    chunk_id TEXT PRIMARY KEY,
+    document_id TEXT NOT NULL,
+    fingerprint INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_fingerprints_document ON chunk_fingerprints(document_id);
+
+CREATE TABLE IF NOT EXISTS fingerprint_bands (
+    band INTEGER NOT NULL,
+    band_value INTEGER NOT NULL,
+    chunk_id TEXT NOT NULL,
+    document_id TEXT NOT NULL,
+    PRIMARY KEY (band, band_value, chunk_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_fingerprint_bands_document ON fingerprint_bands(document_id);
+
+CREATE TABLE IF NOT EXISTS duplicate_chunks (
+    chunk_id TEXT PRIMARY KEY,
+    document_id TEXT NOT NULL,
+    duplicate_of TEXT NOT NULL,
+    distance INTEGER NOT NULL,
+    content TEXT,
+    chunk_metadata TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_duplicate_chunks_document ON duplicate_chunks(document_id);
+CREATE INDEX IF NOT EXISTS idx_duplicate_chunks_canonical ON duplicate_chunks(duplicate_of);
+"""
+
+class MetadataIndex:
+    """SQLite-backed facet index over knowledge base documents"""
+
+    def __init__(self, path: str, document_cache_size: int = 4096):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+        # Searches run in worker threads, so share one connection behind a lock
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.RLock()
+
+        # Registry lookups for search results, most recently used last
+        self._document_cache: "OrderedDict[str, Dict]" = OrderedDict()
+        self._document_cache_size = document_cache_size
+
+        with self._lock:
+            self._conn.executescript(SCHEMA)
+            self._migrate()
+            self._conn.commit()
+
+    def _migrate(self):
+        """Add columns introduced after an index file was created"""
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(documents)")}
+        if "collection_name" not in columns:
+            # Documents indexed before sharding live in the legacy collection
+            self._conn.execute("ALTER TABLE documents ADD COLUMN collection_name TEXT")
+        if "metadata" not in columns:
+            # Registry entries of older documents fall back to their chunk metadata
+            self._conn.execute("ALTER TABLE documents ADD COLUMN metadata TEXT")
+
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(duplicate_chunks)")}
+        if "content" not in columns:
+            # Duplicates skipped before their text was kept cannot replace a removed canonical chunk
+            self._conn.execute("ALTER TABLE duplicate_chunks ADD COLUMN content TEXT")
+            self._conn.execute("ALTER TABLE duplicate_chunks ADD COLUMN chunk_metadata TEXT")
+
+    def chunk_count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def document_count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def add_document(self, document_id: str, metadata: Dict, chunk_ids: Iterable[str],
+                     collection_name: str = LEGACY_COLLECTION):
+        """
+        Register a document: its metadata, facets, chunks and the shard holding them
+
+        The metadata is stored once here; chunks in the vector store only carry
+        the document id and their position.
+        """
+        concepts, feature_areas = self._facets(metadata)
+
+        with self._lock:
+            self._delete_document_unlocked(document_id)
+            self._conn.execute(
+                """INSERT INTO documents
+                   (document_id, knowledge_domain, document_type, project_area, hierarchy_level,
+                    ingested_at, collection_name, metadata)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                (
+                    document_id,
+                    metadata.get("knowledge_domain"),
+                    metadata.get("document_type"),
+                    metadata.get("project_area"),
+                    metadata.get("hierarchy_level"),
+                    metadata.get("ingested_at"),
+                    collection_name,
+                    json.dumps(metadata, default=str)
+                )
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO chunks (chunk_id, document_id) VALUES (?, ?)",
+                [(chunk_id, document_id) for chunk_id in chunk_ids]
+            )
+            self._insert_facets_unlocked(document_id, concepts, feature_areas)
+            self._conn.commit()
+
+    def remove_document(self, document_id: str) -> List[str]:
+        """Drop a document from the index, returning its chunk ids"""
+        with self._lock:
+            chunk_ids = [
+                row[0] for row in self._conn.execute(
+                    "SELECT chunk_id FROM chunks WHERE document_id = ?", (document_id,)
+                )
+            ]
+            # Duplicates of this document that were not promoted (see promote_duplicate) are lost with it
+            self._conn.execute(
+                """DELETE FROM duplicate_chunks WHERE duplicate_of IN
+                   (SELECT chunk_id FROM chunks WHERE document_id = ?)""",
+                (document_id,)
+            )
+            self._delete_document_unlocked(document_id)
+            self._conn.commit()
+        return chunk_ids
+
+    def fingerprint_count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM chunk_fingerprints").fetchone()[0]
+
+    def duplicate_count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM duplicate_chunks").fetchone()[0]
+
+    def add_fingerprints(self, document_id: str, fingerprints: Dict[str, int],
+                         duplicates: Iterable[Tuple[str, str, int, Optional[str], Optional[Dict]]] = ()):
+        """
+        Store SimHash fingerprints of a document's chunks and its skipped near-duplicates
+
+        Args:
+            document_id: Owning document
+            fingerprints: Fingerprint of each stored chunk
+            duplicates: (skipped chunk id, canonical chunk id, Hamming distance, text,
+                chunk metadata); the text lets the chunk replace its canonical copy
+                when that is removed
+        """
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO chunk_fingerprints (chunk_id, document_id, fingerprint) VALUES (?, ?, ?)",
+                [(chunk_id, document_id, to_signed(fingerprint)) for chunk_id, fingerprint in fingerprints.items()]
+            )
+            self._conn.executemany(
+                """INSERT OR REPLACE INTO fingerprint_bands (band, band_value, chunk_id, document_id)
+                   VALUES (?, ?, ?, ?)""",
+                [
+                    (band, value, chunk_id, document_id)
+                    for chunk_id, fingerprint in fingerprints.items()
+                    for band, value in band_keys(fingerprint)
+                ]
+            )
+            self._conn.executemany(
+                """INSERT OR REPLACE INTO duplicate_chunks
+                   (chunk_id, document_id, duplicate_of, distance, content, chunk_metadata)
+                   VALUES (?, ?, ?, ?, ?, ?)""",
+                [
+                    (chunk_id, document_id, duplicate_of, distance, content,
+                     json.dumps(chunk_metadata) if chunk_metadata is not None else None)
+                    for chunk_id, duplicate_of, distance, content, chunk_metadata in duplicates
+                ]
+            )
+            self._conn.commit()
+
+    def near_duplicate_candidates(self, fingerprint: int, exclude_document_id: Optional[str] = None) -> List[Tuple[str, int]]:
+        """Stored (chunk id, fingerprint) pairs sharing at least one LSH band with a fingerprint"""
+        keys = band_keys(fingerprint)
+        clause = " OR ".join("(b.band = ? AND b.band_value = ?)" for _ in keys)
+        params = [part for key in keys for part in key]
+        if exclude_document_id is not None:
+            clause = f"({clause}) AND b.document_id != ?"
+            params.append(exclude_document_id)
+
+        with self._lock:
+            rows = self._conn.execute(
+                f"""SELECT DISTINCT f.chunk_id, f.fingerprint FROM fingerprint_bands b
+                    JOIN chunk_fingerprints f ON f.chunk_id = b.chunk_id
+                    WHERE {clause}""",
+                params
+            ).fetchall()
+        return [(chunk_id, to_unsigned(value)) for chunk_id, value in rows]
+
+    def documents_missing_metadata(self) -> List[str]:
+        """Documents indexed before the registry stored document metadata"""
+        with self._lock:
+            return [
+                row[0] for row in self._conn.execute("SELECT document_id FROM documents WHERE metadata IS NULL")
+            ]
+
+    def iter_documents(self) -> Iterator[Tuple[str, Dict]]:
+        """(document id, registered metadata) of every registered document, bypassing the cache"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT document_id, metadata FROM documents WHERE metadata IS NOT NULL ORDER BY document_id"
+            ).fetchall()
+        for document_id, metadata in rows:
+            yield document_id, json.loads(metadata)
+
+    def document_collections(self) -> Dict[str, str]:
+        """Shard holding each registered document"""
+        with self._lock:
+            return {
+                document_id: collection_name or LEGACY_COLLECTION
+                for document_id, collection_name in self._conn.execute(
+                    "SELECT document_id, collection_name FROM documents"
+                )
+            }
+
+    def fingerprints(self) -> Dict[str, int]:
+        """Stored SimHash fingerprint of every chunk"""
+        with self._lock:
+            return {
+                chunk_id: to_unsigned(value)
+                for chunk_id, value in self._conn.execute("SELECT chunk_id, fingerprint FROM chunk_fingerprints")
+            }
+
+    def duplicates(self) -> List[Tuple[str, str, str, int, Optional[str], Optional[Dict]]]:
+        """(chunk id, document id, canonical chunk id, distance, text, chunk metadata) of every skipped near-duplicate"""
+        with self._lock:
+            rows = self._conn.execute(
+                """SELECT chunk_id, document_id, duplicate_of, distance, content, chunk_metadata
+                   FROM duplicate_chunks ORDER BY chunk_id"""
+            ).fetchall()
+        return [(*row[:5], json.loads(row[5]) if row[5] else None) for row in rows]
+
+    def dependent_duplicates(self, document_id: str) -> Dict[str, List[Tuple[str, str, int, str, Dict]]]:
+        """
+        Other documents' near-duplicates of a document's chunks, by canonical
+        chunk id: (chunk id, document id, distance, text, chunk metadata),
+        closest first. Duplicates stored without their text are left out.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                """SELECT d.duplicate_of, d.chunk_id, d.document_id, d.distance, d.content, d.chunk_metadata
+                   FROM duplicate_chunks d JOIN chunks c ON c.chunk_id = d.duplicate_of
+                   WHERE c.document_id = ? AND d.document_id != ? AND d.content IS NOT NULL
+                   ORDER BY d.duplicate_of, d.distance, d.chunk_id""",
+                (document_id, document_id)
+            ).fetchall()
+
+        dependents: Dict[str, List[Tuple[str, str, int, str, Dict]]] = {}
+        for duplicate_of, chunk_id, owner_id, distance, content, chunk_metadata in rows:
+            dependents.setdefault(duplicate_of, []).append(
+                (chunk_id, owner_id, distance, content, json.loads(chunk_metadata) if chunk_metadata else {})
+            )
+        return dependents
+
+    def promote_duplicate(self, chunk_id: str, fingerprint: int, repointed: Iterable[Tuple[str, int]] = ()):
+        """
+        Register a skipped near-duplicate as a stored chunk of its document, once
+        it has been added to the document's shard
+
+        Args:
+            chunk_id: Duplicate being promoted
+            fingerprint: Its SimHash fingerprint
+            repointed: (duplicate chunk id, distance) of other duplicates that now
+                refer to the promoted chunk
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT document_id FROM duplicate_chunks WHERE chunk_id = ?", (chunk_id,)
+            ).fetchone()
+            if row is None:
+                return
+            document_id = row[0]
+
+            self._conn.execute("DELETE FROM duplicate_chunks WHERE chunk_id = ?", (chunk_id,))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO chunks (chunk_id, document_id) VALUES (?, ?)", (chunk_id, document_id)
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO chunk_fingerprints (chunk_id, document_id, fingerprint) VALUES (?, ?, ?)",
+                (chunk_id, document_id, to_signed(fingerprint))
+            )
+            self._conn.executemany(
+                """INSERT OR REPLACE INTO fingerprint_bands (band, band_value, chunk_id, document_id)
+                   VALUES (?, ?, ?, ?)""",
+                [(band, value, chunk_id, document_id) for band, value in band_keys(fingerprint)]
+            )
+            self._conn.executemany(
+                "UPDATE duplicate_chunks SET duplicate_of = ?, distance = ? WHERE chunk_id = ?",
+                [(chunk_id, distance, other_id) for other_id, distance in repointed]
+            )
+            self._conn.commit()
+
+    def update_document_metadata(self, document_id: str, metadata: Dict) -> bool:
+        """
+        Replace a registered document's metadata and facets, keeping its chunks,
+        fingerprints and shard
+
+        Returns:
+            False when the document is no longer registered
+        """
+        concepts, feature_areas = self._facets(metadata)
+
+        with self._lock:
+            updated = self._conn.execute(
+                """UPDATE documents SET knowledge_domain = ?, document_type = ?, project_area = ?,
+                   hierarchy_level = ?, metadata = ? WHERE document_id = ?""",
+                (
+                    metadata.get("knowledge_domain"),
+                    metadata.get("document_type"),
+                    metadata.get("project_area"),
+                    metadata.get("hierarchy_level"),
+                    json.dumps(metadata, default=str),
+                    document_id
+                )
+            ).rowcount
+            if updated:
+                self._conn.execute("DELETE FROM document_concepts WHERE document_id = ?", (document_id,))
+                self._conn.execute("DELETE FROM document_feature_areas WHERE document_id = ?", (document_id,))
+                self._insert_facets_unlocked(document_id, concepts, feature_areas)
+            self._conn.commit()
+            self._document_cache.pop(document_id, None)
+        return bool(updated)
+
+    def set_document_metadata(self, document_id: str, metadata: Dict):
+        """Store registry metadata for an already indexed document"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE documents SET metadata = ? WHERE document_id = ?",
+                (json.dumps(metadata, default=str), document_id)
+            )
+            self._conn.commit()
+            self._document_cache.pop(document_id, None)
+
+    def get_documents(self, document_ids: Iterable[str]) -> Dict[str, Dict]:
+        """Registered metadata of documents, served from an LRU cache where possible"""
+        documents, missing = {}, []
+        with self._lock:
+            for document_id in set(document_ids):
+                if document_id in self._document_cache:
+                    self._document_cache.move_to_end(document_id)
+                    documents[document_id] = self._document_cache[document_id]
+                else:
+                    missing.append(document_id)
+
+            for batch in self._batches(missing):
+                placeholders = ", ".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT document_id, metadata FROM documents WHERE document_id IN ({placeholders})",
+                    batch
+                ).fetchall()
+                for document_id, metadata in rows:
+                    if metadata:
+                        documents[document_id] = json.loads(metadata)
+                        self._cache_document(document_id, documents[document_id])
+        # Results are handed to callers, so never share the cached objects
+        return copy.deepcopy(documents)
+
+    def _cache_document(self, document_id: str, metadata: Dict):
+        if self._document_cache_size <= 0:
+            return
+        self._document_cache[document_id] = metadata
+        self._document_cache.move_to_end(document_id)
+        while len(self._document_cache) > self._document_cache_size:
+            self._document_cache.popitem(last=False)
+
+    def document_collection(self, document_id: str) -> Optional[str]:
+        """Shard holding a document's chunks, or None if the document is unknown"""
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT COALESCE(collection_name, '{LEGACY_COLLECTION}') FROM documents WHERE document_id = ?",
+                (document_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def set_document_collection(self, document_ids: Iterable[str], collection_name: str):
+        """Record that documents now live in another shard"""
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE documents SET collection_name = ? WHERE document_id = ?",
+                [(collection_name, document_id) for document_id in document_ids]
+            )
+            self._conn.commit()
+
+    def collections_for_documents(self, document_ids: Iterable[str]) -> Set[str]:
+        """Shards holding any of the given documents"""
+        collections = set()
+        for batch in self._batches(document_ids):
+            placeholders = ", ".join("?" * len(batch))
+            with self._lock:
+                rows = self._conn.execute(
+                    f"""SELECT DISTINCT COALESCE(collection_name, '{LEGACY_COLLECTION}') FROM documents
+                        WHERE document_id IN ({placeholders})""",
+                    batch
+                ).fetchall()
+            collections.update(row[0] for row in rows)
+        return collections
+
+    def chunk_collections(self, chunk_ids: Iterable[str]) -> Dict[str, str]:
+        """Map chunk ids to the shard holding them; unindexed chunks are omitted"""
+        collections = {}
+        for batch in self._batches(chunk_ids):
+            placeholders = ", ".join("?" * len(batch))
+            with self._lock:
+                rows = self._conn.execute(
+                    f"""SELECT c.chunk_id, COALESCE(d.collection_name, '{LEGACY_COLLECTION}') FROM chunks c
+                        JOIN documents d ON d.document_id = c.document_id
+                        WHERE c.chunk_id IN ({placeholders})""",
+                    batch
+                ).fetchall()
+            collections.update(rows)
+        return collections
+
+    @staticmethod
+    def _batches(ids: Iterable[str]) -> Iterable[List[str]]:
+        ids = list(ids)
+        for start in range(0, len(ids), _LOOKUP_BATCH_SIZE):
+            yield ids[start:start + _LOOKUP_BATCH_SIZE]
+
+    @staticmethod
+    def _facets(metadata: Dict) -> Tuple[Set[str], Set[str]]:
+        """Normalized concept and feature-area facets of document metadata"""
+        concepts = {normalize_phrase(concept) for concept in metadata.get("main_concepts") or []}
+        feature_areas = {normalize_phrase(area) for area in metadata.get("feature_areas") or []}
+        concepts.discard("")
+        feature_areas.discard("")
+        return concepts, feature_areas
+
+    def _insert_facets_unlocked(self, document_id: str, concepts: Set[str], feature_areas: Set[str]):
+        self._conn.executemany(
+            "INSERT INTO document_concepts (concept, document_id) VALUES (?, ?)",
+            [(concept, document_id) for concept in concepts]
+        )
+        self._conn.executemany(
+            "INSERT INTO document_feature_areas (feature_area, document_id) VALUES (?, ?)",
+            [(area, document_id) for area in feature_areas]
+        )
+
+    def _delete_document_unlocked(self, document_id: str):
+        self._document_cache.pop(document_id, None)
+        for table in ("documents", "chunks", "document_concepts", "document_feature_areas",
+                      "chunk_fingerprints", "fingerprint_bands", "duplicate_chunks"):
+            self._conn.execute(f"DELETE FROM {table} WHERE document_id = ?", (document_id,))
+
+    def _filter_clause(self, filters: SearchFilters) -> Tuple[str, List]:
+        """WHERE clause over the documents table (aliased d) for the given filters"""
+        conditions, params = [], []
+
+        if filters.knowledge_domain:
+            conditions.append("d.knowledge_domain = ?")
+            params.append(filters.knowledge_domain)
+        if filters.document_type:
+            conditions.append("d.document_type = ?")
+            params.append(filters.document_type)
+        if filters.ingested_after:
+            conditions.append("d.ingested_at >= ?")
+            params.append(filters.ingested_after)
+        if filters.ingested_before:
+            conditions.append("d.ingested_at <= ?")
+            params.append(filters.ingested_before)
+        if filters.concept:
+            conditions.append(
+                "d.document_id IN (SELECT document_id FROM document_concepts WHERE concept = ?)"
+            )
+            params.append(normalize_phrase(filters.concept))
+        if filters.project_area:
+            conditions.append("d.project_area = ?")
+            params.append(filters.project_area)
+        if filters.max_hierarchy_level:
+            conditions.append("d.hierarchy_level <= ?")
+            params.append(filters.max_hierarchy_level)
+        if filters.feature_area:
+            conditions.append(
+                "d.document_id IN (SELECT document_id FROM document_feature_areas WHERE feature_area = ?)"
+            )
+            params.append(normalize_phrase(filters.feature_area))
+
+        return " AND ".join(conditions) or "1 = 1", params
+
+    def resolve(self, filters: SearchFilters) -> Tuple[Set[str], Set[str]]:
+        """
+        Resolve facet filters to candidates
+
+        Returns:
+            (document ids, chunk ids) of documents matching every filter
+        """
+        clause, params = self._filter_clause(filters)
+        with self._lock:
+            rows = self._conn.execute(
+                f"""SELECT c.chunk_id, c.document_id FROM chunks c
+                    JOIN documents d ON d.document_id = c.document_id
+                    WHERE {clause}""",
+                params
+            ).fetchall()
+        return {row[1] for row in rows}, {row[0] for row in rows}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
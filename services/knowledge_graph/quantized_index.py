@@ -0,0 +1,494 @@
+"""
+Quantized in-process vector index
+Alternative to Chroma for knowledge base shards: every query scans all int8
+codes in a memory-mapped file (an exhaustive scan, not an ANN graph), optionally
+re-scoring the best candidates against float32 vectors kept in a second file
+"""
+import json
+import os
+import sqlite3
+import threading
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import structlog
+
+from .where_filter import matches_where
+
+logger = structlog.get_logger()
+
+SCAN_BLOCK_ROWS = 65536  # Rows of int8 codes scored per block
+COMPACT_DEAD_FRACTION = 0.5  # Rewrite the vector files once this share of rows is deleted
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chunks (
+    row INTEGER PRIMARY KEY,
+    chunk_id TEXT NOT NULL UNIQUE,
+    document TEXT,
+    metadata TEXT
+);
+
+CREATE TABLE IF NOT EXISTS index_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+def space_distances(space: str, dots: np.ndarray, norms: np.ndarray, query_norms: np.ndarray) -> np.ndarray:
+    """Distances in a Chroma space from dot products and squared norms (rows x queries)"""
+    if space == "ip":
+        return 1.0 - dots
+    if space == "cosine":
+        return 1.0 - dots / np.maximum(np.sqrt(norms)[:, None] * np.sqrt(query_norms)[None, :], 1e-12)
+    return norms[:, None] - 2.0 * dots + query_norms[None, :]
+
+def exact_distances(space: str, vectors: np.ndarray, queries: np.ndarray) -> np.ndarray:
+    """Distances between float vectors and queries (rows x queries)"""
+    return space_distances(
+        space,
+        vectors @ queries.T,
+        np.einsum("ij,ij->i", vectors, vectors),
+        np.einsum("ij,ij->i", queries, queries)
+    )
+
+class QuantizedVectorIndex:
+    """
+    Int8 scalar-quantized vector index, searched by exhaustive scan
+
+    Vectors are stored as int8 codes with a per-vector scale and squared norm,
+    about a quarter of the float32 size. Every query scores all codes, so
+    search time grows linearly with the shard; results are approximate only
+    because of quantization. With rescore=True the float32 vectors are also
+    kept, in a rescore file read only for the top candidates: better recall,
+    but five times the storage of the codes alone. An index keeps the rescore
+    setting it was created with. Distances match Chroma's spaces ("l2" is
+    squared L2, "ip" is 1 - dot product, "cosine" is 1 - cosine similarity).
+
+    Mirrors the subset of the Chroma Collection API the ingester uses
+    (add/get/query/update/delete/count), so it can back a shard directly.
+    """
+
+    DATABASE_FILE = "chunks.sqlite3"
+
+    def __init__(self, path: str, name: str, embedding_function: Optional[Callable] = None,
+                 metadata: Optional[Dict] = None, space: str = "l2", rescore: bool = False,
+                 rescore_factor: int = 4):
+        self.path = path
+        self.name = name
+        self.embedding_function = embedding_function
+        self.rescore_factor = max(1, rescore_factor)
+        os.makedirs(path, exist_ok=True)
+
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(os.path.join(path, self.DATABASE_FILE), check_same_thread=False)
+        self._conn.executescript(SCHEMA)
+
+        stored = dict(self._conn.execute("SELECT key, value FROM index_meta").fetchall())
+        self.metadata = json.loads(stored["metadata"]) if "metadata" in stored else (metadata or {})
+        self.space = stored.get("space", space)
+        self.dimension = int(stored["dimension"]) if "dimension" in stored else None
+        self._file_generation = int(stored.get("file_generation", 0))
+        if "rescore" in stored:
+            self.rescore = stored["rescore"] == "True"
+        else:
+            # Indexes from before the setting always kept float vectors
+            self.rescore = rescore or os.path.exists(self._file("vectors"))
+        self._write_meta({"metadata": json.dumps(self.metadata), "space": self.space, "rescore": self.rescore})
+
+        self._load()
+
+    @classmethod
+    def list_indexes(cls, root: str) -> List[Tuple[str, Dict]]:
+        """(name, collection metadata) of every index stored under root"""
+        indexes = []
+        if not os.path.isdir(root):
+            return indexes
+        for name in sorted(os.listdir(root)):
+            database = os.path.join(root, name, cls.DATABASE_FILE)
+            if not os.path.exists(database):
+                continue
+            conn = sqlite3.connect(database)
+            try:
+                row = conn.execute("SELECT value FROM index_meta WHERE key = 'metadata'").fetchone()
+            except sqlite3.OperationalError:
+                row = None
+            finally:
+                conn.close()
+            indexes.append((name, json.loads(row[0]) if row else {}))
+        return indexes
+
+    # Storage
+
+    def _file(self, kind: str, generation: Optional[int] = None) -> str:
+        generation = self._file_generation if generation is None else generation
+        return os.path.join(self.path, f"{kind}.{generation}.bin")
+
+    def _write_meta(self, values: Dict[str, Any]):
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO index_meta (key, value) VALUES (?, ?)",
+            [(key, str(value)) for key, value in values.items()]
+        )
+        self._conn.commit()
+
+    def _load(self):
+        """Map the vector files and load ids and metadata into memory"""
+        rows = self._map_files()
+
+        # Rows past the end of the files belong to an add that never completed
+        self._ids: List[Optional[str]] = [None] * rows
+        self._metadatas: List[Optional[Dict]] = [None] * rows
+        self._rows: Dict[str, int] = {}
+        self._live = np.zeros(rows, dtype=bool)
+        for row, chunk_id, metadata in self._conn.execute("SELECT row, chunk_id, metadata FROM chunks"):
+            if row < rows:
+                self._ids[row] = chunk_id
+                self._metadatas[row] = json.loads(metadata) if metadata else {}
+                self._rows[chunk_id] = row
+                self._live[row] = True
+
+    def _row_bytes(self) -> Dict[str, int]:
+        """Bytes per row of each vector file"""
+        row_bytes = {"codes": self.dimension, "scales": 4, "norms": 4}
+        if self.rescore:
+            row_bytes["vectors"] = self.dimension * 4
+        return row_bytes
+
+    def _map_files(self) -> int:
+        """Memory-map the vector files, returning the number of complete rows"""
+        rows = 0
+        if self.dimension and os.path.exists(self._file("codes")):
+            # An interrupted add can leave the files at different lengths
+            rows = min(
+                os.path.getsize(self._file(kind)) // size if os.path.exists(self._file(kind)) else 0
+                for kind, size in self._row_bytes().items()
+            )
+
+        if rows:
+            self._codes = np.memmap(self._file("codes"), dtype=np.int8, mode="r", shape=(rows, self.dimension))
+            if self.rescore:
+                self._vectors = np.memmap(
+                    self._file("vectors"), dtype=np.float32, mode="r", shape=(rows, self.dimension)
+                )
+            self._scales = np.fromfile(self._file("scales"), dtype=np.float32, count=rows)
+            self._norms = np.fromfile(self._file("norms"), dtype=np.float32, count=rows)
+        else:
+            dimension = self.dimension or 0
+            self._codes = np.zeros((0, dimension), dtype=np.int8)
+            if self.rescore:
+                self._vectors = np.zeros((0, dimension), dtype=np.float32)
+            self._scales = np.zeros(0, dtype=np.float32)
+            self._norms = np.zeros(0, dtype=np.float32)
+        return rows
+
+    @staticmethod
+    def _quantize(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Symmetric per-vector int8 quantization"""
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+        return codes, scales.astype(np.float32)
+
+    # Collection API
+
+    def count(self) -> int:
+        return len(self._rows)
+
+    def add(self, ids: Sequence[str], documents: Optional[Sequence[str]] = None,
+            metadatas: Optional[Sequence[Dict]] = None, embeddings: Optional[Sequence[Sequence[float]]] = None):
+        """Append chunks; ids that already exist are ignored, as in Chroma"""
+        with self._lock:
+            positions = [i for i, chunk_id in enumerate(ids) if chunk_id not in self._rows]
+            if len(positions) < len(ids):
+                logger.warning(f"Ignoring {len(ids) - len(positions)} existing ids in {self.name}")
+            if not positions:
+                return
+
+            new_documents = [documents[i] for i in positions] if documents is not None else [None] * len(positions)
+            if embeddings is None:
+                embeddings = self.embedding_function(new_documents)
+                vectors = np.asarray(embeddings, dtype=np.float32)
+            else:
+                vectors = np.asarray([embeddings[i] for i in positions], dtype=np.float32)
+
+            if self.dimension is None:
+                self.dimension = vectors.shape[1]
+                self._write_meta({"dimension": self.dimension})
+            if vectors.shape[1] != self.dimension:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match index dimension {self.dimension}")
+
+            codes, scales = self._quantize(vectors)
+            norms = np.einsum("ij,ij->i", vectors, vectors).astype(np.float32)
+
+            # Rows are file offsets; drop any partial rows from an interrupted add first
+            first_row = len(self._ids)
+            row_bytes = self._row_bytes()
+            files = {"codes": codes, "vectors": vectors, "scales": scales, "norms": norms}
+            for kind in row_bytes:
+                values = files[kind]
+                with open(self._file(kind), "ab") as f:
+                    f.truncate(first_row * row_bytes[kind])
+                    f.write(np.ascontiguousarray(values).tobytes())
+
+            new_metadatas = [metadatas[i] if metadatas is not None else {} for i in positions]
+            self._conn.executemany(
+                "INSERT INTO chunks (row, chunk_id, document, metadata) VALUES (?, ?, ?, ?)",
+                [
+                    (first_row + offset, ids[i], new_documents[offset], json.dumps(new_metadatas[offset]))
+                    for offset, i in enumerate(positions)
+                ]
+            )
+            self._conn.commit()
+
+            self._map_files()
+            self._ids.extend(ids[i] for i in positions)
+            self._metadatas.extend(new_metadatas)
+            self._live = np.concatenate([self._live, np.ones(len(positions), dtype=bool)])
+            for offset, i in enumerate(positions):
+                self._rows[ids[i]] = first_row + offset
+
+    def get(self, ids: Optional[Sequence[str]] = None, where: Optional[Dict] = None,
+            include: Sequence[str] = ("documents", "metadatas"),
+            limit: Optional[int] = None, offset: Optional[int] = None) -> Dict[str, Any]:
+        """Chunks by id and/or metadata filter, optionally paged as in Chroma"""
+        with self._lock:
+            if ids is None:
+                rows = np.flatnonzero(self._live).tolist()
+            else:
+                rows = [self._rows[chunk_id] for chunk_id in ids if chunk_id in self._rows]
+            if where:
+                rows = [row for row in rows if matches_where(self._metadatas[row], where)]
+            if limit is not None or offset:
+                start = offset or 0
+                rows = rows[start:start + limit if limit is not None else None]
+            return self._hydrate(rows, include)
+
+    def query(self, query_embeddings: Sequence[Sequence[float]], n_results: int = 10,
+              where: Optional[Dict] = None,
+              include: Sequence[str] = ("documents", "metadatas", "distances")) -> Dict[str, Any]:
+        """Nearest neighbours of each query embedding"""
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        with self._lock:
+            candidates = self._candidate_rows(where)
+            hits = self._search_rows(queries, candidates, n_results, rescore=self.rescore)
+
+            results: Dict[str, Any] = {"ids": [], "distances": [], "documents": [], "metadatas": []}
+            for query_hits in hits:
+                hydrated = self._hydrate([row for row, _ in query_hits], include)
+                results["ids"].append(hydrated["ids"])
+                results["distances"].append([distance for _, distance in query_hits])
+                results["documents"].append(hydrated.get("documents"))
+                results["metadatas"].append(hydrated.get("metadatas"))
+            return results
+
+    def update(self, ids: Sequence[str], metadatas: Sequence[Dict]):
+        """Replace chunk metadata (vectors are immutable; delete and re-add instead)"""
+        with self._lock:
+            updates = [
+                (json.dumps(metadata), chunk_id)
+                for chunk_id, metadata in zip(ids, metadatas) if chunk_id in self._rows
+            ]
+            self._conn.executemany("UPDATE chunks SET metadata = ? WHERE chunk_id = ?", updates)
+            self._conn.commit()
+            for metadata, chunk_id in updates:
+                self._metadatas[self._rows[chunk_id]] = json.loads(metadata)
+
+    def delete(self, ids: Optional[Sequence[str]] = None, where: Optional[Dict] = None):
+        """Remove chunks; rows are tombstoned until enough are dead to compact"""
+        with self._lock:
+            rows = self.get(ids=ids, where=where, include=())["ids"]
+            self._conn.executemany("DELETE FROM chunks WHERE chunk_id = ?", [(chunk_id,) for chunk_id in rows])
+            self._conn.commit()
+            for chunk_id in rows:
+                row = self._rows.pop(chunk_id)
+                self._live[row] = False
+                self._ids[row] = None
+                self._metadatas[row] = None
+
+            if len(self._ids) and 1 - len(self._rows) / len(self._ids) >= COMPACT_DEAD_FRACTION:
+                self.compact()
+
+    def compact(self):
+        """Rewrite the vector files without deleted rows"""
+        with self._lock:
+            live_rows = np.flatnonzero(self._live)
+            generation = self._file_generation + 1
+            for kind in self._row_bytes():
+                values = getattr(self, f"_{kind}")
+                with open(self._file(kind, generation), "wb") as f:
+                    for start in range(0, len(live_rows), SCAN_BLOCK_ROWS):
+                        block = live_rows[start:start + SCAN_BLOCK_ROWS]
+                        f.write(np.ascontiguousarray(values[block]).tobytes())
+
+            # Row renumbering and the switch to the new files commit together
+            renumbered = [(new_row, int(old_row)) for new_row, old_row in enumerate(live_rows)]
+            self._conn.executemany("UPDATE chunks SET row = -1 - ? WHERE row = ?", renumbered)
+            self._conn.execute("UPDATE chunks SET row = -1 - row")
+            self._conn.execute(
+                "INSERT OR REPLACE INTO index_meta (key, value) VALUES ('file_generation', ?)", (str(generation),)
+            )
+            self._conn.commit()
+
+            previous = self._file_generation
+            self._file_generation = generation
+            self._load()
+            for kind in self._row_bytes():
+                if os.path.exists(self._file(kind, previous)):
+                    os.remove(self._file(kind, previous))
+            logger.info(f"Compacted quantized index {self.name} to {len(live_rows)} rows")
+
+    # Search
+
+    def _candidate_rows(self, where: Optional[Dict]) -> np.ndarray:
+        rows = np.flatnonzero(self._live)
+        if where:
+            rows = np.array(
+                [row for row in rows.tolist() if matches_where(self._metadatas[row], where)],
+                dtype=np.int64
+            )
+        return rows
+
+    def _distances(self, dots: np.ndarray, norms: np.ndarray, query_norms: np.ndarray) -> np.ndarray:
+        return space_distances(self.space, dots, norms, query_norms)
+
+    def _approximate_distances(self, queries: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        """Distances from the int8 codes for candidate rows (rows x queries)"""
+        query_norms = np.einsum("ij,ij->i", queries, queries)
+        distances = np.empty((len(rows), len(queries)), dtype=np.float32)
+        scan_all = len(rows) == len(self._ids)
+        for start in range(0, len(rows), SCAN_BLOCK_ROWS):
+            block_rows = rows[start:start + SCAN_BLOCK_ROWS]
+            if scan_all:
+                codes = self._codes[start:start + len(block_rows)]
+            else:
+                codes = self._codes[block_rows]
+            dots = (codes.astype(np.float32) @ queries.T) * self._scales[block_rows][:, None]
+            distances[start:start + len(block_rows)] = self._distances(
+                dots, self._norms[block_rows], query_norms
+            )
+        return distances
+
+    def _exact_distances(self, query: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        """Distances from the float32 vectors of the rescore file"""
+        vectors = np.asarray(self._vectors[rows], dtype=np.float32)
+        dots = (vectors @ query)[:, None]
+        return self._distances(dots, self._norms[rows], np.array([query @ query]))[:, 0]
+
+    def _search_rows(self, queries: np.ndarray, rows: np.ndarray, n_results: int,
+                     rescore: bool = False) -> List[List[Tuple[int, float]]]:
+        """(row, distance) of the best rows per query"""
+        if not len(rows) or not len(queries):
+            return [[] for _ in range(len(queries))]
+
+        n_results = min(n_results, len(rows))
+        shortlist = min(len(rows), n_results * self.rescore_factor if rescore else n_results)
+        approximate = self._approximate_distances(queries, rows)
+
+        hits = []
+        for q in range(len(queries)):
+            candidates = np.argpartition(approximate[:, q], shortlist - 1)[:shortlist]
+            candidate_rows = rows[candidates]
+            if rescore:
+                distances = self._exact_distances(queries[q], candidate_rows)
+            else:
+                distances = approximate[candidates, q]
+            order = np.argsort(distances, kind="stable")[:n_results]
+            hits.append([(int(candidate_rows[i]), float(distances[i])) for i in order])
+        return hits
+
+    def _hydrate(self, rows: List[int], include: Sequence[str]) -> Dict[str, Any]:
+        result: Dict[str, Any] = {"ids": [self._ids[row] for row in rows]}
+        if "metadatas" in include:
+            result["metadatas"] = [self._metadatas[row] for row in rows]
+        if "embeddings" in include:
+            # Without a rescore file, embeddings are the dequantized codes
+            result["embeddings"] = [
+                (self._vectors[row] if self.rescore else self._codes[row].astype(np.float32) * self._scales[row]).tolist()
+                for row in rows
+            ]
+        if "documents" in include:
+            documents = {}
+            for start in range(0, len(rows), 500):
+                batch = rows[start:start + 500]
+                placeholders = ", ".join("?" * len(batch))
+                documents.update(self._conn.execute(
+                    f"SELECT row, document FROM chunks WHERE row IN ({placeholders})", batch
+                ).fetchall())
+            result["documents"] = [documents.get(row) for row in rows]
+        return result
+
+    # Evaluation
+
+    def recall_report(self, query_embeddings: Optional[Sequence[Sequence[float]]] = None,
+                      k: int = 10, sample_size: int = 100, seed: int = 0,
+                      exact_ids: Optional[Sequence[Sequence[str]]] = None,
+                      query_ids: Optional[Sequence[Optional[str]]] = None) -> Dict[str, Any]:
+        """
+        Recall@k of quantized search against exact float search over the same vectors
+
+        The exact neighbours come from the rescore file. An index without one
+        only stores codes, so the caller computes them from the original
+        float vectors and passes them as exact_ids.
+
+        Args:
+            query_embeddings: Queries to evaluate; defaults to a sample of stored vectors
+                (each excluded from its own results). Required with exact_ids
+            k: Result depth
+            sample_size: Stored vectors sampled when no queries are given
+            exact_ids: Chunk ids of each query's k exact nearest neighbours
+            query_ids: Stored chunk each query was taken from, excluded from its results
+
+        Returns:
+            Recall of the int8 scan alone and, with a rescore file, with float
+            re-scoring, plus the bytes stored per vector and on disk
+        """
+        with self._lock:
+            rows = np.flatnonzero(self._live)
+            if exact_ids is None and not self.rescore:
+                raise ValueError(f"Index {self.name} keeps no float vectors; pass exact_ids for its recall")
+
+            if query_embeddings is None:
+                rng = np.random.default_rng(seed)
+                sample = rng.choice(rows, size=min(sample_size, len(rows)), replace=False) if len(rows) else rows
+                queries = np.asarray(self._vectors[np.sort(sample)], dtype=np.float32)
+                query_ids = [self._ids[row] for row in np.sort(sample)]
+            else:
+                queries = np.asarray(query_embeddings, dtype=np.float32)
+                query_ids = list(query_ids) if query_ids is not None else [None] * len(queries)
+
+            depth = k + 1 if any(query_ids) else k
+            quantized = self._search_rows(queries, rows, depth, rescore=False)
+            rescored = self._search_rows(queries, rows, depth, rescore=True) if self.rescore else None
+
+            quantized_recall, rescored_recall = [], []
+            for q, query_id in enumerate(query_ids):
+                if exact_ids is not None:
+                    truth = [chunk_id for chunk_id in exact_ids[q] if chunk_id != query_id][:k]
+                else:
+                    exact = self._exact_distances(queries[q], rows)
+                    truth = [self._ids[row] for row in rows[np.argsort(exact, kind="stable")]]
+                    truth = [chunk_id for chunk_id in truth if chunk_id != query_id][:k]
+                if not truth:
+                    continue
+                for found, recalls in ((quantized, quantized_recall), (rescored, rescored_recall)):
+                    if found is None:
+                        continue
+                    found_ids = [self._ids[row] for row, _ in found[q] if self._ids[row] != query_id][:k]
+                    recalls.append(len(set(found_ids) & set(truth)) / len(truth))
+
+            dimension = self.dimension or 0
+            return {
+                "index": self.name,
+                "vectors": len(rows),
+                "queries": len(quantized_recall),
+                "k": k,
+                "recall_quantized": round(float(np.mean(quantized_recall)), 4) if quantized_recall else None,
+                "recall_rescored": round(float(np.mean(rescored_recall)), 4) if rescored_recall else None,
+                "bytes_per_vector": {
+                    "int8_codes": dimension + 8,  # Codes plus scale and norm, scanned for every query
+                    "float32_rescore": dimension * 4 if self.rescore else 0
+                },
+                "bytes_on_disk": sum(
+                    os.path.getsize(self._file(kind))
+                    for kind in self._row_bytes() if os.path.exists(self._file(kind))
+                )
+            }
@@ -0,0 +1,135 @@
+"""
+Vectorized relationship reranking
+Scores a whole candidate pool against a query in one NumPy pass using the
+normalized term sets precomputed at ingestion time
+"""
+import zlib
+from functools import lru_cache
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from .text_normalization import tokenize, encode_term_set, decode_term_set
+
+# Boost applied when every token of a metadata phrase appears in the query
+TERM_SET_WEIGHTS = {
+    "main_concepts": 0.3,
+    "related_keywords": 0.2,
+    "feature_areas": 0.25
+}
+
+MAX_RELATIONSHIP_SCORE = 2.0  # Cap at 2x
+
+def term_set_key(field: str) -> str:
+    """Metadata key holding the precomputed term set for a list field"""
+    return f"{field}_terms"
+
+def build_term_sets(metadata: Dict) -> Dict[str, str]:
+    """Precompute normalized term sets for the scored list fields"""
+    return {
+        term_set_key(field): encode_term_set(metadata.get(field) or [])
+        for field in TERM_SET_WEIGHTS
+    }
+
+def _token_hash(token: str) -> int:
+    # Stable across processes, unlike hash()
+    return zlib.crc32(token.encode("utf-8"))
+
+@lru_cache(maxsize=8192)
+def _phrase_arrays(*encoded_term_sets: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Flattened phrases of a candidate's term sets (one per TERM_SET_WEIGHTS field)
+
+    Returns:
+        Token hashes of every phrase, each phrase's token count and its weight
+    """
+    hashes, lengths, weights = [], [], []
+    for weight, encoded in zip(TERM_SET_WEIGHTS.values(), encoded_term_sets):
+        for phrase in decode_term_set(encoded):
+            tokens = phrase.split(" ")
+            hashes.extend(_token_hash(token) for token in tokens)
+            lengths.append(len(tokens))
+            weights.append(weight)
+
+    return (
+        np.array(hashes, dtype=np.int64),
+        np.array(lengths, dtype=np.int64),
+        np.array(weights, dtype=np.float64)
+    )
+
+def _encoded_term_set(metadata: Dict, field: str) -> str:
+    precomputed = metadata.get(term_set_key(field))
+    if precomputed is not None:
+        return precomputed
+
+    # Chunks ingested before term sets were precomputed
+    value = metadata.get(field) or []
+    if isinstance(value, str):
+        value = decode_term_set(value)
+    return encode_term_set(tuple(value))
+
+def _hierarchy_level(metadata: Dict) -> float:
+    try:
+        return float(metadata.get("hierarchy_level", 2))
+    except (TypeError, ValueError):
+        return 2.0
+
+def score_relationships(query: str, metadatas: Sequence[Dict]) -> np.ndarray:
+    """
+    Relationship relevance score for each candidate
+
+    A candidate gains the field weight for every concept, keyword or feature
+    area whose tokens all occur in the query, plus a hierarchy adjustment:
+    specific (long) queries favor implementation-level documents and general
+    queries favor methodology-level ones.
+
+    Args:
+        query: Search query
+        metadatas: Candidate chunk metadata
+
+    Returns:
+        Array of scores in [1.0, 2.0], aligned with metadatas
+    """
+    count = len(metadatas)
+    scores = np.ones(count, dtype=np.float64)
+    if not count:
+        return scores
+
+    query_hashes = np.fromiter({_token_hash(token) for token in tokenize(query)}, dtype=np.int64)
+
+    token_blocks: List[np.ndarray] = []
+    length_blocks: List[np.ndarray] = []
+    weight_blocks: List[np.ndarray] = []
+    phrase_counts = np.zeros(count, dtype=np.int64)
+
+    for index, metadata in enumerate(metadatas):
+        hashes, lengths, weights = _phrase_arrays(
+            *(_encoded_term_set(metadata, field) for field in TERM_SET_WEIGHTS)
+        )
+        if len(lengths):
+            token_blocks.append(hashes)
+            length_blocks.append(lengths)
+            weight_blocks.append(weights)
+            phrase_counts[index] = len(lengths)
+
+    if token_blocks and len(query_hashes):
+        tokens = np.concatenate(token_blocks)
+        lengths = np.concatenate(length_blocks)
+        weights = np.concatenate(weight_blocks)
+        owners = np.repeat(np.arange(count), phrase_counts)
+
+        # A phrase matches when none of its tokens are missing from the query
+        missing = (~np.isin(tokens, query_hashes)).astype(np.int64)
+        phrase_starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        matched = np.add.reduceat(missing, phrase_starts) == 0
+
+        scores += np.bincount(owners[matched], weights=weights[matched], minlength=count)
+
+    # Hierarchy preference (more specific = higher score for specific queries)
+    hierarchy = np.array([_hierarchy_level(metadata) for metadata in metadatas])
+    if len(query.split()) > 5:  # Specific query
+        scores += (4 - hierarchy) * 0.1
+    else:  # General query
+        scores += (hierarchy - 1) * 0.1
+
+    return np.minimum(scores, MAX_RELATIONSHIP_SCORE)
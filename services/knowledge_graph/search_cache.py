@@ -0,0 +1,85 @@
+"""
+Knowledge search result cache
+Bounded LRU in front of DocumentIngester searches, invalidated by a
+collection generation counter instead of tracking which entries a write touched
+"""
+import copy
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+def normalize_query(query: str) -> str:
+    """Case- and whitespace-insensitive form of a query for cache keys"""
+    return " ".join(query.lower().split())
+
+class SearchResultCache:
+    """LRU cache whose entries expire when the collection generation moves on"""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Tuple[int, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def get(self, key: Hashable, generation: int) -> Optional[Any]:
+        """Cached value for key if it was computed at the current generation"""
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            entry_generation, value = entry
+            if entry_generation != generation:
+                # Written before the last ingest/delete - drop lazily
+                del self._entries[key]
+                self.invalidations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+
+        # Callers may mutate results, so never hand out the cached objects
+        return copy.deepcopy(value)
+
+    def put(self, key: Hashable, generation: int, value: Any):
+        """Store a value computed at the given generation"""
+        if not self.enabled:
+            return
+
+        value = copy.deepcopy(value)
+        with self._lock:
+            self._entries[key] = (generation, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit-rate metrics"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations
+            }
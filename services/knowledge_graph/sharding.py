@@ -0,0 +1,70 @@
+"""
+Knowledge base sharding
+Maps knowledge domains (and optionally project areas) to their own Chroma
+collections so a query only traverses the HNSW graphs it needs
+"""
+import hashlib
+import re
+from typing import Dict, Optional
+
+from .config import HNSW_SPACE, HNSW_M, HNSW_CONSTRUCTION_EF, HNSW_SEARCH_EF
+
+# Pre-sharding collection; still searched, and used for chunks without a domain
+LEGACY_COLLECTION = "pm_knowledge"
+
+SHARD_SEPARATOR = "__"
+
+# Collection metadata keys Chroma reads its HNSW parameters from
+HNSW_PREFIX = "hnsw:"
+
+# Chroma collection names: 3-63 chars of [a-zA-Z0-9._-], alphanumeric at both ends
+MAX_COLLECTION_NAME_LENGTH = 63
+_UNSAFE_CHARACTERS = re.compile(r"[^a-z0-9]+")
+
+def _slug(value: str) -> str:
+    return _UNSAFE_CHARACTERS.sub("-", str(value).lower()).strip("-")
+
+def shard_name(knowledge_domain: Optional[str], project_area: Optional[str] = None) -> str:
+    """Collection name for a domain/project shard"""
+    if not knowledge_domain or not _slug(knowledge_domain):
+        return LEGACY_COLLECTION
+
+    parts = [LEGACY_COLLECTION, _slug(knowledge_domain)]
+    if project_area and _slug(project_area):
+        parts.append(_slug(project_area))
+    name = SHARD_SEPARATOR.join(parts)
+
+    if len(name) > MAX_COLLECTION_NAME_LENGTH:
+        # Keep names unique after truncation with a short digest of the full name
+        digest = hashlib.md5(name.encode("utf-8")).hexdigest()[:8]
+        name = f"{name[:MAX_COLLECTION_NAME_LENGTH - len(digest) - 1].rstrip('-_')}-{digest}"
+    return name
+
+def shard_metadata(knowledge_domain: Optional[str], project_area: Optional[str] = None) -> Dict[str, str]:
+    """Collection metadata recording what a shard holds"""
+    metadata = {"description": "Product Management knowledge base with relationships"}
+    if knowledge_domain:
+        metadata["knowledge_domain"] = knowledge_domain
+    if knowledge_domain and project_area:
+        metadata["project_area"] = project_area
+    return metadata
+
+def hnsw_metadata() -> Dict[str, object]:
+    """Configured HNSW parameters, as Chroma collection metadata"""
+    return {
+        "hnsw:space": HNSW_SPACE,
+        "hnsw:M": HNSW_M,
+        "hnsw:construction_ef": HNSW_CONSTRUCTION_EF,
+        "hnsw:search_ef": HNSW_SEARCH_EF
+    }
+
+def index_parameters(metadata: Optional[Dict]) -> Dict[str, object]:
+    """HNSW parameters recorded in a collection's metadata"""
+    return {key: value for key, value in (metadata or {}).items() if key.startswith(HNSW_PREFIX)}
+
+def is_shard(collection_name: str) -> bool:
+    """Whether a collection belongs to the knowledge base"""
+    return (
+        collection_name == LEGACY_COLLECTION
+        or collection_name.startswith(LEGACY_COLLECTION + SHARD_SEPARATOR)
+    )
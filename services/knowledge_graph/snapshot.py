@@ -0,0 +1,262 @@
+"""
+Knowledge base snapshots
+A columnar file set holding every chunk's text, position and embedding plus the
+document registry, so a new node can bulk-load the knowledge base without
+re-embedding anything:
+
+    manifest.json            format version, embedding model, shard row ranges
+    embeddings.npy           float32 matrix, one row per chunk
+    ids.bin / text.bin       UTF-8 strings concatenated, sliced by *.offsets.npy
+    chunk_index.npy, word_start.npy, word_end.npy, document_codes.npy
+                             int32 chunk position columns (-1 when absent)
+    fingerprints.npy         uint64 SimHash per chunk (fingerprint_mask.npy marks present ones)
+    chunk_metadata.jsonl     extra metadata of legacy chunks that still carry it
+    documents.jsonl          registry: document id, shard and metadata
+    duplicates.jsonl         chunks skipped as near-duplicates
+    lexical_index.json       BM25 postings
+"""
+import json
+import os
+import shutil
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+SNAPSHOT_FORMAT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+LEXICAL_INDEX_FILE = "lexical_index.json"
+
+# Chunk metadata stored as int32 columns; document_id is dictionary-encoded
+_POSITION_COLUMNS = ("chunk_index", "word_start", "word_end")
+
+@dataclass
+class SnapshotShard:
+    name: str
+    metadata: Dict
+    start: int  # First row in the snapshot
+    end: int    # One past the last row
+
+class SnapshotWriter:
+    """Streams chunks into a snapshot directory shard by shard"""
+
+    def __init__(self, path: str, total_chunks: int):
+        if os.path.exists(os.path.join(path, MANIFEST_FILE)):
+            raise ValueError(f"A snapshot already exists at {path}")
+        os.makedirs(path, exist_ok=True)
+
+        self.path = path
+        self.total_chunks = total_chunks
+        self.rows = 0
+        self.shards: List[SnapshotShard] = []
+
+        self._embeddings: Optional[np.ndarray] = None  # Opened once the dimension is known
+        self._ids = open(os.path.join(path, "ids.bin"), "wb")
+        self._text = open(os.path.join(path, "text.bin"), "wb")
+        self._id_offsets = [0]
+        self._text_offsets = [0]
+        self._columns: Dict[str, List[int]] = {column: [] for column in _POSITION_COLUMNS}
+        self._document_codes: List[int] = []
+        self._document_ids: Dict[str, int] = {}
+        self._fingerprints: List[int] = []
+        self._fingerprint_mask: List[bool] = []
+        self._chunk_metadata = open(os.path.join(path, "chunk_metadata.jsonl"), "w")
+
+    def document_code(self, document_id: str) -> int:
+        return self._document_ids.setdefault(document_id, len(self._document_ids))
+
+    def start_shard(self, name: str, metadata: Optional[Dict]):
+        self.shards.append(SnapshotShard(name, dict(metadata or {}), self.rows, self.rows))
+
+    def append(self, ids: Sequence[str], documents: Sequence[str], metadatas: Sequence[Dict],
+               embeddings: Sequence[Sequence[float]], fingerprints: Dict[str, int]):
+        """Add a batch of chunks to the current shard"""
+        if not ids:
+            return
+
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if self._embeddings is None:
+            self._embeddings = np.lib.format.open_memmap(
+                os.path.join(self.path, "embeddings.npy"), mode="w+",
+                dtype=np.float32, shape=(self.total_chunks, vectors.shape[1])
+            )
+        if self.rows + len(ids) > self.total_chunks:
+            raise ValueError("Knowledge base grew while the snapshot was being written")
+        self._embeddings[self.rows:self.rows + len(ids)] = vectors
+
+        for row, (chunk_id, document, metadata) in enumerate(zip(ids, documents, metadatas), self.rows):
+            metadata = dict(metadata or {})
+            for column in _POSITION_COLUMNS:
+                value = metadata.pop(column, None)
+                self._columns[column].append(value if isinstance(value, int) else -1)
+
+            document_id = metadata.pop("document_id", None) or chunk_id.rsplit("_chunk_", 1)[0]
+            self._document_codes.append(self.document_code(document_id))
+            if metadata:
+                self._chunk_metadata.write(json.dumps({"row": row, "metadata": metadata}, default=str) + "\n")
+
+            self._write_string(self._ids, self._id_offsets, chunk_id)
+            self._write_string(self._text, self._text_offsets, document or "")
+            self._fingerprints.append(fingerprints.get(chunk_id, 0))
+            self._fingerprint_mask.append(chunk_id in fingerprints)
+
+        self.rows += len(ids)
+        self.shards[-1].end = self.rows
+
+    @staticmethod
+    def _write_string(handle, offsets: List[int], value: str):
+        encoded = value.encode("utf-8")
+        handle.write(encoded)
+        offsets.append(offsets[-1] + len(encoded))
+
+    def finish(self, documents: Sequence[Tuple[str, str, Dict]],
+               duplicates: Sequence[Tuple],
+               lexical_index_path: Optional[str] = None, **manifest_fields) -> Dict:
+        """
+        Write the registry and column files, then the manifest last so a
+        partially written snapshot is never loaded
+
+        Args:
+            documents: (document id, shard name, metadata) for every registered document
+            duplicates: (chunk id, document id, canonical chunk id, distance, text, chunk metadata)
+            lexical_index_path: Saved BM25 index to include
+            manifest_fields: Extra manifest entries (embedding model, ...)
+        """
+        if self.rows != self.total_chunks:
+            raise ValueError("Knowledge base changed while the snapshot was being written")
+
+        for handle in (self._ids, self._text, self._chunk_metadata):
+            handle.close()
+        if self._embeddings is not None:
+            self._embeddings.flush()
+            dimension = int(self._embeddings.shape[1])
+            del self._embeddings
+        else:
+            dimension = 0
+            np.save(os.path.join(self.path, "embeddings.npy"), np.zeros((0, 0), dtype=np.float32))
+
+        np.save(os.path.join(self.path, "ids.offsets.npy"), np.asarray(self._id_offsets, dtype=np.int64))
+        np.save(os.path.join(self.path, "text.offsets.npy"), np.asarray(self._text_offsets, dtype=np.int64))
+        for column, values in self._columns.items():
+            np.save(os.path.join(self.path, f"{column}.npy"), np.asarray(values, dtype=np.int32))
+        np.save(os.path.join(self.path, "document_codes.npy"), np.asarray(self._document_codes, dtype=np.int32))
+        np.save(os.path.join(self.path, "fingerprints.npy"), np.asarray(self._fingerprints, dtype=np.uint64))
+        np.save(os.path.join(self.path, "fingerprint_mask.npy"), np.asarray(self._fingerprint_mask, dtype=bool))
+
+        # Documents referenced by chunks come first, in code order
+        registry = {document_id: (collection_name, metadata) for document_id, collection_name, metadata in documents}
+        for document_id in registry:
+            self.document_code(document_id)
+        with open(os.path.join(self.path, "documents.jsonl"), "w") as f:
+            for document_id in self._document_ids:
+                collection_name, metadata = registry.get(document_id, (None, None))
+                f.write(json.dumps({
+                    "document_id": document_id,
+                    "collection_name": collection_name,
+                    "metadata": metadata
+                }, default=str) + "\n")
+
+        with open(os.path.join(self.path, "duplicates.jsonl"), "w") as f:
+            for duplicate in duplicates:
+                f.write(json.dumps(list(duplicate)) + "\n")
+
+        if lexical_index_path and os.path.exists(lexical_index_path):
+            shutil.copyfile(lexical_index_path, os.path.join(self.path, LEXICAL_INDEX_FILE))
+
+        manifest = {
+            "format_version": SNAPSHOT_FORMAT_VERSION,
+            "created_at": datetime.now().isoformat(),
+            "chunks": self.rows,
+            "documents": len(self._document_ids),
+            "dimension": dimension,
+            "shards": [
+                {"name": shard.name, "metadata": shard.metadata, "start": shard.start, "end": shard.end}
+                for shard in self.shards
+            ],
+            **manifest_fields
+        }
+        with open(os.path.join(self.path, MANIFEST_FILE), "w") as f:
+            json.dump(manifest, f, indent=2)
+        return manifest
+
+class SnapshotReader:
+    """Memory-mapped access to a snapshot directory"""
+
+    def __init__(self, path: str):
+        manifest_path = os.path.join(path, MANIFEST_FILE)
+        if not os.path.exists(manifest_path):
+            raise ValueError(f"No knowledge snapshot at {path}")
+        with open(manifest_path) as f:
+            self.manifest = json.load(f)
+        if self.manifest.get("format_version") != SNAPSHOT_FORMAT_VERSION:
+            raise ValueError(f"Unsupported snapshot format version: {self.manifest.get('format_version')}")
+
+        self.path = path
+        self.shards = [SnapshotShard(**shard) for shard in self.manifest["shards"]]
+
+        load = lambda name: np.load(os.path.join(path, name), mmap_mode="r")
+        self._embeddings = load("embeddings.npy")
+        self._id_offsets = load("ids.offsets.npy")
+        self._text_offsets = load("text.offsets.npy")
+        self._columns = {column: load(f"{column}.npy") for column in _POSITION_COLUMNS}
+        self._document_codes = load("document_codes.npy")
+        self._fingerprints = load("fingerprints.npy")
+        self._fingerprint_mask = load("fingerprint_mask.npy")
+        self._ids = np.memmap(os.path.join(path, "ids.bin"), dtype=np.uint8, mode="r") if self._id_offsets[-1] else b""
+        self._text = np.memmap(os.path.join(path, "text.bin"), dtype=np.uint8, mode="r") if self._text_offsets[-1] else b""
+
+        self.documents: List[Dict] = []
+        with open(os.path.join(path, "documents.jsonl")) as f:
+            self.documents = [json.loads(line) for line in f if line.strip()]
+
+        self._chunk_metadata: Dict[int, Dict] = {}
+        with open(os.path.join(path, "chunk_metadata.jsonl")) as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self._chunk_metadata[entry["row"]] = entry["metadata"]
+
+    @property
+    def lexical_index_path(self) -> Optional[str]:
+        path = os.path.join(self.path, LEXICAL_INDEX_FILE)
+        return path if os.path.exists(path) else None
+
+    @staticmethod
+    def _strings(blob, offsets: np.ndarray, start: int, end: int) -> List[str]:
+        base = int(offsets[start])
+        data = bytes(blob[base:int(offsets[end])])
+        bounds = (offsets[start:end + 1] - base).tolist()
+        return [data[bounds[i]:bounds[i + 1]].decode("utf-8") for i in range(end - start)]
+
+    def rows(self, start: int, end: int) -> Dict:
+        """Chunks in [start, end) with their metadata rebuilt, in Chroma add() shape"""
+        ids = self._strings(self._ids, self._id_offsets, start, end)
+        metadatas = []
+        for row in range(start, end):
+            metadata = dict(self._chunk_metadata.get(row, {}))
+            metadata["document_id"] = self.documents[int(self._document_codes[row])]["document_id"]
+            for column in _POSITION_COLUMNS:
+                value = int(self._columns[column][row])
+                if value >= 0:
+                    metadata[column] = value
+            metadatas.append(metadata)
+
+        mask = np.asarray(self._fingerprint_mask[start:end])
+        fingerprints = np.asarray(self._fingerprints[start:end])
+        return {
+            "ids": ids,
+            "documents": self._strings(self._text, self._text_offsets, start, end),
+            "metadatas": metadatas,
+            "embeddings": np.asarray(self._embeddings[start:end], dtype=np.float32),
+            "fingerprints": {
+                ids[i]: int(fingerprints[i]) for i in np.flatnonzero(mask).tolist()
+            }
+        }
+
+    def duplicates(self) -> Iterator[Tuple]:
+        """Duplicate rows as written; snapshots from before duplicate text was kept have four fields"""
+        with open(os.path.join(self.path, "duplicates.jsonl")) as f:
+            for line in f:
+                if line.strip():
+                    yield tuple(json.loads(line))
@@ -0,0 +1,42 @@
+"""
+Text normalization helpers for knowledge retrieval
+Shared tokenization so lexical indexing and query parsing agree
+"""
+import re
+from typing import Iterable, List
+
+# Keeps identifiers like "ERR-4021", "PM-008" or "v2.1" together as one token
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[-_.][a-z0-9]+)*")
+
+STOPWORDS = frozenset({
+    "a", "an", "and", "are", "as", "at", "be", "but", "by", "for", "from",
+    "has", "have", "if", "in", "into", "is", "it", "its", "of", "on", "or",
+    "that", "the", "their", "then", "there", "these", "this", "to", "was",
+    "were", "will", "with"
+})
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase and split text into retrieval tokens, dropping stopwords"""
+    if not text:
+        return []
+    return [
+        token for token in TOKEN_PATTERN.findall(text.lower())
+        if token not in STOPWORDS
+    ]
+
+# Separator for list values flattened into a single Chroma metadata string
+TERM_SET_SEPARATOR = "|"
+
+def normalize_phrase(phrase: str) -> str:
+    """Canonical form of a concept/keyword phrase: its tokens joined by spaces"""
+    return " ".join(tokenize(str(phrase)))
+
+def encode_term_set(phrases: Iterable[str]) -> str:
+    """Normalize, dedupe and flatten phrases into one metadata-safe string"""
+    normalized = {normalize_phrase(phrase) for phrase in phrases or []}
+    normalized.discard("")
+    return TERM_SET_SEPARATOR.join(sorted(normalized))
+
+def decode_term_set(encoded: str) -> List[str]:
+    """Inverse of encode_term_set"""
+    return [phrase for phrase in (encoded or "").split(TERM_SET_SEPARATOR) if phrase]
@@ -0,0 +1,54 @@
+"""
+Chroma-style metadata filters evaluated in process
+Used by vector backends that keep chunk metadata outside Chroma
+"""
+from typing import Any, Dict, Optional
+
+def _compare(value: Any, operator: str, operand: Any) -> bool:
+    if operator == "$eq":
+        return value == operand
+    if operator == "$ne":
+        return value != operand
+    if operator == "$in":
+        return value in operand
+    if operator == "$nin":
+        return value not in operand
+    if value is None:
+        return False
+
+    try:
+        if operator == "$gt":
+            return value > operand
+        if operator == "$gte":
+            return value >= operand
+        if operator == "$lt":
+            return value < operand
+        if operator == "$lte":
+            return value <= operand
+    except TypeError:
+        # Mismatched types (e.g. a string hierarchy_level) never match, as in Chroma
+        return False
+
+    raise ValueError(f"Unsupported where operator: {operator}")
+
+def matches_where(metadata: Optional[Dict], where: Optional[Dict]) -> bool:
+    """Whether chunk metadata satisfies a Chroma where clause"""
+    if not where:
+        return True
+    metadata = metadata or {}
+
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(matches_where(metadata, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_where(metadata, clause) for clause in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            if not all(_compare(value, operator, operand) for operator, operand in condition.items()):
+                return False
+        elif metadata.get(key) != condition:
+            return False
+
+    return True
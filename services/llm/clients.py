@@ -2,13 +2,16 @@
 LLM Client implementations
 Handles connections to Anthropic and OpenAI
 """
+import asyncio
 import os
 from typing import Optional, Dict, Any
 from anthropic import Anthropic
 from openai import OpenAI
 import structlog
 
-from .config import LLMProvider, LLMModel, MODEL_CONFIGS
+from shared.deadlines import effective_timeout, with_deadline
+from shared.timings import record_tokens, timed
+from .config import LLMProvider, LLMModel, MODEL_CONFIGS, REQUEST_TIMEOUT_SECONDS
 
 logger = structlog.get_logger()
 
@@ -39,29 +42,44 @@ class LLMClient:
     async def complete(self, 
                       task_type: str,
                       prompt: str,
-                      context: Optional[Dict[str, Any]] = None) -> str:
+                      context: Optional[Dict[str, Any]] = None,
+                      timeout: Optional[float] = None) -> str:
         """
         Get completion for a specific task type
         
+        The blocking SDK call runs in a thread so it does not stall the event
+        loop. It is bounded by `timeout` (default REQUEST_TIMEOUT_SECONDS) and
+        by any enclosing deadline (shared.deadlines). The SDK gets the same
+        limit, so the HTTP request is abandoned rather than left running.
+        
         Args:
             task_type: Type of task (intent_classification, reasoning, etc)
             prompt: The prompt to send
             context: Optional context to include
+            timeout: Seconds to wait for the response
             
         Returns:
             The LLM's response
+            
+        Raises:
+            DeadlineExceeded: The enclosing deadline ran out
+            asyncio.TimeoutError: `timeout` ran out
         """
         config = MODEL_CONFIGS.get(task_type, MODEL_CONFIGS["reasoning"])
         provider = config["provider"]
+        limit = timeout if timeout is not None else REQUEST_TIMEOUT_SECONDS
         
         if provider == LLMProvider.ANTHROPIC:
-            return await self._anthropic_complete(prompt, config)
+            complete = self._anthropic_complete
         elif provider == LLMProvider.OPENAI:
-            return await self._openai_complete(prompt, config)
+            complete = self._openai_complete
         else:
             raise ValueError(f"Unknown provider: {provider}")
+        
+        with timed("llm"):
+            return await with_deadline(asyncio.to_thread(complete, prompt, config, limit), limit)
     
-    async def _anthropic_complete(self, prompt: str, config: Dict[str, Any]) -> str:
+    def _anthropic_complete(self, prompt: str, config: Dict[str, Any], timeout: float) -> str:
         """Get completion from Anthropic"""
         if not self.anthropic_client:
             raise RuntimeError("Anthropic client not initialized")
@@ -70,12 +88,15 @@ class LLMClient:
             model=config["model"].value,
             max_tokens=config["max_tokens"],
             temperature=config["temperature"],
-            messages=[{"role": "user", "content": prompt}]
+            messages=[{"role": "user", "content": prompt}],
+            timeout=effective_timeout(timeout)
         )
         
+        if response.usage:
+            record_tokens(response.usage.input_tokens, response.usage.output_tokens)
         return response.content[0].text
     
-    async def _openai_complete(self, prompt: str, config: Dict[str, Any]) -> str:
+    def _openai_complete(self, prompt: str, config: Dict[str, Any], timeout: float) -> str:
         """Get completion from OpenAI"""
         if not self.openai_client:
             raise RuntimeError("OpenAI client not initialized")
@@ -84,9 +105,12 @@ class LLMClient:
             model=config["model"].value,
             max_tokens=config["max_tokens"],
             temperature=config["temperature"],
-            messages=[{"role": "user", "content": prompt}]
+            messages=[{"role": "user", "content": prompt}],
+            timeout=effective_timeout(timeout)
         )
         
+        if response.usage:
+            record_tokens(response.usage.prompt_tokens, response.usage.completion_tokens)
         return response.choices[0].message.content
 
 # Global client instance
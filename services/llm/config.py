@@ -2,9 +2,13 @@
 LLM Configuration
 Central place for model selection and settings
 """
+import os
 from enum import Enum
 from typing import Dict, Any
 
+# Longest a single completion may take; callers with a deadline get less
+REQUEST_TIMEOUT_SECONDS = float(os.getenv("LLM_REQUEST_TIMEOUT_SECONDS", "120"))
+
 class LLMProvider(Enum):
     ANTHROPIC = "anthropic"
     OPENAI = "openai"
@@ -9,13 +9,21 @@ from services.shared_types import ( #
 )
 
 from .engine import engine, OrchestrationEngine #
+from .workflow_cache import WorkflowCache
+from .unit_of_work import WorkflowUnitOfWork
+from .write_behind import WriteBehindBuffer
 from .workflows import Workflow, WorkflowDefinition, WORKFLOW_DEFINITIONS #
 from .tasks import Task, TaskResult #
+from .job_queue import WorkflowQueue, PostgresWorkflowQueue, InMemoryWorkflowQueue, get_workflow_queue
+from .worker import WorkflowWorker
 
 __all__ = [
     # Engine
     "engine",
     "OrchestrationEngine",
+    "WorkflowCache",
+    "WorkflowUnitOfWork",
+    "WriteBehindBuffer",
     
     # Workflows
     "Workflow",
@@ -26,6 +34,13 @@ __all__ = [
     "Task",
     "TaskResult",
     
+    # Queue and workers
+    "WorkflowQueue",
+    "PostgresWorkflowQueue",
+    "InMemoryWorkflowQueue",
+    "get_workflow_queue",
+    "WorkflowWorker",
+    
     # Shared Enums
     "WorkflowType",
     "WorkflowStatus",
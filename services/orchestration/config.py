@@ -0,0 +1,73 @@
+"""
+Orchestration Configuration
+Central place for workflow execution and queue settings
+"""
+import os
+
+# Tasks of one workflow that may run at the same time once their dependencies are met
+MAX_CONCURRENT_TASKS = int(os.getenv("WORKFLOW_MAX_CONCURRENT_TASKS", "4"))
+
+# Time limit for task types without one in tasks.TASK_TIMEOUT_SECONDS
+DEFAULT_TASK_TIMEOUT_SECONDS = float(os.getenv("WORKFLOW_TASK_TIMEOUT_SECONDS", "120"))
+
+# Per-type overrides, e.g. "analyze_github_issue=300,create_work_item=30"
+TASK_TIMEOUT_OVERRIDES = {
+    name.strip(): float(seconds)
+    for name, seconds in (
+        item.split("=", 1) for item in os.getenv("WORKFLOW_TASK_TIMEOUTS", "").split(",") if "=" in item
+    )
+}
+
+# Budget for one workflow execution, passed down to LLM and GitHub calls (0 disables)
+WORKFLOW_DEADLINE_SECONDS = float(os.getenv("WORKFLOW_DEADLINE_SECONDS", "600"))
+
+# How often an executing worker checks whether the workflow was cancelled from
+# another process (0 disables; cancels in the same process are immediate)
+CANCEL_CHECK_INTERVAL_SECONDS = float(os.getenv("WORKFLOW_CANCEL_CHECK_INTERVAL_SECONDS", "2"))
+
+# Workflow queue: "postgres" (workflow_jobs table, leased with SKIP LOCKED) or
+# "memory" (single-process stand-in for development and tests)
+QUEUE_BACKEND = os.getenv("WORKFLOW_QUEUE_BACKEND", "postgres")
+
+# Run a worker inside the API process as well. On by default so queued workflows
+# run even when no worker processes are deployed; set to false when dedicated
+# workers (the compose "worker" service) serve the queue. Always on for the
+# memory backend, which other processes cannot reach.
+EMBEDDED_WORKER = os.getenv("WORKFLOW_EMBEDDED_WORKER", "true").lower() == "true"
+
+# Workflows one worker process executes at the same time
+WORKER_CONCURRENCY = int(os.getenv("WORKFLOW_WORKER_CONCURRENCY", "4"))
+
+# A leased job returns to the queue if its worker stops heartbeating for this long
+LEASE_SECONDS = int(os.getenv("WORKFLOW_LEASE_SECONDS", "60"))
+
+# Executions per workflow before it is marked failed; retries back off exponentially
+MAX_ATTEMPTS = int(os.getenv("WORKFLOW_MAX_ATTEMPTS", "3"))
+RETRY_DELAY_SECONDS = float(os.getenv("WORKFLOW_RETRY_DELAY_SECONDS", "5"))
+
+# Idle workers check the queue this often
+POLL_INTERVAL_SECONDS = float(os.getenv("WORKFLOW_POLL_INTERVAL_SECONDS", "1"))
+
+# Workers requeue unfinished workflows that have no queued or leased job (e.g.
+# the process died between persisting and enqueueing one) at startup and then
+# this often (0 disables). Workflows younger than the grace period are left
+# alone so one being enqueued right now is not picked up twice.
+RECOVERY_INTERVAL_SECONDS = float(os.getenv("WORKFLOW_RECOVERY_INTERVAL_SECONDS", "60"))
+RECOVERY_GRACE_SECONDS = float(os.getenv("WORKFLOW_RECOVERY_GRACE_SECONDS", "30"))
+
+# Workflows kept in memory per process; older ones are re-read from the database.
+# Workflows this process is executing are pinned and exempt from both limits.
+WORKFLOW_CACHE_SIZE = int(os.getenv("WORKFLOW_CACHE_SIZE", "1000"))
+WORKFLOW_CACHE_MAX_AGE_SECONDS = float(os.getenv("WORKFLOW_CACHE_MAX_AGE_SECONDS", "3600"))
+
+# Task results and context checkpoints are written behind execution: buffered,
+# coalesced per row and flushed every WRITE_BEHIND_FLUSH_SECONDS or once
+# WRITE_BEHIND_MAX_PENDING rows are waiting, and always before a workflow's final
+# status. 0 writes each task update through before the next task starts.
+WRITE_BEHIND_FLUSH_SECONDS = float(os.getenv("WORKFLOW_WRITE_BEHIND_FLUSH_SECONDS", "0.5"))
+WRITE_BEHIND_MAX_PENDING = int(os.getenv("WORKFLOW_WRITE_BEHIND_MAX_PENDING", "200"))
+
+# Carry workflow progress events from worker processes to the API's event bus
+# over Redis pub/sub ("redis") or not at all ("none"). Only needed when workers
+# run in separate processes.
+EVENT_RELAY = os.getenv("WORKFLOW_EVENT_RELAY", "redis" if QUEUE_BACKEND == "postgres" else "none")
@@ -5,10 +5,13 @@ PM-008 Github integration
 """
 # 2025-06-14: Fixed to use domain-first design - domain models instead of orchestration-specific classes
 import asyncio
+import time
+from contextlib import asynccontextmanager
 import structlog
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Set
 from datetime import datetime
 from dataclasses import dataclass
+from sqlalchemy.exc import InterfaceError, OperationalError, TimeoutError as PoolTimeoutError
 
 # Domain-first imports - use domain models consistently
 from services.domain.models import Intent, IntentCategory, Workflow, Task
@@ -16,9 +19,26 @@ from services.database import RepositoryFactory
 from services.shared_types import WorkflowType, WorkflowStatus, TaskType, TaskStatus
 from services.integrations.github.issue_analyzer import GitHubIssueAnalyzer
 from services.llm.clients import llm_client
+from shared.deadlines import DeadlineExceeded, deadline_scope, with_deadline
+from shared.events import EventBus, event_bus
+from shared.timings import collect_timings
+from .config import (
+    MAX_CONCURRENT_TASKS, WORKFLOW_CACHE_SIZE, WORKFLOW_CACHE_MAX_AGE_SECONDS,
+    WORKFLOW_DEADLINE_SECONDS, CANCEL_CHECK_INTERVAL_SECONDS
+)
+from .tasks import resolve_dependencies, task_timeout
+from .unit_of_work import WorkflowUnitOfWork
+from .workflow_cache import WorkflowCache
+from .write_behind import WriteBehindBuffer
 
 logger = structlog.get_logger()
 
+TERMINAL_STATUSES = {WorkflowStatus.COMPLETED, WorkflowStatus.FAILED, WorkflowStatus.CANCELLED}
+
+# Failures of the database connection rather than of the workflow. Execution
+# raises these to the worker, which retries the workflow with backoff.
+RETRYABLE_ERRORS = (OperationalError, InterfaceError, PoolTimeoutError, ConnectionError)
+
 @dataclass
 class TaskResult:
     """Result from executing a task - simple dataclass for task handlers"""
@@ -28,11 +48,18 @@ class TaskResult:
 
 class OrchestrationEngine:
     
-    def __init__(self):
-        self.workflows = {}
+    def __init__(self, events: Optional[EventBus] = None):
+        self.events = events or event_bus  # Progress events for streaming clients
+        self.workflows = WorkflowCache(WORKFLOW_CACHE_SIZE, WORKFLOW_CACHE_MAX_AGE_SECONDS)
         from .workflow_factory import WorkflowFactory
         self.factory = WorkflowFactory()
         self.github_analyzer = GitHubIssueAnalyzer()
+        self.max_concurrent_tasks = max(1, MAX_CONCURRENT_TASKS)
+        self.workflow_deadline = WORKFLOW_DEADLINE_SECONDS or None
+        self.executions: Dict[str, asyncio.Task] = {}  # Workflow id -> task graph running here
+        self._cancel_requested: Set[str] = set()
+        self._units: Dict[str, WorkflowUnitOfWork] = {}  # Workflow id -> its execution's database session
+        self._writes: Optional[WriteBehindBuffer] = None
 
         self.task_handlers = {
             TaskType.ANALYZE_REQUEST: self._analyze_request,
@@ -52,12 +79,28 @@ class OrchestrationEngine:
             TaskType.CREATE_SUMMARY: self._placeholder_handler,
         }
 
+    @property
+    def writes(self) -> WriteBehindBuffer:
+        """
+        Task results and checkpoints, written behind execution
+        
+        Created on first use rather than with the module-level engine, so the
+        buffer's lock and event belong to the running event loop.
+        """
+        if self._writes is None:
+            self._writes = WriteBehindBuffer()
+        return self._writes
+    
+    @writes.setter
+    def writes(self, buffer: WriteBehindBuffer):
+        self._writes = buffer
+    
     async def create_workflow_from_intent(self, intent: Intent) -> Optional[Workflow]:
         """Create appropriate workflow based on intent with database persistence"""
         workflow = await self.factory.create_from_intent(intent)
         if workflow:
             # Store in memory for execution
-            self.workflows[workflow.id] = workflow
+            self.workflows.put(workflow)
             
             # Persist to database using repository pattern
             await self._persist_workflow_to_database(workflow)
@@ -67,13 +110,8 @@ class OrchestrationEngine:
         """Persist domain workflow to database using repository pattern"""
         repos = await RepositoryFactory.get_repositories()
         try:
-            # Create database workflow from domain workflow
-            db_workflow = await repos["workflows"].create_from_domain(workflow)
-            
-            # Create database tasks for each domain task
-            for task in workflow.tasks:
-                await repos["tasks"].create_from_domain(db_workflow.id, task)
-            
+            # Workflow and tasks go in together, tasks as one batched insert
+            await repos["workflows"].create_with_tasks(workflow)
             await repos["session"].commit()
             logger.info("Workflow persisted to database", workflow_id=workflow.id)
         except Exception as e:
@@ -82,95 +120,410 @@ class OrchestrationEngine:
         finally:
             await repos["session"].close()
         
+    async def get_workflow(self, workflow_id: str) -> Optional[Workflow]:
+        """
+        Workflow from the cache, read through to the database when needed
+        
+        Pinned workflows (executing here) and finished ones are served from
+        memory. Anything else may be progressing in another worker, so it is
+        re-read; the cached copy is used if the database is unreachable.
+        """
+        cached = self.workflows.get(workflow_id)
+        if cached and (self.workflows.is_pinned(workflow_id) or cached.status in TERMINAL_STATUSES):
+            return cached
+        
+        try:
+            repos = await RepositoryFactory.get_repositories()
+            try:
+                workflow = await repos["workflows"].get_domain(workflow_id)
+            finally:
+                await repos["session"].close()
+        except Exception as e:
+            logger.warning("Workflow read-through failed", workflow_id=workflow_id, error=str(e))
+            return cached
+        
+        if not workflow:
+            return cached
+        # Execution may have pinned the live object while the read was in flight
+        if self.workflows.is_pinned(workflow_id):
+            return self.workflows.get(workflow_id) or workflow
+        self.workflows.put(workflow)
+        return workflow
+    
     async def execute_workflow(self, workflow_id: str) -> Dict[str, Any]:
         """
         Execute a workflow asynchronously using domain objects
+        
+        Tasks run as soon as the tasks they depend on have completed, up to
+        max_concurrent_tasks at a time, so independent steps overlap and the
+        workflow takes its critical-path time. After a failure no new tasks
+        start; tasks already running finish.
+        
+        Each task is limited by its type's timeout, and the whole execution
+        by workflow_deadline, which LLM and GitHub calls also respect. A
+        workflow cancelled with cancel_workflow stops its running tasks and
+        ends CANCELLED.
         """
-        workflow = self.workflows.get(workflow_id)
+        workflow = await self.get_workflow(workflow_id)
         if not workflow:
             raise ValueError(f"Workflow {workflow_id} not found")
         
+        # Pin the object this execution mutates so readers see live progress
+        self.workflows.put(workflow)
+        self.workflows.pin(workflow_id)
+        try:
+            return await self._execute_pinned(workflow)
+        finally:
+            self.workflows.unpin(workflow_id)
+            self._cancel_requested.discard(workflow_id)
+    
+    async def _execute_pinned(self, workflow: Workflow) -> Dict[str, Any]:
+        """Run a workflow already pinned in the cache"""
+        workflow_id = workflow.id
+        if workflow.status == WorkflowStatus.CANCELLED:
+            logger.info("Skipping cancelled workflow", workflow_id=workflow_id)
+            return workflow.to_dict()
+        
+        # Tasks left running by a crashed attempt start over; completed ones are kept
+        for task in workflow.tasks:
+            if task.status == TaskStatus.RUNNING:
+                task.status = TaskStatus.PENDING
+        completed = sum(1 for task in workflow.tasks if task.status == TaskStatus.COMPLETED)
+        if completed:
+            logger.info("Resuming workflow", workflow_id=workflow_id, completed_tasks=completed,
+                        total_tasks=len(workflow.tasks))
+        
         workflow.status = WorkflowStatus.RUNNING
         
-        # Update status in database
-        repos = await RepositoryFactory.get_repositories()
+        # One session for the whole execution, shared by its tasks
+        unit = await WorkflowUnitOfWork.begin()
+        self._units[workflow_id] = unit
         
         try:
-            await repos["workflows"].update_status(
-                workflow_id, 
-                WorkflowStatus.RUNNING
-            )
-            await repos["session"].commit()
+            await unit.commit(lambda repos: repos["workflows"].update_status(workflow_id, WorkflowStatus.RUNNING))
+            await self._emit_workflow_event(workflow)
             
-            # Execute tasks using domain workflow methods
-            while task := workflow.get_next_task():
-                await self._execute_task(workflow, task)
-                
-                # Persist task results after each execution
-                await self._persist_task_update(workflow_id, task)
-                
-                if workflow.status == WorkflowStatus.FAILED:
-                    break
+            # The graph task copies the current context, deadline included
+            with deadline_scope(self.workflow_deadline):
+                graph = asyncio.create_task(self._run_task_graph(workflow))
+            self.executions[workflow_id] = graph
+            watcher = None
+            if CANCEL_CHECK_INTERVAL_SECONDS > 0:
+                watcher = asyncio.create_task(self._watch_for_cancellation(workflow_id, graph))
+            try:
+                await graph
+            except asyncio.CancelledError:
+                if workflow_id not in self._cancel_requested:
+                    raise  # This execution itself was cancelled, e.g. its lease was lost
+                await self._mark_cancelled(workflow, unit)
+                return workflow.to_dict()
+            finally:
+                self.executions.pop(workflow_id, None)
+                if watcher:
+                    watcher.cancel()
             
-            if workflow.is_complete():
+            if workflow.status != WorkflowStatus.FAILED and workflow.is_complete():
+                # Update final workflow status, after the task results it summarizes
+                await self._flush_writes(workflow_id)
                 workflow.status = WorkflowStatus.COMPLETED
-                
-                # Update final workflow status
-                await repos["workflows"].update_status(
+                await unit.commit(lambda repos: repos["workflows"].update_status(
                     workflow_id,
                     WorkflowStatus.COMPLETED,
                     output_data=workflow.context  # Use context as output
-                )
-                await repos["session"].commit()
+                ))
                 
                 logger.info("Workflow completed", workflow_id=workflow_id)
+                await self._emit_workflow_event(workflow)
+            elif workflow.status == WorkflowStatus.FAILED:
+                workflow.error = workflow.error or next(
+                    (task.error for task in workflow.tasks if task.status == TaskStatus.FAILED), None
+                )
+                await self._flush_writes(workflow_id)
+                await unit.commit(lambda repos: repos["workflows"].update_status(
+                    workflow_id,
+                    WorkflowStatus.FAILED,
+                    error=workflow.error
+                ))
+                
+                logger.error("Workflow failed", workflow_id=workflow_id, error=workflow.error)
+                await self._emit_workflow_event(workflow)
             
+        except RETRYABLE_ERRORS as e:
+            # Left RUNNING; the retry resumes from the completed tasks
+            logger.warning("Workflow execution interrupted", workflow_id=workflow_id, error=str(e))
+            raise
         except Exception as e:
+            # A failed flush propagates, leaving the workflow RUNNING for a retry
+            await self._flush_writes(workflow_id)
             workflow.status = WorkflowStatus.FAILED
             workflow.error = str(e)
             
-            await repos["workflows"].update_status(
+            await unit.commit(lambda repos: repos["workflows"].update_status(
                 workflow_id,
                 WorkflowStatus.FAILED,
                 error=str(e)
-            )
-            await repos["session"].commit()
+            ))
             
             logger.error("Workflow failed", workflow_id=workflow_id, error=str(e))
+            await self._emit_workflow_event(workflow)
         finally:
-            await repos["session"].close()
+            self._units.pop(workflow_id, None)
+            await unit.close()
         
         return workflow.to_dict()
     
-    async def _persist_task_update(self, workflow_id: str, task: Task):
-        """Persist task updates to database using repository pattern"""
-        repos = await RepositoryFactory.get_repositories()
+    async def mark_failed(self, workflow_id: str, error: str):
+        """Record a workflow as FAILED once its worker has given up retrying it"""
+        async with self._unit_of_work(workflow_id) as unit:
+            await unit.commit(lambda repos: repos["workflows"].update_status(
+                workflow_id,
+                WorkflowStatus.FAILED,
+                error=error
+            ))
+        
+        workflow = self.workflows.get(workflow_id)
+        if workflow:
+            workflow.status = WorkflowStatus.FAILED
+            workflow.error = error
+            await self._emit_workflow_event(workflow)
+        logger.error("Workflow failed", workflow_id=workflow_id, error=error)
+    
+    async def _mark_cancelled(self, workflow: Workflow, unit: WorkflowUnitOfWork):
+        """Record a cancelled execution: unfinished tasks and the workflow become CANCELLED"""
+        workflow.status = WorkflowStatus.CANCELLED
+        for task in workflow.tasks:
+            if task.status in (TaskStatus.PENDING, TaskStatus.RUNNING):
+                task.status = TaskStatus.CANCELLED
+                self.writes.stage_task(task)
+                await self._emit_task_event(workflow, task)
+        await self._flush_writes(workflow.id)
+        await unit.commit(lambda repos: repos["workflows"].update_status(workflow.id, WorkflowStatus.CANCELLED))
+        logger.info("Workflow cancelled", workflow_id=workflow.id)
+        await self._emit_workflow_event(workflow)
+    
+    async def _emit_workflow_event(self, workflow: Workflow):
+        """Publish the workflow's current status to progress listeners"""
+        data = {"workflow_id": workflow.id, "status": workflow.status.value}
+        if workflow.status == WorkflowStatus.COMPLETED:
+            event_type = "workflow.completed"
+            data["output"] = workflow.context
+        elif workflow.status == WorkflowStatus.FAILED:
+            event_type = "workflow.failed"
+            data["error"] = workflow.error
+        else:
+            event_type = "workflow.status_changed"
+        await self._emit(event_type, data)
+    
+    async def _emit_task_event(self, workflow: Workflow, task: Task):
+        """Publish a task's status transition, with its output once finished"""
+        await self._emit("workflow.task_status_changed", {
+            "workflow_id": workflow.id,
+            "task_id": task.id,
+            "name": task.name,
+            "type": task.type.value if task.type else None,
+            "status": task.status.value,
+            "result": task.result,
+            "error": task.error,
+            "duration_ms": task.duration_ms
+        })
+    
+    async def _emit(self, event_type: str, data: Dict[str, Any]):
+        # Progress events are best effort; a failing listener must not fail the workflow
         try:
-            # Update database task from domain task
-            await repos["tasks"].update(
-                task.id,
-                status=task.status,
-                output_data=task.result,
-                error=task.error
-            )
-            await repos["session"].commit()
+            await self.events.emit(event_type, data)
         except Exception as e:
-            await repos["session"].rollback()
-            logger.error("Failed to persist task update", task_id=task.id, error=str(e))
+            logger.warning("Failed to emit workflow event", event_type=event_type, error=str(e))
+    
+    async def cancel_workflow(self, workflow_id: str) -> Optional[WorkflowStatus]:
+        """
+        Cancel a workflow wherever it is
+        
+        An execution in this process is cancelled directly. Otherwise the
+        database row is marked CANCELLED: a queued workflow will not start, and
+        the worker executing it notices within CANCEL_CHECK_INTERVAL_SECONDS.
+        
+        Returns:
+            CANCELLED, the status of a workflow that had already finished, or
+            None if there is no such workflow
+        """
+        graph = self.executions.get(workflow_id)
+        if graph:
+            self._cancel_requested.add(workflow_id)
+            graph.cancel()
+            return WorkflowStatus.CANCELLED
+        
+        repos = await RepositoryFactory.get_repositories()
+        try:
+            if await repos["workflows"].request_cancel(workflow_id):
+                await repos["session"].commit()
+                status = WorkflowStatus.CANCELLED
+            else:
+                status = await repos["workflows"].get_status(workflow_id)
         finally:
             await repos["session"].close()
+        
+        cached = self.workflows.get(workflow_id)
+        if cached and status == WorkflowStatus.CANCELLED:
+            cached.status = WorkflowStatus.CANCELLED
+        return status
+    
+    async def _watch_for_cancellation(self, workflow_id: str, graph: asyncio.Task):
+        """Cancel a local execution once another process marks its workflow cancelled"""
+        while not graph.done():
+            await asyncio.sleep(CANCEL_CHECK_INTERVAL_SECONDS)
+            try:
+                repos = await RepositoryFactory.get_repositories()
+                try:
+                    status = await repos["workflows"].get_status(workflow_id)
+                finally:
+                    await repos["session"].close()
+            except Exception as e:
+                logger.warning("Cancellation check failed", workflow_id=workflow_id, error=str(e))
+                continue
+            
+            if status == WorkflowStatus.CANCELLED and not graph.done():
+                self._cancel_requested.add(workflow_id)
+                graph.cancel()
+                return
+    
+    async def _run_task_graph(self, workflow: Workflow):
+        """Schedule ready tasks concurrently until none are left to run"""
+        dependencies = resolve_dependencies(workflow.tasks)
+        context_writers: Dict[str, int] = {}
+        running: Dict[asyncio.Task, Task] = {}
+        ready_since: Dict[str, float] = {}  # Task id -> when its dependencies were met
+        
+        try:
+            while True:
+                if workflow.status != WorkflowStatus.FAILED:
+                    ready = workflow.get_ready_tasks(dependencies)
+                    for task in ready:
+                        ready_since.setdefault(task.id, time.monotonic())
+                    for task in ready[:self.max_concurrent_tasks - len(running)]:
+                        task.status = TaskStatus.RUNNING  # Claimed, so it is not scheduled twice
+                        execution = self._execute_and_persist(workflow, task, context_writers, ready_since[task.id])
+                        running[asyncio.create_task(execution)] = task
+                
+                if not running:
+                    break
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for finished in done:
+                    running.pop(finished)
+                    finished.result()
+        except asyncio.CancelledError:
+            # Stop the handlers too, or they would keep running unobserved
+            for execution in running:
+                execution.cancel()
+            await asyncio.gather(*running, return_exceptions=True)
+            raise
+        
+        blocked = [task.id for task in workflow.tasks if task.status == TaskStatus.PENDING]
+        if blocked and workflow.status != WorkflowStatus.FAILED:
+            raise ValueError(f"Tasks with unsatisfiable dependencies: {blocked}")
+    
+    async def _execute_and_persist(self, workflow: Workflow, task: Task, context_writers: Dict[str, int],
+                                   ready_at: Optional[float] = None):
+        await self._execute_task(workflow, task, context_writers, ready_at)
+        
+        # Persist task results after each execution
+        await self._persist_task_update(workflow, task)
+    
+    def _merge_task_output(self, workflow: Workflow, task: Task, output_data: Dict[str, Any],
+                           context_writers: Optional[Dict[str, int]]):
+        """
+        Merge a task's output into the workflow context
+        
+        When tasks that ran concurrently write the same key, the one later in
+        the workflow wins whatever order they finished in.
+        """
+        if context_writers is None:
+            workflow.context.update(output_data)
+            return
+        
+        position = workflow.tasks.index(task)
+        for key, value in output_data.items():
+            if context_writers.get(key, -1) <= position:
+                workflow.context[key] = value
+                context_writers[key] = position
+    
+    async def _persist_task_update(self, workflow: Workflow, task: Task):
+        """
+        Hand a finished task to the write-behind buffer
+        
+        A completed task's output is checkpointed together with the workflow
+        context, so a resumed execution starts from exactly this state. The
+        next task does not wait for the write unless write-behind is disabled.
+        """
+        self.writes.stage_task(task)
+        if task.status == TaskStatus.COMPLETED:
+            self.writes.stage_checkpoint(workflow)
+        if not self.writes.enabled:
+            try:
+                await self._flush_writes(workflow.id)
+            except Exception:
+                pass  # Stays buffered; the final status waits for it
+    
+    async def _flush_writes(self, workflow_id: str):
+        """
+        Write buffered task results now
+        
+        A failure stays buffered and is raised, so the caller does not commit
+        a final workflow status over task rows that were never written.
+        """
+        try:
+            await self.writes.flush()
+        except Exception as e:
+            logger.error("Failed to persist task updates", workflow_id=workflow_id, error=str(e))
+            raise
     
-    async def _execute_task(self, workflow: Workflow, task: Task):
-        """Execute a single task using domain objects"""
+    @asynccontextmanager
+    async def _unit_of_work(self, workflow_id: str):
+        """The unit of work of the workflow's execution here, or a short-lived one"""
+        unit = self._units.get(workflow_id)
+        if unit:
+            yield unit
+            return
+        unit = await WorkflowUnitOfWork.begin()
+        try:
+            yield unit
+        finally:
+            await unit.close()
+    
+    async def _execute_task(self, workflow: Workflow, task: Task,
+                            context_writers: Optional[Dict[str, int]] = None,
+                            ready_at: Optional[float] = None):
+        """
+        Execute a single task using domain objects
+        
+        Records the handler's wall time, the time since the task became ready
+        (ready_at, a time.monotonic() value) and the LLM, database and GitHub
+        time and tokens spent inside the handler.
+        """
         task.status = TaskStatus.RUNNING
+        task.started_at = datetime.utcnow()
+        if ready_at is not None:
+            task.queue_wait_ms = round((time.monotonic() - ready_at) * 1000, 2)
+        await self._emit_task_event(workflow, task)
         
         try:
             handler = self.task_handlers.get(task.type)
             if not handler:
                 raise ValueError(f"No handler for task type {task.type}")
             
-            # Execute task
-            result = await handler(workflow, task)
+            # Execute task within its type's timeout and the workflow deadline
+            timeout = task_timeout(task.type)
+            with collect_timings() as timings:
+                started = time.perf_counter()
+                try:
+                    result = await with_deadline(handler(workflow, task), timeout)
+                except DeadlineExceeded:
+                    result = TaskResult(success=False, error="Workflow deadline exceeded")
+                except asyncio.TimeoutError:
+                    result = TaskResult(success=False, error=f"Task timed out after {timeout:g}s")
+                finally:
+                    task.duration_ms = round((time.perf_counter() - started) * 1000, 2)
+                    task.completed_at = datetime.utcnow()
+                    task.timings = timings.to_dict()
             
             # Update domain task with results
             if result.success:
@@ -179,7 +532,7 @@ class OrchestrationEngine:
                 
                 # Update workflow context
                 if result.output_data:
-                    workflow.context.update(result.output_data)
+                    self._merge_task_output(workflow, task, result.output_data, context_writers)
             else:
                 task.status = TaskStatus.FAILED
                 task.error = result.error or "Task execution failed"
@@ -190,7 +543,9 @@ class OrchestrationEngine:
                 workflow_id=workflow.id,
                 task_id=task.id,
                 task_type=task.type.value if task.type else "unknown",
-                success=result.success
+                success=result.success,
+                duration_ms=task.duration_ms,
+                queue_wait_ms=task.queue_wait_ms
             )
             
         except Exception as e:
@@ -203,6 +558,8 @@ class OrchestrationEngine:
                 task_id=task.id,
                 error=str(e)
             )
+        
+        await self._emit_task_event(workflow, task)
     
     # Task handler implementations
     async def _analyze_request(self, workflow: Workflow, task: Task) -> TaskResult:
@@ -261,28 +618,22 @@ List concrete requirements, acceptance criteria, and technical specifications.""
     
     async def _create_work_item(self, workflow: Workflow, task: Task) -> TaskResult:
         """Create internal work item representation"""
-        # Create work item in database
-        repos = await RepositoryFactory.get_repositories()
-        try:
-            work_item = await repos["work_items"].create(
+        # Create work item in database, through the execution's session
+        async with self._unit_of_work(workflow.id) as unit:
+            work_item = await unit.commit(lambda repos: repos["work_items"].add(
                 title=workflow.context.get("original_message", "")[:100],
                 description=workflow.context.get("requirements", ""),
                 status="open",
                 external_refs={}
-            )
-            await repos["session"].commit()
-            
-            result = TaskResult(
-                success=True,
-                output_data={
-                    "work_item_id": work_item.id,
-                    "title": work_item.title
-                }
-            )
-        finally:
-            await repos["session"].close()
+            ))
         
-        return result
+        return TaskResult(
+            success=True,
+            output_data={
+                "work_item_id": work_item.id,
+                "title": work_item.title
+            }
+        )
     
     async def _notify_stakeholders(self, workflow: Workflow, task: Task) -> TaskResult:
         """Notify relevant stakeholders"""
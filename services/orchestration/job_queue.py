@@ -0,0 +1,248 @@
+"""
+Workflow Queue
+Durable hand-off between the API, which only enqueues workflows, and the
+worker processes that lease and execute them
+"""
+import asyncio
+import uuid
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import structlog
+
+from services.database import RepositoryFactory
+from .config import QUEUE_BACKEND, LEASE_SECONDS, MAX_ATTEMPTS, RETRY_DELAY_SECONDS, RECOVERY_GRACE_SECONDS
+
+logger = structlog.get_logger()
+
+@dataclass
+class QueuedJob:
+    """A leased workflow execution"""
+    id: str
+    workflow_id: str
+    attempts: int
+
+class WorkflowQueue(ABC):
+    """
+    At-least-once workflow queue. A leased job belongs to one worker until it
+    completes, fails or stops heartbeating; then another worker may lease it.
+    """
+
+    def __init__(self, max_attempts: int = MAX_ATTEMPTS, retry_delay_seconds: float = RETRY_DELAY_SECONDS):
+        self.max_attempts = max_attempts
+        self.retry_delay_seconds = retry_delay_seconds
+
+    @abstractmethod
+    async def enqueue(self, workflow_id: str) -> str:
+        """Queue a workflow; returns the job id"""
+
+    @abstractmethod
+    async def lease(self, worker_id: str, lease_seconds: int = LEASE_SECONDS) -> Optional[QueuedJob]:
+        """Next available job for this worker, if any"""
+
+    @abstractmethod
+    async def heartbeat(self, job: QueuedJob, worker_id: str, lease_seconds: int = LEASE_SECONDS) -> bool:
+        """Extend a lease; False if the worker lost it"""
+
+    @abstractmethod
+    async def complete(self, job: QueuedJob, worker_id: str):
+        """Mark a leased job done"""
+
+    @abstractmethod
+    async def fail(self, job: QueuedJob, worker_id: str, error: str) -> Optional[str]:
+        """Requeue with backoff, or give up after max_attempts; returns the job's new status"""
+
+    @abstractmethod
+    async def stats(self) -> Dict[str, int]:
+        """Jobs per status"""
+
+    @abstractmethod
+    async def recover(self, grace_seconds: float = RECOVERY_GRACE_SECONDS) -> List[str]:
+        """
+        Queue pending or running workflows older than grace_seconds that have
+        no queued or leased job; returns their ids. Execution resumes from the
+        persisted tasks, skipping those already completed.
+        """
+
+    async def wait_for_work(self, timeout: float):
+        """Sleep until a job may be available"""
+        await asyncio.sleep(timeout)
+
+class PostgresWorkflowQueue(WorkflowQueue):
+    """Queue backed by the workflow_jobs table"""
+
+    async def _call(self, method: str, *args):
+        repos = await RepositoryFactory.get_repositories()
+        try:
+            return await getattr(repos["workflow_jobs"], method)(*args)
+        except Exception:
+            await repos["session"].rollback()
+            raise
+        finally:
+            await repos["session"].close()
+
+    async def enqueue(self, workflow_id: str) -> str:
+        job = await self._call("enqueue", workflow_id)
+        return job.id
+
+    async def lease(self, worker_id: str, lease_seconds: int = LEASE_SECONDS) -> Optional[QueuedJob]:
+        job = await self._call("lease", worker_id, lease_seconds, self.max_attempts)
+        return QueuedJob(job.id, job.workflow_id, job.attempts) if job else None
+
+    async def heartbeat(self, job: QueuedJob, worker_id: str, lease_seconds: int = LEASE_SECONDS) -> bool:
+        return await self._call("heartbeat", job.id, worker_id, lease_seconds)
+
+    async def complete(self, job: QueuedJob, worker_id: str):
+        await self._call("complete", job.id, worker_id)
+
+    async def fail(self, job: QueuedJob, worker_id: str, error: str) -> Optional[str]:
+        return await self._call("fail", job.id, worker_id, error, self.max_attempts, self.retry_delay_seconds)
+
+    async def stats(self) -> Dict[str, int]:
+        return await self._call("counts")
+
+    async def recover(self, grace_seconds: float = RECOVERY_GRACE_SECONDS) -> List[str]:
+        return await self._call("requeue_interrupted", datetime.utcnow() - timedelta(seconds=grace_seconds))
+
+@dataclass
+class _MemoryJob:
+    id: str
+    workflow_id: str
+    status: str = "queued"
+    attempts: int = 0
+    available_at: datetime = field(default_factory=datetime.utcnow)
+    lease_owner: Optional[str] = None
+    lease_expires_at: Optional[datetime] = None
+    last_error: Optional[str] = None
+
+class InMemoryWorkflowQueue(WorkflowQueue):
+    """Single-process stand-in with the same lease semantics, for development and tests"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.jobs: Dict[str, _MemoryJob] = {}
+        self._by_workflow: Dict[str, str] = {}
+        self._lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+
+    async def enqueue(self, workflow_id: str) -> str:
+        async with self._lock:
+            if workflow_id not in self._by_workflow:
+                job = _MemoryJob(id=str(uuid.uuid4()), workflow_id=workflow_id)
+                self.jobs[job.id] = job
+                self._by_workflow[workflow_id] = job.id
+            self._wakeup.set()
+            return self._by_workflow[workflow_id]
+
+    async def lease(self, worker_id: str, lease_seconds: int = LEASE_SECONDS) -> Optional[QueuedJob]:
+        async with self._lock:
+            now = datetime.utcnow()
+            available = sorted(
+                (
+                    job for job in self.jobs.values()
+                    if (job.status == "queued" and job.available_at <= now)
+                    or (job.status == "leased" and job.lease_expires_at < now)
+                ),
+                key=lambda job: job.available_at
+            )
+            for job in available:
+                if job.attempts >= self.max_attempts:
+                    job.status = "failed"
+                    job.lease_owner = None
+                    job.last_error = job.last_error or "Worker lease expired"
+                    continue
+                job.status = "leased"
+                job.lease_owner = worker_id
+                job.lease_expires_at = now + timedelta(seconds=lease_seconds)
+                job.attempts += 1
+                return QueuedJob(job.id, job.workflow_id, job.attempts)
+            return None
+
+    async def heartbeat(self, job: QueuedJob, worker_id: str, lease_seconds: int = LEASE_SECONDS) -> bool:
+        async with self._lock:
+            stored = self.jobs.get(job.id)
+            if not stored or stored.status != "leased" or stored.lease_owner != worker_id:
+                return False
+            stored.lease_expires_at = datetime.utcnow() + timedelta(seconds=lease_seconds)
+            return True
+
+    async def complete(self, job: QueuedJob, worker_id: str):
+        async with self._lock:
+            stored = self.jobs.get(job.id)
+            if stored and stored.lease_owner == worker_id:
+                stored.status = "done"
+                stored.lease_owner = None
+                stored.lease_expires_at = None
+
+    async def fail(self, job: QueuedJob, worker_id: str, error: str) -> Optional[str]:
+        async with self._lock:
+            stored = self.jobs.get(job.id)
+            if not stored or stored.lease_owner != worker_id:
+                return None
+            stored.last_error = error
+            stored.lease_owner = None
+            stored.lease_expires_at = None
+            if stored.attempts >= self.max_attempts:
+                stored.status = "failed"
+            else:
+                stored.status = "queued"
+                stored.available_at = datetime.utcnow() + timedelta(
+                    seconds=self.retry_delay_seconds * 2 ** (stored.attempts - 1)
+                )
+            return stored.status
+
+    async def stats(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for job in self.jobs.values():
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return counts
+
+    async def recover(self, grace_seconds: float = RECOVERY_GRACE_SECONDS) -> List[str]:
+        repos = await RepositoryFactory.get_repositories()
+        try:
+            candidates = await repos["workflows"].list_interrupted_ids(
+                datetime.utcnow() - timedelta(seconds=grace_seconds), without_active_job=False
+            )
+        finally:
+            await repos["session"].close()
+
+        recovered = []
+        async with self._lock:
+            for workflow_id in candidates:
+                job = self.jobs.get(self._by_workflow.get(workflow_id))
+                if job and (job.status in ("queued", "leased") or job.attempts >= self.max_attempts):
+                    continue
+                if job:
+                    job.status = "queued"
+                    job.available_at = datetime.utcnow()
+                else:
+                    job = _MemoryJob(id=str(uuid.uuid4()), workflow_id=workflow_id)
+                    self.jobs[job.id] = job
+                    self._by_workflow[workflow_id] = job.id
+                recovered.append(workflow_id)
+            if recovered:
+                self._wakeup.set()
+        return recovered
+
+    async def wait_for_work(self, timeout: float):
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup.clear()
+
+_queue: Optional[WorkflowQueue] = None
+
+def get_workflow_queue() -> WorkflowQueue:
+    """Shared queue for the configured backend"""
+    global _queue
+    if _queue is None:
+        if QUEUE_BACKEND == "memory":
+            _queue = InMemoryWorkflowQueue()
+        elif QUEUE_BACKEND == "postgres":
+            _queue = PostgresWorkflowQueue()
+        else:
+            raise ValueError(f"Unknown workflow queue backend: {QUEUE_BACKEND}")
+    return _queue
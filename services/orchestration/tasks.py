@@ -3,11 +3,12 @@ Task definitions for orchestration
 Individual units of work that can be composed into workflows
 """
 from dataclasses import dataclass
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Sequence, Set, Tuple
 from datetime import datetime
 
 # Import TaskType and TaskStatus from shared_types
 from services.shared_types import TaskType, TaskStatus
+from .config import DEFAULT_TASK_TIMEOUT_SECONDS, TASK_TIMEOUT_OVERRIDES
 
 # Removed:
 # class TaskType(Enum):
@@ -69,3 +70,74 @@ class TaskResult:
     output_data: Dict[str, Any] = None
     error: Optional[str] = None
     next_tasks: List[str] = None
+
+# Workflow context keys each task type reads and writes. A task waits for the
+# earlier tasks in its workflow that write a key it reads; task types without
+# declared inputs wait for every earlier task, as in sequential execution.
+TASK_INPUT_KEYS: Dict[TaskType, Tuple[str, ...]] = {
+    TaskType.ANALYZE_REQUEST: ("original_message",),
+    TaskType.EXTRACT_REQUIREMENTS: ("analysis",),
+    TaskType.IDENTIFY_DEPENDENCIES: ("requirements",),
+    TaskType.CREATE_WORK_ITEM: ("original_message", "requirements"),
+    TaskType.NOTIFY_STAKEHOLDERS: ("requirements",),
+    TaskType.ANALYZE_GITHUB_ISSUE: ("github_url", "original_message"),
+}
+
+TASK_OUTPUT_KEYS: Dict[TaskType, Tuple[str, ...]] = {
+    TaskType.ANALYZE_REQUEST: ("analysis",),
+    TaskType.EXTRACT_REQUIREMENTS: ("requirements",),
+    TaskType.IDENTIFY_DEPENDENCIES: ("dependencies",),
+    TaskType.CREATE_WORK_ITEM: ("work_item_id", "title"),
+    TaskType.NOTIFY_STAKEHOLDERS: ("notified",),
+    TaskType.ANALYZE_GITHUB_ISSUE: (
+        "analysis_complete", "github_url", "issue_number", "issue_title", "repository",
+        "analysis_summary", "draft_comment", "draft_rewrite", "confidence",
+        "formatted_response", "raw_analysis"
+    ),
+    TaskType.GITHUB_CREATE_ISSUE: ("placeholder",),
+    TaskType.JIRA_CREATE_TICKET: ("placeholder",),
+    TaskType.SLACK_SEND_MESSAGE: ("placeholder",),
+    TaskType.GENERATE_DOCUMENT: ("placeholder",),
+    TaskType.CREATE_SUMMARY: ("placeholder",),
+}
+
+# Seconds a task of each type may run; LLM-backed steps get the most room
+TASK_TIMEOUT_SECONDS: Dict[TaskType, float] = {
+    TaskType.ANALYZE_REQUEST: 90,
+    TaskType.EXTRACT_REQUIREMENTS: 90,
+    TaskType.IDENTIFY_DEPENDENCIES: 30,
+    TaskType.CREATE_WORK_ITEM: 30,
+    TaskType.NOTIFY_STAKEHOLDERS: 30,
+    TaskType.ANALYZE_GITHUB_ISSUE: 180,
+}
+
+def task_timeout(task_type: Optional[TaskType]) -> float:
+    """Time limit for a task type, honouring WORKFLOW_TASK_TIMEOUTS overrides"""
+    if task_type is not None and task_type.value in TASK_TIMEOUT_OVERRIDES:
+        return TASK_TIMEOUT_OVERRIDES[task_type.value]
+    return TASK_TIMEOUT_SECONDS.get(task_type, DEFAULT_TASK_TIMEOUT_SECONDS)
+
+def resolve_dependencies(tasks: Sequence) -> Dict[str, Set[str]]:
+    """
+    Task id -> ids of the tasks it waits for: its explicit depends_on plus the
+    earlier tasks writing a context key it reads (tasks with undeclared
+    outputs count as writing every key)
+
+    Raises:
+        ValueError: If a task depends on a task that is not in the workflow
+    """
+    task_ids = {task.id for task in tasks}
+    dependencies = {}
+    for position, task in enumerate(tasks):
+        waits_for = set(getattr(task, "depends_on", None) or [])
+        unknown = waits_for - task_ids
+        if unknown:
+            raise ValueError(f"Task {task.id} depends on unknown tasks: {sorted(unknown)}")
+
+        inputs = TASK_INPUT_KEYS.get(task.type)
+        for earlier in tasks[:position]:
+            outputs = TASK_OUTPUT_KEYS.get(earlier.type)
+            if inputs is None or outputs is None or set(inputs) & set(outputs):
+                waits_for.add(earlier.id)
+        dependencies[task.id] = waits_for
+    return dependencies
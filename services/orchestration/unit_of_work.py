@@ -0,0 +1,41 @@
+"""
+Workflow Unit of Work
+One repository session per workflow execution, shared by its concurrently
+running tasks
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict
+
+from services.database import RepositoryFactory
+
+class WorkflowUnitOfWork:
+    """
+    Database access for one workflow execution
+
+    Tasks share the session, so every use of it is serialized. Task results
+    and checkpoints go through the engine's write-behind buffer instead; this
+    carries the writes that must be on disk before execution moves on, such
+    as status changes and rows other tasks refer to.
+    """
+
+    def __init__(self, repos: Dict[str, Any]):
+        self.repos = repos
+        self._lock = asyncio.Lock()
+
+    @classmethod
+    async def begin(cls) -> "WorkflowUnitOfWork":
+        return cls(await RepositoryFactory.get_repositories())
+
+    async def close(self):
+        await self.repos["session"].close()
+
+    async def commit(self, operation: Callable[[Dict[str, Any]], Awaitable[Any]]) -> Any:
+        """Run operation with the repositories and commit it; returns its result"""
+        async with self._lock:
+            try:
+                result = await operation(self.repos)
+                await self.repos["session"].commit()
+            except Exception:
+                await self.repos["session"].rollback()
+                raise
+            return result
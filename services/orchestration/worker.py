@@ -0,0 +1,165 @@
+"""
+Workflow Worker
+Leases queued workflows and executes them, heartbeating while they run.
+Run any number of these next to the API:
+
+    python -m services.orchestration.worker --concurrency 4
+"""
+import argparse
+import asyncio
+import os
+import signal
+import socket
+import uuid
+from typing import Dict, Optional
+
+import structlog
+
+from shared.events.relay import RedisEventRelay
+from .config import (
+    WORKER_CONCURRENCY, LEASE_SECONDS, POLL_INTERVAL_SECONDS, EVENT_RELAY,
+    RECOVERY_INTERVAL_SECONDS, RECOVERY_GRACE_SECONDS
+)
+from .job_queue import QueuedJob, WorkflowQueue, get_workflow_queue
+
+logger = structlog.get_logger()
+
+class WorkflowWorker:
+    """Pulls workflows off the queue and runs up to `concurrency` of them at once"""
+
+    def __init__(self, engine, queue: WorkflowQueue, worker_id: Optional[str] = None,
+                 concurrency: int = WORKER_CONCURRENCY, lease_seconds: int = LEASE_SECONDS,
+                 poll_interval: float = POLL_INTERVAL_SECONDS,
+                 recovery_interval: float = RECOVERY_INTERVAL_SECONDS):
+        self.engine = engine
+        self.queue = queue
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.concurrency = max(1, concurrency)
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.recovery_interval = recovery_interval
+        self.active: Dict[asyncio.Task, QueuedJob] = {}
+        self._stopping = asyncio.Event()
+
+    async def run(self):
+        """Lease and execute jobs until stop() is called, then let running ones finish"""
+        logger.info("Workflow worker started", worker_id=self.worker_id, concurrency=self.concurrency)
+        recovery = asyncio.create_task(self._recover()) if self.recovery_interval > 0 else None
+        while not self._stopping.is_set():
+            job = None
+            if len(self.active) < self.concurrency:
+                try:
+                    job = await self.queue.lease(self.worker_id, self.lease_seconds)
+                except Exception as e:
+                    logger.error("Failed to lease workflow job", worker_id=self.worker_id, error=str(e))
+
+            if job:
+                self.active[asyncio.create_task(self._process(job))] = job
+                continue
+
+            # Wake when a slot frees, new work may be queued, or it is time to poll again
+            waiters = [asyncio.create_task(self.queue.wait_for_work(self.poll_interval))]
+            waiters.append(asyncio.create_task(self._stopping.wait()))
+            await asyncio.wait(waiters + list(self.active), return_when=asyncio.FIRST_COMPLETED)
+            for waiter in waiters:
+                waiter.cancel()
+            self._reap()
+
+        if recovery:
+            recovery.cancel()
+        if self.active:
+            await asyncio.wait(list(self.active))
+            self._reap()
+        logger.info("Workflow worker stopped", worker_id=self.worker_id)
+
+    def stop(self):
+        self._stopping.set()
+
+    def _reap(self):
+        for task in [task for task in self.active if task.done()]:
+            self.active.pop(task)
+
+    async def _recover(self):
+        """Requeue workflows interrupted by a crash, now and then every recovery_interval"""
+        while True:
+            try:
+                recovered = await self.queue.recover(RECOVERY_GRACE_SECONDS)
+                if recovered:
+                    logger.info("Requeued interrupted workflows", worker_id=self.worker_id, workflow_ids=recovered)
+            except Exception as e:
+                logger.warning("Workflow recovery failed", worker_id=self.worker_id, error=str(e))
+            await asyncio.sleep(self.recovery_interval)
+
+    async def _process(self, job: QueuedJob):
+        execution = asyncio.create_task(self.engine.execute_workflow(job.workflow_id))
+        heartbeat = asyncio.create_task(self._heartbeat(job, execution))
+        try:
+            await execution
+            await self.queue.complete(job, self.worker_id)
+        except asyncio.CancelledError:
+            logger.warning("Workflow execution abandoned", workflow_id=job.workflow_id, job_id=job.id)
+        except Exception as e:
+            status = await self.queue.fail(job, self.worker_id, str(e))
+            logger.error(
+                "Workflow execution crashed",
+                workflow_id=job.workflow_id,
+                attempt=job.attempts,
+                job_status=status,
+                error=str(e)
+            )
+            if status == "failed":
+                await self._give_up(job, str(e))
+        finally:
+            heartbeat.cancel()
+
+    async def _give_up(self, job: QueuedJob, error: str):
+        """Fail the workflow of a job that will not be retried again"""
+        try:
+            await self.engine.mark_failed(job.workflow_id, error)
+        except Exception as e:
+            logger.error("Failed to mark workflow failed", workflow_id=job.workflow_id, error=str(e))
+
+    async def _heartbeat(self, job: QueuedJob, execution: asyncio.Task):
+        """Keep the lease alive; abandon the execution if another worker took it over"""
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                held = await self.queue.heartbeat(job, self.worker_id, self.lease_seconds)
+            except Exception as e:
+                logger.warning("Heartbeat failed", job_id=job.id, error=str(e))
+                continue
+            if not held:
+                logger.warning("Lost workflow lease", workflow_id=job.workflow_id, job_id=job.id)
+                execution.cancel()
+                return
+
+async def main(concurrency: int, worker_id: Optional[str]):
+    from services.database import db
+    from .engine import engine
+    
+    # Workers may start before the API, so they bring the schema up to date too
+    await db.migrate()
+
+    # Progress events reach the API's event streams through the relay
+    relay = None
+    if EVENT_RELAY == "redis":
+        relay = RedisEventRelay.from_env(engine.events)
+        relay.start(receive=False)
+
+    worker = WorkflowWorker(engine, get_workflow_queue(), worker_id=worker_id, concurrency=concurrency)
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, worker.stop)
+    try:
+        await worker.run()
+    finally:
+        await engine.writes.stop()
+        if relay:
+            await relay.stop()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Execute queued workflows")
+    parser.add_argument("--concurrency", type=int, default=WORKER_CONCURRENCY, help="Workflows executed at once")
+    parser.add_argument("--worker-id", help="Lease owner name (defaults to host-pid-random)")
+    args = parser.parse_args()
+    asyncio.run(main(args.concurrency, args.worker_id))
@@ -0,0 +1,100 @@
+"""
+Workflow cache
+Bounded LRU of domain workflows in front of the database. Workflows this
+process is executing are pinned: they are the live objects the engine mutates
+and are never evicted or expired.
+"""
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, Optional, Set, Tuple
+
+from services.domain.models import Workflow
+
+class WorkflowCache:
+    """LRU cache with size and age limits whose pinned entries are exempt from both"""
+
+    def __init__(self, max_entries: int = 1000, max_age_seconds: float = 3600):
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_seconds
+        self._entries: "OrderedDict[str, Tuple[float, Workflow]]" = OrderedDict()
+        self._pinned: Set[str] = set()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, workflow_id: str) -> Optional[Workflow]:
+        entry = self._entries.get(workflow_id)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        cached_at, workflow = entry
+        if workflow_id not in self._pinned and time.monotonic() - cached_at > self.max_age_seconds:
+            del self._entries[workflow_id]
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(workflow_id)
+        self.hits += 1
+        return workflow
+
+    def put(self, workflow: Workflow):
+        self._entries[workflow.id] = (time.monotonic(), workflow)
+        self._entries.move_to_end(workflow.id)
+        self._evict()
+
+    def pin(self, workflow_id: str):
+        self._pinned.add(workflow_id)
+
+    def unpin(self, workflow_id: str):
+        self._pinned.discard(workflow_id)
+        self._evict()
+
+    def is_pinned(self, workflow_id: str) -> bool:
+        return workflow_id in self._pinned
+
+    def _evict(self):
+        """Drop least recently used unpinned entries beyond max_entries"""
+        excess = len(self._entries) - self.max_entries
+        if excess <= 0:
+            return
+        for workflow_id in [key for key in self._entries if key not in self._pinned][:excess]:
+            del self._entries[workflow_id]
+            self.evictions += 1
+
+    # Mapping-style access for callers that used the plain dict
+
+    def __getitem__(self, workflow_id: str) -> Workflow:
+        workflow = self.get(workflow_id)
+        if workflow is None:
+            raise KeyError(workflow_id)
+        return workflow
+
+    def __setitem__(self, workflow_id: str, workflow: Workflow):
+        self.put(workflow)
+
+    def __contains__(self, workflow_id: str) -> bool:
+        return workflow_id in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def items(self) -> Iterator[Tuple[str, Workflow]]:
+        """Cached workflows, least recently used first (no recency update)"""
+        return ((workflow_id, workflow) for workflow_id, (_, workflow) in list(self._entries.items()))
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "pinned": len(self._pinned),
+            "max_entries": self.max_entries,
+            "max_age_seconds": self.max_age_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations
+        }
@@ -7,6 +7,7 @@ PM-008 Github integration
 from typing import Optional, Dict, Any
 from services.domain.models import Intent, Workflow, Task
 from services.shared_types import IntentCategory, WorkflowType, WorkflowStatus, TaskType, TaskStatus
+from .workflows import WORKFLOW_DEFINITIONS
 
 class WorkflowFactory:
     """Factory for creating workflows from intents"""
@@ -24,6 +25,8 @@ class WorkflowFactory:
             'create_issue': WorkflowType.CREATE_TICKET,
             'generate_report': WorkflowType.GENERATE_REPORT,
             'review_issue': WorkflowType.REVIEW_ITEM,
+            'create_feature': WorkflowType.CREATE_FEATURE,
+            'analyze_metrics': WorkflowType.ANALYZE_METRICS,
             
             # PM-008: GitHub Issue Analysis mappings
             'analyze_github_issue': WorkflowType.REVIEW_ITEM,
@@ -76,5 +79,14 @@ class WorkflowFactory:
                 status=TaskStatus.PENDING
             )
             workflow.tasks.append(task)
+        elif workflow_type in WORKFLOW_DEFINITIONS:
+            # Multi-step templates; the engine derives task dependencies from
+            # the context keys each task type reads and writes
+            for task_type in WORKFLOW_DEFINITIONS[workflow_type].task_sequence:
+                workflow.tasks.append(Task(
+                    name=task_type.value.replace('_', ' ').title(),
+                    type=task_type,
+                    status=TaskStatus.PENDING
+                ))
 
         return workflow
\ No newline at end of file
@@ -0,0 +1,152 @@
+"""
+Write-Behind Buffer
+Task results and workflow checkpoints are buffered in memory and written in
+batches, so workflow execution does not wait on the database between tasks
+"""
+import asyncio
+import contextvars
+from typing import Any, Dict, Optional
+
+import structlog
+
+from services.database import RepositoryFactory
+from services.domain.models import Task, Workflow
+from .config import WRITE_BEHIND_FLUSH_SECONDS, WRITE_BEHIND_MAX_PENDING
+
+logger = structlog.get_logger()
+
+def task_row(task: Task) -> Dict[str, Any]:
+    """Database columns for a domain task's current state"""
+    return {
+        "status": task.status,
+        "output_data": task.result,
+        "error": task.error,
+        "started_at": task.started_at,
+        "completed_at": task.completed_at,
+        "duration_ms": task.duration_ms,
+        "queue_wait_ms": task.queue_wait_ms,
+        "timings": task.timings,
+        "input_tokens": task.timings.get("input_tokens"),
+        "output_tokens": task.timings.get("output_tokens")
+    }
+
+class WriteBehindBuffer:
+    """
+    Pending task and workflow row updates, flushed in one transaction
+
+    Updates to the same row coalesce: a task keeps only its latest state and
+    a workflow the union of its changed columns. A background flusher writes
+    them every flush_seconds, or sooner once max_pending rows are waiting;
+    callers that need their rows on disk (a workflow finishing, shutdown) call
+    flush(). Updates that fail to write stay buffered for the next flush.
+    Buffered updates are lost if the process dies; recovery then re-runs those
+    tasks, as it does for tasks a crash interrupted.
+    """
+
+    def __init__(self, flush_seconds: float = WRITE_BEHIND_FLUSH_SECONDS,
+                 max_pending: int = WRITE_BEHIND_MAX_PENDING):
+        self.flush_seconds = flush_seconds
+        self.max_pending = max(1, max_pending)
+        self._tasks: Dict[str, Dict[str, Any]] = {}
+        self._workflows: Dict[str, Dict[str, Any]] = {}
+        self._lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._flusher: Optional[asyncio.Task] = None
+        self.flushes = 0
+        self.rows_written = 0
+        self.updates_coalesced = 0
+        self.failures = 0
+
+    @property
+    def enabled(self) -> bool:
+        """False if every update is to be written through immediately"""
+        return self.flush_seconds > 0
+
+    def pending(self) -> int:
+        return len(self._tasks) + len(self._workflows)
+
+    def stage_task(self, task: Task):
+        if task.id in self._tasks:
+            self.updates_coalesced += 1
+        self._tasks[task.id] = task_row(task)
+        self._staged()
+
+    def stage_workflow(self, workflow_id: str, **values):
+        if workflow_id in self._workflows:
+            self.updates_coalesced += 1
+        self._workflows.setdefault(workflow_id, {}).update(values)
+        self._staged()
+
+    def stage_checkpoint(self, workflow: Workflow):
+        self.stage_workflow(workflow.id, context=dict(workflow.context))
+
+    def _staged(self):
+        if not self.enabled:
+            return
+        if self._flusher is None or self._flusher.done():
+            # Started from an empty context: the flusher serves every workflow,
+            # so it must not inherit the staging workflow's deadline or timings
+            self._flusher = contextvars.Context().run(asyncio.create_task, self._run())
+        if self.pending() >= self.max_pending:
+            self._wakeup.set()
+
+    async def flush(self):
+        """Write everything buffered so far; raises if the write fails"""
+        async with self._lock:
+            if not self._tasks and not self._workflows:
+                return
+
+            tasks, self._tasks = self._tasks, {}
+            workflows, self._workflows = self._workflows, {}
+            repos = await RepositoryFactory.get_repositories()
+            try:
+                await repos["tasks"].update_many(tasks)
+                await repos["workflows"].update_many(workflows)
+                await repos["session"].commit()
+            except BaseException:  # Cancelled flushes keep their updates too
+                await repos["session"].rollback()
+                self.failures += 1
+                # Newer updates staged during the attempt take precedence
+                for task_id, values in tasks.items():
+                    self._tasks.setdefault(task_id, values)
+                for workflow_id, values in workflows.items():
+                    self._workflows[workflow_id] = {**values, **self._workflows.get(workflow_id, {})}
+                raise
+            finally:
+                await repos["session"].close()
+
+            self.flushes += 1
+            self.rows_written += len(tasks) + len(workflows)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error("Write-behind flush failed", pending=self.pending(), error=str(e))
+
+    async def stop(self):
+        """Stop the background flusher and write what is left"""
+        if self._flusher:
+            async with self._lock:  # Let a flush in progress finish
+                self._flusher.cancel()
+            await asyncio.gather(self._flusher, return_exceptions=True)
+            self._flusher = None
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error("Final write-behind flush failed, updates lost", pending=self.pending(), error=str(e))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": self.pending(),
+            "flushes": self.flushes,
+            "rows_written": self.rows_written,
+            "updates_coalesced": self.updates_coalesced,
+            "failures": self.failures
+        }
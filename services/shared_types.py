@@ -54,4 +54,5 @@ class TaskStatus(Enum):
     RUNNING = "running"
     COMPLETED = "completed"
     FAILED = "failed"
-    SKIPPED = "skipped"
\ No newline at end of file
+    SKIPPED = "skipped"
+    CANCELLED = "cancelled"
\ No newline at end of file
@@ -0,0 +1,85 @@
+"""
+Deadlines for chains of async calls
+A deadline set with deadline_scope() is visible to everything awaited inside
+it, including tasks it spawns and functions run with asyncio.to_thread, so
+downstream calls can size their own timeouts from the remaining budget.
+"""
+import asyncio
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Awaitable, Optional, TypeVar
+
+T = TypeVar("T")
+
+# Absolute time.monotonic() value the current work must finish by
+_deadline: ContextVar[Optional[float]] = ContextVar("deadline", default=None)
+
+class DeadlineExceeded(asyncio.TimeoutError):
+    """The enclosing deadline passed before the work finished"""
+
+@contextmanager
+def deadline_scope(seconds: Optional[float]):
+    """Run the block with a deadline `seconds` from now; an earlier enclosing deadline still applies"""
+    if seconds is None:
+        yield
+        return
+    deadline = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(deadline if current is None else min(current, deadline))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+def remaining() -> Optional[float]:
+    """Seconds left before the current deadline, or None without one"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return max(0.0, deadline - time.monotonic())
+
+def check_deadline():
+    """Raise DeadlineExceeded if the current deadline has passed"""
+    if remaining() == 0.0:
+        raise DeadlineExceeded("Deadline exceeded")
+
+def effective_timeout(timeout: Optional[float] = None) -> Optional[float]:
+    """The tighter of `timeout` and the time left before the current deadline"""
+    left = remaining()
+    if left is None:
+        return timeout
+    return left if timeout is None else min(timeout, left)
+
+async def with_deadline(awaitable: Awaitable[T], timeout: Optional[float] = None) -> T:
+    """
+    Await with `timeout` bounded by the current deadline
+
+    Raises:
+        DeadlineExceeded: The enclosing deadline ran out first
+        asyncio.TimeoutError: `timeout` itself ran out
+    """
+    try:
+        check_deadline()
+    except DeadlineExceeded:
+        if asyncio.iscoroutine(awaitable):
+            awaitable.close()  # Never started; avoid the "never awaited" warning
+        raise
+    limit = effective_timeout(timeout)
+    if limit is None:
+        return await awaitable
+    try:
+        return await asyncio.wait_for(awaitable, limit)
+    except asyncio.TimeoutError:
+        if remaining() == 0.0:
+            raise DeadlineExceeded("Deadline exceeded")
+        raise
+
+__all__ = [
+    "DeadlineExceeded",
+    "deadline_scope",
+    "remaining",
+    "check_deadline",
+    "effective_timeout",
+    "with_deadline"
+]
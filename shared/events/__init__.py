@@ -2,42 +2,96 @@
 Event Bus for learning signals and system events
 """
 import asyncio
-from typing import Dict, List, Callable
-from collections import defaultdict
+import os
+from typing import Dict, List, Callable, Optional, Set
+from collections import defaultdict, deque
+from contextlib import asynccontextmanager
 from datetime import datetime
 
+# Recent events kept for replay to reconnecting listeners (Last-Event-ID)
+EVENT_HISTORY_SIZE = int(os.getenv("EVENT_HISTORY_SIZE", "1000"))
+
+class EventSubscription:
+    """Queue of events for one listener; overflowed is set if it fell too far behind"""
+
+    def __init__(self, max_queued: int):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queued)
+        self.overflowed = False
+
 class EventBus:
     """Simple event bus for learning signals"""
-    
-    def __init__(self):
+
+    def __init__(self, history_size: int = EVENT_HISTORY_SIZE):
         self.handlers: Dict[str, List[Callable]] = defaultdict(list)
-        self.event_store = []  # Simple in-memory store for now
-        
-    async def emit(self, event_type: str, data: Dict):
-        """Emit an event to all registered handlers"""
+        self.event_store = deque(maxlen=history_size)  # Ring buffer of recent events
+        self.last_id = 0
+        self._subscriptions: Set[EventSubscription] = set()
+
+    async def emit(self, event_type: str, data: Dict, relayed: bool = False):
+        """
+        Emit an event to all registered handlers
+
+        Events get increasing ids. Handlers subscribed to "*" receive every
+        event; relayed marks events re-emitted from another process.
+        """
+        self.last_id += 1
         event = {
+            "id": self.last_id,
             "type": event_type,
             "data": data,
             "timestamp": datetime.now().isoformat()
         }
-        
+        if relayed:
+            event["relayed"] = True
+
         # Store event
         self.event_store.append(event)
-        
+
+        for subscription in list(self._subscriptions):
+            try:
+                subscription.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                subscription.overflowed = True
+                self._subscriptions.discard(subscription)
+
         # Call handlers
-        for handler in self.handlers[event_type]:
+        for handler in self.handlers[event_type] + self.handlers["*"]:
             # Check if handler is async
             if asyncio.iscoroutinefunction(handler):
                 asyncio.create_task(handler(event))
             else:
                 # Call sync handlers directly
                 handler(event)
-    
+
     def subscribe(self, event_type: str, handler: Callable):
-        """Subscribe to events of a specific type"""
+        """Subscribe to events of a specific type ("*" for all)"""
         self.handlers[event_type].append(handler)
 
+    def events_after(self, last_id: int) -> Optional[List[Dict]]:
+        """
+        Stored events with ids above last_id, or None if some of them have
+        already dropped out of the ring buffer or last_id was never issued
+        (e.g. by this bus before a restart)
+        """
+        if last_id == self.last_id:
+            return []
+        if last_id > self.last_id:
+            return None
+        if not self.event_store or self.event_store[0]["id"] > last_id + 1:
+            return None
+        return [event for event in self.event_store if event["id"] > last_id]
+
+    @asynccontextmanager
+    async def listen(self, max_queued: int = 1000):
+        """Receive every event emitted while the block runs through a subscription queue"""
+        subscription = EventSubscription(max_queued)
+        self._subscriptions.add(subscription)
+        try:
+            yield subscription
+        finally:
+            self._subscriptions.discard(subscription)
+
 # Global event bus instance
 event_bus = EventBus()
 
-__all__ = ["EventBus", "event_bus"]
+__all__ = ["EventBus", "EventSubscription", "event_bus"]
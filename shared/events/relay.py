@@ -0,0 +1,96 @@
+"""
+Redis relay for the event bus
+Workflow workers run in their own processes. The relay publishes their events
+to a Redis channel and re-emits them on the API process's bus, so listeners
+there see them too.
+"""
+import asyncio
+import json
+import os
+import uuid
+from typing import Dict, Optional, Tuple
+
+import redis.asyncio as redis
+import structlog
+
+from . import EventBus
+
+logger = structlog.get_logger()
+
+EVENT_CHANNEL = os.getenv("EVENT_RELAY_CHANNEL", "piper:events")
+
+class RedisEventRelay:
+    """Publishes local events with the given prefixes and re-emits events published by other processes"""
+
+    def __init__(self, bus: EventBus, client: redis.Redis, channel: str = EVENT_CHANNEL,
+                 prefixes: Tuple[str, ...] = ("workflow.",)):
+        self.bus = bus
+        self.client = client
+        self.channel = channel
+        self.prefixes = prefixes
+        self.origin = uuid.uuid4().hex  # Recognises this process's own messages
+        self._outbox: asyncio.Queue = asyncio.Queue()
+        self._tasks = []
+
+    @classmethod
+    def from_env(cls, bus: EventBus, **kwargs) -> "RedisEventRelay":
+        client = redis.Redis(
+            host=os.getenv("REDIS_HOST", "localhost"),
+            port=int(os.getenv("REDIS_PORT", "6379")),
+            password=os.getenv("REDIS_PASSWORD") or None
+        )
+        return cls(bus, client, **kwargs)
+
+    def start(self, publish: bool = True, receive: bool = True):
+        """Start relaying in the background"""
+        if publish:
+            self.bus.subscribe("*", self._enqueue)
+            self._tasks.append(asyncio.create_task(self._publish_loop()))
+        if receive:
+            self._tasks.append(asyncio.create_task(self._receive_loop()))
+
+    async def stop(self, drain_seconds: float = 2.0):
+        """Stop relaying, first giving queued events a moment to go out"""
+        try:
+            await asyncio.wait_for(self._outbox.join(), drain_seconds)
+        except asyncio.TimeoutError:
+            logger.warning("Event relay stopped with unsent events", pending=self._outbox.qsize())
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await self.client.aclose()
+
+    def _enqueue(self, event: Dict):
+        if not event.get("relayed") and event["type"].startswith(self.prefixes):
+            self._outbox.put_nowait(event)
+
+    async def _publish_loop(self):
+        # One sender keeps events in emission order
+        while True:
+            event = await self._outbox.get()
+            message = json.dumps({"origin": self.origin, "type": event["type"], "data": event["data"]}, default=str)
+            try:
+                await self.client.publish(self.channel, message)
+            except Exception as e:
+                logger.warning("Event relay publish failed", event_type=event["type"], error=str(e))
+            finally:
+                self._outbox.task_done()
+
+    async def _receive_loop(self):
+        while True:
+            try:
+                pubsub = self.client.pubsub()
+                await pubsub.subscribe(self.channel)
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    payload = json.loads(message["data"])
+                    if payload.get("origin") == self.origin:
+                        continue
+                    await self.bus.emit(payload["type"], payload["data"], relayed=True)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Event relay subscription failed, retrying", error=str(e))
+                await asyncio.sleep(1)
@@ -0,0 +1,84 @@
+"""
+Timing collection for units of work
+collect_timings() installs a collector for the current context. Calls
+instrumented with timed() or record_tokens() anywhere below it, including
+spawned tasks and asyncio.to_thread functions, add to that collector.
+Without a collector, they do nothing.
+"""
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, Optional
+
+class TimingCollector:
+    """Milliseconds and call counts per category (llm, db, github, ...) plus token usage"""
+
+    def __init__(self):
+        self.milliseconds: Dict[str, float] = defaultdict(float)
+        self.calls: Dict[str, int] = defaultdict(int)
+        self.input_tokens = 0
+        self.output_tokens = 0
+
+    def add(self, category: str, milliseconds: float):
+        self.milliseconds[category] += milliseconds
+        self.calls[category] += 1
+
+    def add_tokens(self, input_tokens: int, output_tokens: int):
+        self.input_tokens += input_tokens
+        self.output_tokens += output_tokens
+
+    def to_dict(self) -> Dict[str, Any]:
+        summary: Dict[str, Any] = {}
+        for category in sorted(self.calls):
+            summary[f"{category}_ms"] = round(self.milliseconds[category], 2)
+            summary[f"{category}_calls"] = self.calls[category]
+        if self.input_tokens or self.output_tokens:
+            summary["input_tokens"] = self.input_tokens
+            summary["output_tokens"] = self.output_tokens
+        return summary
+
+_collector: ContextVar[Optional[TimingCollector]] = ContextVar("timing_collector", default=None)
+
+@contextmanager
+def collect_timings() -> Iterator[TimingCollector]:
+    """Collect timings recorded inside the block"""
+    collector = TimingCollector()
+    token = _collector.set(collector)
+    try:
+        yield collector
+    finally:
+        _collector.reset(token)
+
+@contextmanager
+def timed(category: str):
+    """Add the block's wall time to `category` of the current collector"""
+    collector = _collector.get()
+    if collector is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        collector.add(category, (time.perf_counter() - start) * 1000)
+
+def record_duration(category: str, milliseconds: float):
+    """Add a duration measured elsewhere (e.g. by an event hook) to the current collector"""
+    collector = _collector.get()
+    if collector is not None:
+        collector.add(category, milliseconds)
+
+def record_tokens(input_tokens: Optional[int], output_tokens: Optional[int]):
+    """Add LLM token usage to the current collector"""
+    collector = _collector.get()
+    if collector is not None:
+        collector.add_tokens(input_tokens or 0, output_tokens or 0)
+
+__all__ = [
+    "TimingCollector",
+    "collect_timings",
+    "timed",
+    "record_duration",
+    "record_tokens"
+]
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Tests for database statement timing, against an in-memory SQLite engine
+"""
+import sys
+
+sys.path.append('.')
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import OperationalError
+
+from services.database.connection import (
+    _start_statement_timer, _stop_statement_timer, _stop_failed_statement_timer
+)
+from shared.timings import collect_timings
+
+def timed_engine():
+    engine = create_engine("sqlite://")
+    event.listen(engine, "before_cursor_execute", _start_statement_timer)
+    event.listen(engine, "after_cursor_execute", _stop_statement_timer)
+    event.listen(engine, "handle_error", _stop_failed_statement_timer)
+    return engine
+
+def test_failed_statement_leaves_no_timer():
+    """A statement that raises is timed and does not leave its start time behind"""
+    print("🧪 Testing statement timers")
+    engine = timed_engine()
+    with engine.connect() as conn, collect_timings() as timings:
+        conn.execute(text("SELECT 1"))
+        try:
+            conn.execute(text("SELECT * FROM missing_table"))
+        except OperationalError:
+            pass
+        else:
+            raise AssertionError("The statement should have failed")
+        conn.execute(text("SELECT 2"))
+
+        assert conn.info["statement_started"] == {}
+    assert timings.calls["db"] == 3
+    print("✅ Failed statements are timed and cleaned up")
+
+if __name__ == "__main__":
+    test_failed_statement_leaves_no_timer()
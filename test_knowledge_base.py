@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Tests for the knowledge base: near-duplicate handling on delete, lexical
+search and result fusion, the search result cache and the quantized vector
+index
+"""
+import asyncio
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.append('.')
+os.environ.setdefault("ANONYMIZED_TELEMETRY", "False")
+
+import numpy as np
+from chromadb import EmbeddingFunction
+
+from services.knowledge_graph import BM25Index, DocumentIngester, QuantizedVectorIndex
+from services.knowledge_graph.config import RRF_K, SearchMode
+from services.knowledge_graph.quantized_index import exact_distances
+
+BASE_TEXT = " ".join(f"roadmap{i}" for i in range(300))
+
+class HashingEmbeddingFunction(EmbeddingFunction):
+    """Deterministic local embeddings (hashed words), so no OpenAI calls are made"""
+
+    def __call__(self, input):
+        vectors = np.zeros((len(input), 64), dtype=np.float32)
+        for row, text in enumerate(input):
+            for word in text.lower().split():
+                vectors[row, int(hashlib.md5(word.encode()).hexdigest(), 16) % 64] += 1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return (vectors / norms).tolist()
+
+def new_ingester(path: str) -> DocumentIngester:
+    ingester = DocumentIngester(chroma_path=path, embedding_function=HashingEmbeddingFunction(),
+                                chunk_size_words=1000)
+    ingester.relationship_analysis = "local"
+    return ingester
+
+async def check_delete_canonical_keeps_duplicate_text(path: str):
+    ingester = new_ingester(path)
+
+    # The first copy is the closest, so it is the one promoted
+    canonical = await ingester.ingest_text(BASE_TEXT, {"title": "Canonical"})
+    first = await ingester.ingest_text(BASE_TEXT.replace("roadmap100 ", "pricing100 "), {"title": "First copy"})
+    second = await ingester.ingest_text(BASE_TEXT.replace("roadmap200 ", "billing200 "), {"title": "Second copy"})
+    assert first["deduplication"]["duplicates_skipped"] == 1
+    assert second["deduplication"]["duplicates_skipped"] == 1
+    print("✅ Copies skipped as near-duplicates")
+
+    assert ingester.delete_document(canonical["document_id"]) == 1
+    for mode in ("lexical", "vector"):
+        results = await ingester.search("pricing100", n_results=1, mode=mode)
+        assert results and "pricing100" in results[0]["content"], mode
+        assert results[0]["metadata"]["document_id"] == first["document_id"], mode
+    print("✅ Duplicate text still found after deleting the canonical document")
+
+    # The other copy now refers to the promoted chunk, so it survives the next delete too
+    assert ingester.metadata_index.duplicate_count() == 1
+    assert ingester.delete_document(first["document_id"]) == 1
+    results = await ingester.search("billing200", n_results=1, mode="lexical")
+    assert results and results[0]["metadata"]["document_id"] == second["document_id"]
+    assert ingester.metadata_index.duplicate_count() == 0
+    print("✅ Remaining duplicates re-pointed at the promoted chunk")
+
+def test_delete_canonical_keeps_duplicate_text():
+    """Delete the canonical document and search for its duplicates' text"""
+    print("🧪 Testing near-duplicate promotion on delete")
+    path = tempfile.mkdtemp(prefix="knowledge-test-")
+    try:
+        asyncio.run(check_delete_canonical_keeps_duplicate_text(path))
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+def test_bm25_ranking_and_removal():
+    """BM25 favours rarer terms and shorter documents; removal cleans up postings"""
+    print("🧪 Testing the lexical index")
+    index = BM25Index()
+    index.add("pricing", "pricing tiers for the enterprise plan")
+    index.add("roadmap", "roadmap for the enterprise plan and more roadmap notes")
+    index.add("sso", "enterprise sso")
+
+    # "pricing" is in one document, "enterprise" in all of them
+    assert [doc_id for doc_id, _ in index.search("enterprise pricing")][0] == "pricing"
+    # Equal term frequency, so the shorter document scores higher
+    ranked = [doc_id for doc_id, _ in index.search("enterprise")]
+    assert ranked == ["sso", "pricing", "roadmap"], ranked
+    print("✅ BM25 ranks rare terms and short documents first")
+
+    assert index.remove("pricing") and not index.remove("pricing")
+    assert "pricing" not in index.postings and "tiers" not in index.postings
+    assert set(index.postings["enterprise"]) == {"roadmap", "sso"}
+    assert "pricing" not in index.doc_terms
+    assert index.total_length == sum(index.doc_lengths.values())
+    assert index.search("pricing") == []
+
+    # Re-adding a document replaces its old terms
+    index.add("roadmap", "quarterly roadmap")
+    assert "notes" not in index.postings and "plan" not in index.postings
+    print("✅ Removed documents leave no postings behind")
+
+def test_bm25_delayed_save():
+    """Changes are saved once after the delay, or at once by flush"""
+    path = tempfile.mkdtemp(prefix="lexical-test-")
+    try:
+        index_path = os.path.join(path, "lexical.json")
+        index = BM25Index(index_path)
+        index.add("pricing", "pricing tiers")
+        index.save_later(0.05)
+        index.add("sso", "sso login")  # Goes into the same save
+        assert not os.path.exists(index_path)
+        time.sleep(0.3)
+        assert set(BM25Index(index_path).doc_lengths) == {"pricing", "sso"}
+
+        index.remove("sso")
+        index.save_later(60)
+        index.flush()
+        assert set(BM25Index(index_path).doc_lengths) == {"pricing"}
+        print("✅ Delayed saves write pending changes")
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+def test_reciprocal_rank_fusion():
+    """Hybrid search merges the vector and lexical rankings by reciprocal rank"""
+    print("🧪 Testing result fusion")
+    path = tempfile.mkdtemp(prefix="knowledge-test-")
+    try:
+        ingester = new_ingester(path)
+
+        def hit(chunk_id, **values):
+            return {"id": chunk_id, "content": chunk_id, "metadata": {}, **values}
+
+        vector_hits = [hit("a", distance=0.1), hit("b", distance=0.2)]
+        lexical_hits = [hit("b", lexical_score=5.0), hit("c", lexical_score=3.0)]
+        results = ingester._fuse_results("pricing", SearchMode.HYBRID, vector_hits, lexical_hits)
+
+        # Found by both retrievers beats first place in either one
+        assert [result["id"] for result in results] == ["b", "a", "c"]
+        b, a, c = results
+        assert (b["vector_rank"], b["lexical_rank"], b["distance"]) == (2, 1, 0.2)
+        assert c["vector_rank"] is None and c["distance"] is None and c["lexical_score"] == 3.0
+        expected = (1 / (RRF_K + 2) + 1 / (RRF_K + 1)) / (1 / (RRF_K + 1))
+        assert abs(b["combined_score"] / a["combined_score"] - expected) < 1e-9
+        print("✅ Reciprocal rank fusion merges both rankings")
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+async def check_cached_search_invalidated(path: str):
+    ingester = new_ingester(path)
+    pricing = await ingester.ingest_text("pricing tiers for the enterprise plan", {"title": "Pricing"})
+    await ingester.ingest_text("sso login for enterprise customers", {"title": "SSO"})
+
+    def document_ids(results):
+        return {result["metadata"]["document_id"] for result in results}
+
+    first = await ingester.search("pricing", n_results=5, mode="lexical")
+    again = await ingester.search("Pricing ", n_results=5, mode="lexical")
+    assert document_ids(first) == document_ids(again) == {pricing["document_id"]}
+    assert ingester.search_cache.stats()["hits"] == 1
+    print("✅ Repeated query served from the cache")
+
+    assert ingester.delete_document(pricing["document_id"]) == 1
+    after_delete = await ingester.search("pricing", n_results=5, mode="lexical")
+    assert after_delete == []
+    stats = ingester.search_cache.stats()
+    assert stats["hits"] == 1 and stats["invalidations"] == 1
+    print("✅ Cached results dropped after the document is deleted")
+
+    # Ingesting invalidates the cached empty result too
+    replacement = await ingester.ingest_text("new pricing for teams", {"title": "Team pricing"})
+    after_ingest = await ingester.search("pricing", n_results=5, mode="lexical")
+    assert document_ids(after_ingest) == {replacement["document_id"]}
+    assert ingester.search_cache.stats()["invalidations"] == 2
+    print("✅ Cached results dropped after an ingest")
+
+def test_cached_search_invalidated():
+    """A cached query is not served after a delete or ingest changes its results"""
+    print("🧪 Testing search cache invalidation")
+    path = tempfile.mkdtemp(prefix="knowledge-test-")
+    try:
+        asyncio.run(check_cached_search_invalidated(path))
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+def test_quantized_index_stores_codes_only():
+    """The default quantized index keeps no float vectors and still finds exact neighbours"""
+    print("🧪 Testing the quantized index storage")
+    path = tempfile.mkdtemp(prefix="quantized-test-")
+    try:
+        vectors = np.random.default_rng(0).normal(size=(500, 32)).astype(np.float32)
+        ids = [f"chunk{i}" for i in range(len(vectors))]
+        index = QuantizedVectorIndex(path, "test", space="cosine")
+        index.add(ids=ids, documents=ids, embeddings=vectors.tolist())
+
+        assert not index.rescore
+        assert not [name for name in os.listdir(path) if name.startswith("vectors")]
+        assert index.query([vectors[7].tolist()], n_results=1)["ids"] == [["chunk7"]]
+
+        queries = vectors[:20]
+        distances = exact_distances("cosine", vectors, queries)
+        exact_ids = [[ids[row] for row in np.argsort(distances[:, q])[:11]] for q in range(len(queries))]
+        report = index.recall_report(queries, k=10, exact_ids=exact_ids, query_ids=ids[:20])
+        assert report["recall_quantized"] >= 0.9 and report["recall_rescored"] is None
+        assert report["bytes_per_vector"] == {"int8_codes": 40, "float32_rescore": 0}
+        assert report["bytes_on_disk"] == 500 * 40
+        print("✅ Quantized index stores only codes and keeps recall")
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+if __name__ == "__main__":
+    test_delete_canonical_keeps_duplicate_text()
+    test_bm25_ranking_and_removal()
+    test_bm25_delayed_save()
+    test_reciprocal_rank_fusion()
+    test_cached_search_invalidated()
+    test_quantized_index_stores_codes_only()
@@ -0,0 +1,401 @@
+#!/usr/bin/env python3
+"""
+Tests for workflow execution: task graph scheduling over the domain objects,
+with the database replaced by in-memory repositories
+"""
+import asyncio
+import os
+import sys
+from contextlib import contextmanager
+
+from sqlalchemy.exc import OperationalError
+
+sys.path.append('.')
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("GITHUB_TOKEN", "test")
+
+from services.database import RepositoryFactory
+from services.domain.models import Intent, Task, Workflow
+from services.orchestration.engine import OrchestrationEngine, TaskResult
+from services.orchestration.workflow_factory import WorkflowFactory
+from services.orchestration.write_behind import WriteBehindBuffer
+from services.shared_types import IntentCategory, TaskStatus, TaskType, WorkflowStatus, WorkflowType
+from shared.deadlines import deadline_scope, remaining
+
+class FakeSession:
+    async def commit(self):
+        pass
+
+    async def rollback(self):
+        pass
+
+    async def close(self):
+        pass
+
+class FakeRepository:
+    """Accepts the writes the engine makes and remembers them"""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    async def get_domain(self, workflow_id):
+        return None  # Executions in these tests are served from the engine's cache
+
+    async def update_status(self, workflow_id, status, **values):
+        self.rows.setdefault(workflow_id, {}).update(status=status, **values)
+
+    async def update_many(self, updates):
+        for row_id, values in updates.items():
+            self.rows.setdefault(row_id, {}).update(values)
+
+@contextmanager
+def fake_database():
+    """Route RepositoryFactory to in-memory repositories; yields the written rows"""
+    rows = {}
+
+    async def get_repositories():
+        return {"workflows": FakeRepository(rows), "tasks": FakeRepository(rows), "session": FakeSession()}
+
+    original = RepositoryFactory.__dict__["get_repositories"]
+    RepositoryFactory.get_repositories = staticmethod(get_repositories)
+    try:
+        yield rows
+    finally:
+        RepositoryFactory.get_repositories = original
+
+def new_engine() -> OrchestrationEngine:
+    engine = OrchestrationEngine()
+    engine.workflow_deadline = None
+    return engine
+
+def recording_handler(log, output_data, delay=0.05, success=True):
+    """Handler that records when it ran, alongside the other handlers"""
+    async def handler(workflow, task):
+        log.append(("start", task.type))
+        await asyncio.sleep(delay)
+        log.append(("end", task.type))
+        if not success:
+            return TaskResult(success=False, error=f"{task.type.value} failed")
+        return TaskResult(success=True, output_data=output_data)
+    return handler
+
+def feature_handlers(log, overrides=None):
+    """Handlers for the CREATE_FEATURE task types; none reach an LLM or the database"""
+    handlers = {
+        TaskType.ANALYZE_REQUEST: recording_handler(log, {"analysis": "a"}),
+        TaskType.EXTRACT_REQUIREMENTS: recording_handler(log, {"requirements": "r"}),
+        TaskType.IDENTIFY_DEPENDENCIES: recording_handler(log, {"dependencies": []}),
+        TaskType.CREATE_WORK_ITEM: recording_handler(log, {"work_item_id": 1, "title": "t"}),
+        TaskType.GITHUB_CREATE_ISSUE: recording_handler(log, {"placeholder": True}),
+        TaskType.NOTIFY_STAKEHOLDERS: recording_handler(log, {"notified": True}),
+    }
+    handlers.update(overrides or {})
+    return handlers
+
+async def create_workflow(engine: OrchestrationEngine, action: str) -> Workflow:
+    intent = Intent(category=IntentCategory.EXECUTION, action=action, context={"original_message": "Add SSO"})
+    workflow = await WorkflowFactory().create_from_intent(intent)
+    engine.workflows.put(workflow)
+    return workflow
+
+def position(log, event, task_type):
+    return log.index((event, task_type))
+
+async def check_dependency_order(rows):
+    engine = new_engine()
+    log = []
+    engine.task_handlers.update(feature_handlers(log))
+    workflow = await create_workflow(engine, "create_feature")
+
+    result = await engine.execute_workflow(workflow.id)
+
+    assert result["status"] == WorkflowStatus.COMPLETED.value
+    assert position(log, "end", TaskType.ANALYZE_REQUEST) < position(log, "start", TaskType.EXTRACT_REQUIREMENTS)
+    for task_type in (TaskType.IDENTIFY_DEPENDENCIES, TaskType.CREATE_WORK_ITEM):
+        assert position(log, "end", TaskType.EXTRACT_REQUIREMENTS) < position(log, "start", task_type)
+    # Both read only the requirements, so they overlap
+    assert position(log, "start", TaskType.CREATE_WORK_ITEM) < position(log, "end", TaskType.IDENTIFY_DEPENDENCIES)
+    # GITHUB_CREATE_ISSUE declares no inputs, so it waits for every earlier task
+    for task_type in (TaskType.IDENTIFY_DEPENDENCIES, TaskType.CREATE_WORK_ITEM):
+        assert position(log, "end", task_type) < position(log, "start", TaskType.GITHUB_CREATE_ISSUE)
+    assert workflow.context["work_item_id"] == 1 and workflow.context["notified"] is True
+    print("✅ Tasks start after the tasks they depend on")
+
+async def check_concurrency_limit(rows):
+    engine = new_engine()
+    engine.max_concurrent_tasks = 2
+    running, peak = 0, 0
+
+    async def counting_handler(workflow, task):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.05)
+        running -= 1
+        return TaskResult(success=True, output_data={"notified": True})
+
+    engine.task_handlers[TaskType.NOTIFY_STAKEHOLDERS] = counting_handler
+    tasks = [Task(name=f"Notify {i}", type=TaskType.NOTIFY_STAKEHOLDERS) for i in range(5)]
+    workflow = Workflow(type=WorkflowType.CREATE_TASK, tasks=tasks, context={"requirements": "r"})
+    engine.workflows.put(workflow)
+
+    result = await engine.execute_workflow(workflow.id)
+
+    assert result["status"] == WorkflowStatus.COMPLETED.value
+    assert peak == 2, peak
+    print("✅ No more than max_concurrent_tasks run at once")
+
+async def check_failed_task_fails_workflow(rows):
+    engine = new_engine()
+    log = []
+    engine.task_handlers.update(feature_handlers(
+        log, {TaskType.EXTRACT_REQUIREMENTS: recording_handler(log, {}, success=False)}
+    ))
+    workflow = await create_workflow(engine, "create_feature")
+
+    result = await engine.execute_workflow(workflow.id)
+
+    assert result["status"] == WorkflowStatus.FAILED.value
+    assert result["error"] == "extract_requirements failed"
+    assert rows[workflow.id]["status"] == WorkflowStatus.FAILED
+    statuses = {task.type: task.status for task in workflow.tasks}
+    assert statuses[TaskType.ANALYZE_REQUEST] == TaskStatus.COMPLETED
+    assert statuses[TaskType.EXTRACT_REQUIREMENTS] == TaskStatus.FAILED
+    # Nothing starts after the failure
+    assert ("start", TaskType.IDENTIFY_DEPENDENCIES) not in log
+    assert statuses[TaskType.NOTIFY_STAKEHOLDERS] == TaskStatus.PENDING
+    print("✅ A failed task fails the workflow and stops scheduling")
+
+async def check_resume_keeps_completed_tasks(rows):
+    engine = new_engine()
+    log = []
+    engine.task_handlers.update(feature_handlers(log))
+    workflow = await create_workflow(engine, "create_feature")
+
+    # As left by a worker that crashed during the third task
+    analyze, extract, dependencies = workflow.tasks[:3]
+    analyze.status = extract.status = TaskStatus.COMPLETED
+    dependencies.status = TaskStatus.RUNNING
+    workflow.context.update(analysis="earlier analysis", requirements="earlier requirements")
+    workflow.status = WorkflowStatus.RUNNING
+
+    result = await engine.execute_workflow(workflow.id)
+
+    assert result["status"] == WorkflowStatus.COMPLETED.value
+    started = [task_type for event, task_type in log if event == "start"]
+    assert TaskType.ANALYZE_REQUEST not in started and TaskType.EXTRACT_REQUIREMENTS not in started
+    assert TaskType.IDENTIFY_DEPENDENCIES in started
+    assert workflow.context["requirements"] == "earlier requirements"
+    print("✅ A resumed workflow keeps its completed tasks")
+
+async def check_placeholder_workflows(rows):
+    engine = new_engine()
+    log = []
+    engine.task_handlers[TaskType.ANALYZE_REQUEST] = recording_handler(log, {"analysis": "a"})
+
+    for action, workflow_type in (("create_feature", WorkflowType.CREATE_FEATURE),
+                                  ("analyze_metrics", WorkflowType.ANALYZE_METRICS)):
+        workflow = await create_workflow(engine, action)
+        assert workflow.type == workflow_type
+        assert len(workflow.tasks) > 1
+        if workflow_type == WorkflowType.CREATE_FEATURE:
+            # Only the LLM and work item steps need stand-ins
+            engine.task_handlers.update({
+                TaskType.EXTRACT_REQUIREMENTS: recording_handler(log, {"requirements": "r"}),
+                TaskType.CREATE_WORK_ITEM: recording_handler(log, {"work_item_id": 1, "title": "t"}),
+            })
+
+        result = await engine.execute_workflow(workflow.id)
+
+        assert result["status"] == WorkflowStatus.COMPLETED.value, result
+        placeholders = [task for task in workflow.tasks
+                        if engine.task_handlers[task.type] == engine._placeholder_handler]
+        assert placeholders
+        assert all(task.result == {"placeholder": True} for task in placeholders)
+    print("✅ Workflow templates with placeholder steps run to completion")
+
+async def check_database_error_is_raised(rows):
+    engine = new_engine()
+    log = []
+    engine.task_handlers.update(feature_handlers(log))
+    workflow = await create_workflow(engine, "create_feature")
+
+    get_repositories = RepositoryFactory.get_repositories
+
+    async def disconnected_repositories():
+        repos = await get_repositories()
+
+        async def update_status(workflow_id, status, **values):
+            if status == WorkflowStatus.COMPLETED:
+                raise OperationalError("UPDATE workflows", {}, ConnectionError("connection lost"))
+            await FakeRepository(rows).update_status(workflow_id, status, **values)
+        repos["workflows"].update_status = update_status
+        return repos
+
+    RepositoryFactory.get_repositories = staticmethod(disconnected_repositories)
+    try:
+        await engine.execute_workflow(workflow.id)
+    except OperationalError:
+        pass
+    else:
+        raise AssertionError("A database error should reach the worker for a retry")
+    finally:
+        RepositoryFactory.get_repositories = staticmethod(get_repositories)
+    assert rows[workflow.id]["status"] == WorkflowStatus.RUNNING
+
+    # The retry keeps the completed tasks and finishes the workflow
+    log.clear()
+    result = await engine.execute_workflow(workflow.id)
+    assert result["status"] == WorkflowStatus.COMPLETED.value
+    assert not log
+    assert rows[workflow.id]["status"] == WorkflowStatus.COMPLETED
+    print("✅ Database errors are raised for the worker to retry")
+
+@contextmanager
+def failing_task_writes():
+    """Make writes of task rows fail, as if the database rejected them"""
+    get_repositories = RepositoryFactory.get_repositories
+
+    async def broken_repositories():
+        repos = await get_repositories()
+
+        async def update_many(updates):
+            raise RuntimeError("database rejected the update")
+        repos["tasks"].update_many = update_many
+        return repos
+
+    RepositoryFactory.get_repositories = staticmethod(broken_repositories)
+    try:
+        yield
+    finally:
+        RepositoryFactory.get_repositories = staticmethod(get_repositories)
+
+async def check_write_behind_coalescing(rows):
+    writes = WriteBehindBuffer(flush_seconds=10)
+    task = Task(name="Notify", type=TaskType.NOTIFY_STAKEHOLDERS)
+    task.status = TaskStatus.RUNNING
+    writes.stage_task(task)
+    task.status = TaskStatus.COMPLETED
+    writes.stage_task(task)
+    writes.stage_workflow("wf-1", context={"a": 1})
+    writes.stage_workflow("wf-1", error="e")
+
+    assert writes.pending() == 2 and writes.updates_coalesced == 2
+    await writes.flush()
+    assert rows[task.id]["status"] == TaskStatus.COMPLETED
+    assert rows["wf-1"] == {"context": {"a": 1}, "error": "e"}
+    assert writes.stats()["rows_written"] == 2 and writes.pending() == 0
+    await writes.stop()
+    print("✅ Buffered updates to a row coalesce into one write")
+
+async def check_write_behind_flush_failure(rows):
+    writes = WriteBehindBuffer(flush_seconds=10)
+    task = Task(name="Notify", type=TaskType.NOTIFY_STAKEHOLDERS)
+    task.error = "older"
+    writes.stage_task(task)
+
+    with failing_task_writes():
+        try:
+            await writes.flush()
+        except RuntimeError:
+            pass
+        else:
+            raise AssertionError("A failed flush should raise")
+    assert writes.pending() == 1 and writes.failures == 1
+    assert task.id not in rows
+
+    # The update staged after the failure wins over the one kept from it
+    task.error = "newer"
+    writes.stage_task(task)
+    await writes.stop()
+    assert rows[task.id]["error"] == "newer" and writes.pending() == 0
+    print("✅ A failed flush keeps its updates for the next one")
+
+async def check_failed_flush_holds_final_status(rows):
+    engine = new_engine()
+    log = []
+    engine.task_handlers.update(feature_handlers(log))
+    workflow = await create_workflow(engine, "create_feature")
+
+    with failing_task_writes():
+        try:
+            await engine.execute_workflow(workflow.id)
+        except RuntimeError:
+            pass
+        else:
+            raise AssertionError("A failed flush should fail the execution")
+        # The final status is not committed over task rows that were never written
+        assert rows[workflow.id]["status"] == WorkflowStatus.RUNNING
+        assert workflow.status == WorkflowStatus.RUNNING
+        assert engine.writes.pending() > 0
+
+    await engine.writes.stop()
+    assert all(rows[task.id]["status"] == TaskStatus.COMPLETED for task in workflow.tasks)
+    print("✅ A failed flush holds back the workflow's final status")
+
+async def check_flusher_context(rows):
+    writes = WriteBehindBuffer(flush_seconds=0.01)
+    seen = []
+    flush = writes.flush
+
+    async def recording_flush():
+        seen.append(remaining())
+        await flush()
+    writes.flush = recording_flush
+
+    # Staged from inside a workflow's deadline
+    with deadline_scope(0.5):
+        writes.stage_workflow("wf-1", context={"a": 1})
+    await asyncio.sleep(0.05)
+    await writes.stop()
+
+    assert seen and all(deadline is None for deadline in seen), seen
+    assert rows["wf-1"] == {"context": {"a": 1}}
+    print("✅ The background flusher does not inherit a workflow's deadline")
+
+def run_with_fake_database(check):
+    with fake_database() as rows:
+        asyncio.run(check(rows))
+
+def test_dependency_order():
+    run_with_fake_database(check_dependency_order)
+
+def test_concurrency_limit():
+    run_with_fake_database(check_concurrency_limit)
+
+def test_failed_task_fails_workflow():
+    run_with_fake_database(check_failed_task_fails_workflow)
+
+def test_resume_keeps_completed_tasks():
+    run_with_fake_database(check_resume_keeps_completed_tasks)
+
+def test_placeholder_workflows():
+    run_with_fake_database(check_placeholder_workflows)
+
+def test_database_error_is_raised():
+    run_with_fake_database(check_database_error_is_raised)
+
+def test_write_behind_coalescing():
+    run_with_fake_database(check_write_behind_coalescing)
+
+def test_write_behind_flush_failure():
+    run_with_fake_database(check_write_behind_flush_failure)
+
+def test_failed_flush_holds_final_status():
+    run_with_fake_database(check_failed_flush_holds_final_status)
+
+def test_flusher_context():
+    run_with_fake_database(check_flusher_context)
+
+if __name__ == "__main__":
+    print("🧪 Testing workflow task graph execution")
+    test_dependency_order()
+    test_concurrency_limit()
+    test_failed_task_fails_workflow()
+    test_resume_keeps_completed_tasks()
+    test_placeholder_workflows()
+    test_database_error_is_raised()
+    test_write_behind_coalescing()
+    test_write_behind_flush_failure()
+    test_failed_flush_holds_final_status()
+    test_flusher_context()
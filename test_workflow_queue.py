@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Tests for the workflow queue's lease semantics, against the in-memory queue
+"""
+import asyncio
+import os
+import sys
+
+sys.path.append('.')
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("GITHUB_TOKEN", "test")
+
+from services.database import RepositoryFactory
+from services.orchestration.job_queue import InMemoryWorkflowQueue, WorkflowQueue
+from services.orchestration.worker import WorkflowWorker
+
+class FakeSession:
+    async def close(self):
+        pass
+
+class FakeWorkflowRepository:
+    def __init__(self, interrupted):
+        self.interrupted = interrupted
+
+    async def list_interrupted_ids(self, created_before, without_active_job=True, limit=100):
+        return list(self.interrupted)
+
+async def check_lease_and_complete():
+    queue = InMemoryWorkflowQueue()
+    job_id = await queue.enqueue("wf-1")
+    assert await queue.enqueue("wf-1") == job_id  # One job per workflow
+
+    job = await queue.lease("worker-a")
+    assert job.id == job_id and job.workflow_id == "wf-1" and job.attempts == 1
+    assert await queue.lease("worker-b") is None  # Leased jobs are not handed out twice
+
+    await queue.complete(job, "worker-a")
+    assert await queue.stats() == {"done": 1}
+    assert await queue.lease("worker-b") is None
+    print("✅ A leased job belongs to one worker until it completes")
+
+async def check_heartbeat():
+    queue = InMemoryWorkflowQueue()
+    await queue.enqueue("wf-1")
+    job = await queue.lease("worker-a", lease_seconds=0.2)
+
+    await asyncio.sleep(0.1)
+    assert await queue.heartbeat(job, "worker-a", lease_seconds=0.2)
+    assert not await queue.heartbeat(job, "worker-b")
+
+    # Past the original expiry, but the heartbeat extended the lease
+    await asyncio.sleep(0.15)
+    assert await queue.lease("worker-b") is None
+    print("✅ Heartbeats extend the lease for its owner only")
+
+async def check_lease_expiry():
+    queue = InMemoryWorkflowQueue()
+    await queue.enqueue("wf-1")
+    crashed = await queue.lease("worker-a", lease_seconds=0.05)
+
+    await asyncio.sleep(0.1)
+    job = await queue.lease("worker-b")
+    assert job.id == crashed.id and job.attempts == 2
+
+    # The first worker has lost the job
+    assert not await queue.heartbeat(crashed, "worker-a")
+    await queue.complete(crashed, "worker-a")
+    assert await queue.fail(crashed, "worker-a", "late") is None
+    assert await queue.stats() == {"leased": 1}
+    print("✅ An expired lease is taken over by another worker")
+
+async def check_retry_limit():
+    queue = InMemoryWorkflowQueue(max_attempts=2, retry_delay_seconds=0)
+    await queue.enqueue("wf-1")
+
+    job = await queue.lease("worker-a")
+    assert await queue.fail(job, "worker-a", "boom") == "queued"
+    job = await queue.lease("worker-a")
+    assert job.attempts == 2
+    assert await queue.fail(job, "worker-a", "boom again") == "failed"
+    assert await queue.lease("worker-a") is None
+
+    # A lease that expires on the last attempt gives the job up too
+    await queue.enqueue("wf-2")
+    await queue.lease("worker-a", lease_seconds=0.05)
+    await asyncio.sleep(0.1)
+    job = await queue.lease("worker-b", lease_seconds=0.05)
+    assert job.attempts == 2
+    await asyncio.sleep(0.1)
+    assert await queue.lease("worker-c") is None
+    assert queue.jobs[job.id].status == "failed"
+    assert queue.jobs[job.id].last_error == "Worker lease expired"
+    print("✅ Jobs are given up after max_attempts")
+
+async def check_recover():
+    queue = InMemoryWorkflowQueue(max_attempts=1)
+    await queue.enqueue("wf-queued")
+    await queue.enqueue("wf-given-up")
+    job = await queue.lease("worker-a")
+    while job.workflow_id != "wf-given-up":
+        await queue.complete(job, "worker-a")
+        await queue.enqueue(job.workflow_id)
+        job = await queue.lease("worker-a")
+    await queue.fail(job, "worker-a", "boom")
+
+    interrupted = ["wf-orphaned", "wf-queued", "wf-given-up"]
+
+    async def get_repositories():
+        return {"workflows": FakeWorkflowRepository(interrupted), "session": FakeSession()}
+
+    original = RepositoryFactory.__dict__["get_repositories"]
+    RepositoryFactory.get_repositories = staticmethod(get_repositories)
+    try:
+        recovered = await queue.recover(grace_seconds=0)
+    finally:
+        RepositoryFactory.get_repositories = original
+
+    # Workflows with a queued job or one that was given up are left alone
+    assert recovered == ["wf-orphaned"], recovered
+    assert (await queue.lease("worker-b")).workflow_id == "wf-orphaned"
+    print("✅ Recovery requeues workflows nothing is working on")
+
+class DisconnectedEngine:
+    """Engine whose executions keep losing the database connection"""
+
+    def __init__(self):
+        self.executions = 0
+        self.failed = asyncio.Event()
+        self.error = None
+
+    async def execute_workflow(self, workflow_id):
+        self.executions += 1
+        raise ConnectionError("connection lost")
+
+    async def mark_failed(self, workflow_id, error):
+        self.error = error
+        self.failed.set()
+
+async def check_worker_retries():
+    queue = InMemoryWorkflowQueue(max_attempts=3, retry_delay_seconds=0)
+    engine = DisconnectedEngine()
+    worker = WorkflowWorker(engine, queue, worker_id="worker-a", poll_interval=0.01, recovery_interval=0)
+    job_id = await queue.enqueue("wf-1")
+
+    running = asyncio.create_task(worker.run())
+    await asyncio.wait_for(engine.failed.wait(), timeout=5)
+    worker.stop()
+    await running
+
+    assert engine.executions == 3
+    assert engine.error == "connection lost"
+    assert queue.jobs[job_id].status == "failed"
+    print("✅ The worker retries an interrupted execution, then fails the workflow")
+
+def test_queue_is_abstract():
+    try:
+        WorkflowQueue()
+    except TypeError:
+        return
+    raise AssertionError("WorkflowQueue should not be instantiable")
+
+def test_lease_and_complete():
+    asyncio.run(check_lease_and_complete())
+
+def test_heartbeat():
+    asyncio.run(check_heartbeat())
+
+def test_lease_expiry():
+    asyncio.run(check_lease_expiry())
+
+def test_retry_limit():
+    asyncio.run(check_retry_limit())
+
+def test_recover():
+    asyncio.run(check_recover())
+
+def test_worker_retries():
+    asyncio.run(check_worker_retries())
+
+if __name__ == "__main__":
+    print("🧪 Testing workflow queue leases")
+    test_queue_is_abstract()
+    test_lease_and_complete()
+    test_heartbeat()
+    test_lease_expiry()
+    test_retry_limit()
+    test_recover()
+    test_worker_retries()